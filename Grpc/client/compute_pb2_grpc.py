@@ -39,6 +39,46 @@ class ComputeStub(object):
                 request_serializer=compute__pb2.FinalizeRequest.SerializeToString,
                 response_deserializer=compute__pb2.FinalizeResponse.FromString,
                 )
+        self.ComputeBatch = channel.unary_unary(
+                '/demo.Compute/ComputeBatch',
+                request_serializer=compute__pb2.BatchRequest.SerializeToString,
+                response_deserializer=compute__pb2.BatchResponse.FromString,
+                )
+        self.TransformBatch = channel.unary_unary(
+                '/demo.Compute/TransformBatch',
+                request_serializer=compute__pb2.BatchRequest.SerializeToString,
+                response_deserializer=compute__pb2.BatchResponse.FromString,
+                )
+        self.AggregateBatch = channel.unary_unary(
+                '/demo.Compute/AggregateBatch',
+                request_serializer=compute__pb2.BatchRequest.SerializeToString,
+                response_deserializer=compute__pb2.BatchResponse.FromString,
+                )
+        self.RefineBatch = channel.unary_unary(
+                '/demo.Compute/RefineBatch',
+                request_serializer=compute__pb2.BatchRequest.SerializeToString,
+                response_deserializer=compute__pb2.BatchResponse.FromString,
+                )
+        self.FinalizeBatch = channel.unary_unary(
+                '/demo.Compute/FinalizeBatch',
+                request_serializer=compute__pb2.BatchRequest.SerializeToString,
+                response_deserializer=compute__pb2.BatchResponse.FromString,
+                )
+        self.ProcessStream = channel.stream_stream(
+                '/demo.Compute/ProcessStream',
+                request_serializer=compute__pb2.StreamRequest.SerializeToString,
+                response_deserializer=compute__pb2.StreamResponse.FromString,
+                )
+        self.Chain = channel.unary_unary(
+                '/demo.Compute/Chain',
+                request_serializer=compute__pb2.ChainRequest.SerializeToString,
+                response_deserializer=compute__pb2.ChainResponse.FromString,
+                )
+        self.RunPipeline = channel.unary_unary(
+                '/demo.Compute/RunPipeline',
+                request_serializer=compute__pb2.PipelineRequest.SerializeToString,
+                response_deserializer=compute__pb2.PipelineResponse.FromString,
+                )
 
 
 class ComputeServicer(object):
@@ -79,6 +119,64 @@ class ComputeServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ComputeBatch(self, request, context):
+        """Batch variants: apply the stage to a whole packed array of values in one
+        call, paying the simulated work_ms once per batch instead of per value
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def TransformBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def AggregateBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def RefineBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def FinalizeBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ProcessStream(self, request_iterator, context):
+        """Streaming: one long-lived bidirectional stream per stage. The client
+        pipelines many requests over it; responses may arrive out of order and
+        are matched by request_id
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Chain(self, request, context):
+        """Chained mode: apply `stage`, forward the result to the next stage's
+        Chain (target from the x-next-targets metadata route, else the server's
+        NEXT_TARGET env) and return the values of this and every later stage
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def RunPipeline(self, request, context):
+        """Fused mode: run Compute->Transform->Aggregate->Refine->Finalize in
+        process on one server (zero-network baseline for the distributed runs)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_ComputeServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -107,6 +205,46 @@ def add_ComputeServicer_to_server(servicer, server):
                     request_deserializer=compute__pb2.FinalizeRequest.FromString,
                     response_serializer=compute__pb2.FinalizeResponse.SerializeToString,
             ),
+            'ComputeBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.ComputeBatch,
+                    request_deserializer=compute__pb2.BatchRequest.FromString,
+                    response_serializer=compute__pb2.BatchResponse.SerializeToString,
+            ),
+            'TransformBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.TransformBatch,
+                    request_deserializer=compute__pb2.BatchRequest.FromString,
+                    response_serializer=compute__pb2.BatchResponse.SerializeToString,
+            ),
+            'AggregateBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.AggregateBatch,
+                    request_deserializer=compute__pb2.BatchRequest.FromString,
+                    response_serializer=compute__pb2.BatchResponse.SerializeToString,
+            ),
+            'RefineBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.RefineBatch,
+                    request_deserializer=compute__pb2.BatchRequest.FromString,
+                    response_serializer=compute__pb2.BatchResponse.SerializeToString,
+            ),
+            'FinalizeBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.FinalizeBatch,
+                    request_deserializer=compute__pb2.BatchRequest.FromString,
+                    response_serializer=compute__pb2.BatchResponse.SerializeToString,
+            ),
+            'ProcessStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.ProcessStream,
+                    request_deserializer=compute__pb2.StreamRequest.FromString,
+                    response_serializer=compute__pb2.StreamResponse.SerializeToString,
+            ),
+            'Chain': grpc.unary_unary_rpc_method_handler(
+                    servicer.Chain,
+                    request_deserializer=compute__pb2.ChainRequest.FromString,
+                    response_serializer=compute__pb2.ChainResponse.SerializeToString,
+            ),
+            'RunPipeline': grpc.unary_unary_rpc_method_handler(
+                    servicer.RunPipeline,
+                    request_deserializer=compute__pb2.PipelineRequest.FromString,
+                    response_serializer=compute__pb2.PipelineResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'demo.Compute', rpc_method_handlers)
@@ -201,3 +339,139 @@ class Compute(object):
             compute__pb2.FinalizeResponse.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def ComputeBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/demo.Compute/ComputeBatch',
+            compute__pb2.BatchRequest.SerializeToString,
+            compute__pb2.BatchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def TransformBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/demo.Compute/TransformBatch',
+            compute__pb2.BatchRequest.SerializeToString,
+            compute__pb2.BatchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def AggregateBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/demo.Compute/AggregateBatch',
+            compute__pb2.BatchRequest.SerializeToString,
+            compute__pb2.BatchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def RefineBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/demo.Compute/RefineBatch',
+            compute__pb2.BatchRequest.SerializeToString,
+            compute__pb2.BatchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def FinalizeBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/demo.Compute/FinalizeBatch',
+            compute__pb2.BatchRequest.SerializeToString,
+            compute__pb2.BatchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def ProcessStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/demo.Compute/ProcessStream',
+            compute__pb2.StreamRequest.SerializeToString,
+            compute__pb2.StreamResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def Chain(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/demo.Compute/Chain',
+            compute__pb2.ChainRequest.SerializeToString,
+            compute__pb2.ChainResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def RunPipeline(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/demo.Compute/RunPipeline',
+            compute__pb2.PipelineRequest.SerializeToString,
+            compute__pb2.PipelineResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
@@ -2,13 +2,876 @@ import grpc
 import compute_pb2
 import compute_pb2_grpc
 import argparse
+import asyncio
 import csv
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import copy
+import itertools
+import json
+import math
+import multiprocessing
 import os
+import queue
+import random
+import threading
 
 
 PORT_DEFAULT = 50051
+ROUTE_METADATA_KEY = 'x-next-targets'
+
+
+class ChannelPool:
+    """
+    Channels and stubs keyed by target, created once and shared by every worker thread.
+    With channels_per_target > 1 each target gets several channels, each on its
+    own HTTP/2 connection (local subchannel pool), handed out round-robin.
+    """
+
+    def __init__(self, channels_per_target=1, channel_factory=grpc.insecure_channel):
+        self.channels_per_target = max(1, channels_per_target)
+        self._channel_factory = channel_factory
+        self._stubs = {}
+        self._channels = []
+        self._counters = {}
+        self._lock = threading.Lock()
+        # True until a warm-up has sent this pool's first (cold-start) request
+        self.cold = True
+
+    def stub(self, target):
+        stubs = self._stubs.get(target)
+        if stubs is None:
+            with self._lock:
+                stubs = self._stubs.get(target)
+                if stubs is None:
+                    stubs = []
+                    for _ in range(self.channels_per_target):
+                        options = [('grpc.use_local_subchannel_pool', 1)] if self.channels_per_target > 1 else []
+                        channel = self._channel_factory(target, options=options)
+                        self._channels.append(channel)
+                        stubs.append(compute_pb2_grpc.ComputeStub(channel))
+                    self._counters[target] = itertools.count()
+                    self._stubs[target] = stubs
+        if len(stubs) == 1:
+            return stubs[0]
+        return stubs[next(self._counters[target]) % len(stubs)]
+
+    def close(self):
+        """Close every channel; for grpc.aio channels returns the close() coroutines to await"""
+        with self._lock:
+            channels, self._channels, self._stubs = self._channels, [], {}
+        return [channel.close() for channel in channels]
+
+
+# Shared pool created by main(); kept global so all worker threads reuse the same channels
+_channel_pool = None
+
+
+def create_channel_pool(channels_per_target=1):
+    global _channel_pool
+    if _channel_pool is None:
+        _channel_pool = ChannelPool(channels_per_target)
+    return _channel_pool
+
+
+def get_stub(target):
+    """Return a pooled ComputeStub for target (creating the shared pool on first use)"""
+    return create_channel_pool().stub(target)
+
+
+def close_channel_pool():
+    global _channel_pool
+    if _channel_pool is not None:
+        _channel_pool.close()
+        _channel_pool = None
+
+
+STAGE_COLUMNS = ['a', 'b', 'c', 'd', 'e']
+
+
+class ReplicaBalancer:
+    """
+    Picks one replica of a stage per call. Policies: round-robin,
+    least-outstanding (fewest calls this client has in flight to it) and p2c
+    (power of two choices: the less loaded of two random replicas).
+    acquire() must be paired with release() once the call has finished.
+    """
+
+    POLICIES = ('round-robin', 'least-outstanding', 'p2c')
+
+    def __init__(self, replicas, policy='round-robin'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"unknown balancing policy {policy!r}")
+        self.replicas = list(replicas)
+        self.policy = policy
+        self.outstanding = {r: 0 for r in self.replicas}
+        self._next = itertools.count()
+        self._rng = random.Random()
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude=None):
+        """Choose a replica (other than `exclude` if there is one) and count the call against it"""
+        with self._lock:
+            candidates = [r for r in self.replicas if r != exclude] or self.replicas
+            if self.policy == 'round-robin' or len(candidates) == 1:
+                replica = candidates[next(self._next) % len(candidates)]
+            elif self.policy == 'least-outstanding':
+                # rotate the starting point so ties don't all go to the first replica
+                start = next(self._next) % len(candidates)
+                replica = min(candidates[start:] + candidates[:start], key=self.outstanding.get)
+            else:
+                a, b = self._rng.sample(candidates, 2)
+                replica = a if self.outstanding[a] <= self.outstanding[b] else b
+            self.outstanding[replica] += 1
+            return replica
+
+    def release(self, replica):
+        with self._lock:
+            self.outstanding[replica] -= 1
+
+
+# Balancers keyed by stage target ('h1:50051|h2:50051'), created by main() for stages with replicas
+_balancers = {}
+
+
+def create_balancers(targets, policy):
+    for target in targets:
+        if '|' in target and target not in _balancers:
+            _balancers[target] = ReplicaBalancer(target.split('|'), policy)
+
+
+def acquire_replica(target, exclude=None):
+    """The address to call for one request to this stage; `target` itself if it has a single address"""
+    balancer = _balancers.get(target)
+    return balancer.acquire(exclude) if balancer else target
+
+
+def release_replica(target, replica):
+    balancer = _balancers.get(target)
+    if balancer is not None:
+        balancer.release(replica)
+
+
+def parse_targets(spec):
+    """
+    The five stage targets in A..E order, from 'a,b,c,d,e' or 'A=a,B=b,...'.
+    A stage may list replicas separated by '|', e.g. 'A=h1:50051|h2:50051';
+    they stay '|'-joined in the returned strings.
+    """
+    entries = [e.strip() for e in spec.split(',') if e.strip()]
+    labelled = [e for e in entries if '=' in e]
+    if labelled and len(labelled) != len(entries):
+        raise ValueError("label every stage (A=...) or none")
+    if labelled:
+        by_stage = {}
+        for entry in entries:
+            label, _, addresses = entry.partition('=')
+            by_stage[label.strip().lower()] = addresses
+        if sorted(by_stage) != STAGE_COLUMNS:
+            raise ValueError("expected one entry for each of A, B, C, D, E")
+        entries = [by_stage[stage] for stage in STAGE_COLUMNS]
+    if len(entries) != 5:
+        raise ValueError("expected 5 targets (service_a, service_b, service_c, service_d, service_e)")
+    stages = []
+    for entry in entries:
+        replicas = [r.strip() for r in entry.split('|') if r.strip()]
+        if not replicas:
+            raise ValueError(f"empty target in {spec!r}")
+        stages.append('|'.join(replicas))
+    return stages
+
+
+def make_row(input_value, values, targets, send_ts, recv_ts, topology='star', client_rpcs=5, server_hops=0, error='',
+             rtt_ns=None, client_us=(), server_us=(), **extra):
+    """
+    Build one CSV row; `values` holds the stage results reached so far (padded with None).
+    rtt_ns is the perf_counter_ns duration of the whole request; client_us/server_us are the
+    per-stage call times seen by the client and the processing times reported by the servers.
+    """
+    values = list(values) + [None] * (5 - len(values))
+    if error or send_ts is None:
+        rtt_ms = None
+    elif rtt_ns is not None:
+        rtt_ms = round(rtt_ns / 1e6, 3)
+    else:
+        rtt_ms = recv_ts - send_ts
+    row = {
+        'input': input_value,
+        'computed': values[0],
+        'transformed': values[1],
+        'aggregated': values[2],
+        'refined': values[3],
+        'final_result': values[4],
+        'service_a': targets[0],
+        'service_b': targets[1],
+        'service_c': targets[2],
+        'service_d': targets[3],
+        'service_e': targets[4],
+        'send_ts': send_ts,
+        'recv_ts': recv_ts,
+        'rtt_ms': rtt_ms,
+        'topology': topology,
+        'client_rpcs': client_rpcs,
+        'server_hops': server_hops,
+        'error': error
+    }
+    for i, stage in enumerate(STAGE_COLUMNS):
+        row[f'{stage}_us'] = client_us[i] if i < len(client_us) else None
+        row[f'{stage}_server_us'] = server_us[i] if i < len(server_us) else None
+    row.update(extra)
+    return row
+
+
+class LatencyHistogram:
+    """
+    Log-linear (HDR-style) latency histogram in microseconds. Values below
+    2 * 2**sub_bucket_bits are counted exactly; above that each power of two
+    is split into 2**sub_bucket_bits linear sub-buckets, so the relative
+    error stays under 1 / 2**sub_bucket_bits (0.8% by default). record() is
+    O(1), counts are kept sparse, and histograms with the same
+    sub_bucket_bits merge by adding counts.
+    """
+
+    PERCENTILES = (50, 90, 99, 99.9)
+
+    def __init__(self, sub_bucket_bits=7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.counts = {}
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        shift = max(0, value.bit_length() - self.sub_bucket_bits - 1)
+        return self.sub_bucket_count * shift + (value >> shift)
+
+    def _highest_equivalent(self, index):
+        shift = max(0, index // self.sub_bucket_count - 1)
+        sub = index - self.sub_bucket_count * shift
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value_us, count=1):
+        value_us = max(0, int(value_us))
+        index = self._index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self.min = value_us if self.min is None else min(self.min, value_us)
+        self.max = value_us if self.max is None else max(self.max, value_us)
+
+    def percentile(self, p):
+        """Smallest recorded bucket value at or above the p-th percentile (capped at the exact max)"""
+        if not self.total:
+            return None
+        rank = max(1, -(-self.total * p // 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+    def merge(self, other):
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("cannot merge histograms with different sub_bucket_bits")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        for name, fn in (('min', min), ('max', max)):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            setattr(self, name, theirs if mine is None else mine if theirs is None else fn(mine, theirs))
+        return self
+
+    def to_dict(self):
+        return {'unit': 'us', 'sub_bucket_bits': self.sub_bucket_bits, 'total': self.total,
+                'min': self.min, 'max': self.max, 'counts': {str(i): c for i, c in sorted(self.counts.items())}}
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls(data['sub_bucket_bits'])
+        hist.counts = {int(i): c for i, c in data['counts'].items()}
+        hist.total = data['total']
+        hist.min = data['min']
+        hist.max = data['max']
+        return hist
+
+    def summary(self):
+        """One line of p50/p90/p99/p99.9/max in milliseconds"""
+        parts = [f"p{p:g} {self.percentile(p) / 1000:.2f}ms" for p in self.PERCENTILES]
+        return ", ".join(parts + [f"max {self.max / 1000:.2f}ms"])
+
+
+def save_histograms(path, histograms):
+    """Write {name: LatencyHistogram} as JSON"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({name: hist.to_dict() for name, hist in histograms.items()}, f)
+
+
+def load_histograms(path):
+    with open(path) as f:
+        return {name: LatencyHistogram.from_dict(data) for name, data in json.load(f).items()}
+
+
+def timed_call(method, request, client_us, server_us, **kwargs):
+    """Invoke a unary stub method, appending its client-observed time and the server's processing_us"""
+    start_ns = time.perf_counter_ns()
+    resp = method(request, **kwargs)
+    client_us.append((time.perf_counter_ns() - start_ns) // 1000)
+    server_us.append(resp.processing_us)
+    return resp
+
+
+class Hedger:
+    """
+    Hedged stage calls: if a stage has not answered within `delay_ms`, or within
+    the `percentile`-th percentile of that stage's observed latency, a duplicate
+    RPC is sent on the next pooled channel and the first answer wins. The stage
+    operations are pure, so a duplicate is harmless. The original call is left
+    to finish so its latency still feeds the delay estimate and the
+    primary-only percentiles reported next to the hedged ones.
+    """
+
+    MIN_SAMPLES = 50      # primary latencies needed before a percentile delay is used
+    REFRESH_EVERY = 100   # recompute the percentile delay after this many new samples
+
+    def __init__(self, percentile=None, delay_ms=None):
+        self.percentile = percentile
+        self.delay_ms = delay_ms
+        self.primary = [LatencyHistogram() for _ in STAGE_COLUMNS]
+        self.hedged = [LatencyHistogram() for _ in STAGE_COLUMNS]
+        self._delay_s = [None] * len(STAGE_COLUMNS)
+        self._refresh_at = [self.MIN_SAMPLES] * len(STAGE_COLUMNS)
+        self._lock = threading.Lock()
+
+    def delay_s(self, stage):
+        """Seconds to wait before hedging this stage, or None while there are too few samples"""
+        if self.delay_ms is not None:
+            return self.delay_ms / 1000
+        with self._lock:
+            hist = self.primary[stage]
+            if hist.total >= self._refresh_at[stage]:
+                self._delay_s[stage] = hist.percentile(self.percentile) / 1e6
+                self._refresh_at[stage] = hist.total + self.REFRESH_EVERY
+            return self._delay_s[stage]
+
+    def _record(self, hists, stage, start_ns):
+        with self._lock:
+            hists[stage].record((time.perf_counter_ns() - start_ns) // 1000)
+
+    def call(self, stage, start_call):
+        """
+        Run one stage call; start_call() starts the RPC and returns its grpc future.
+        Returns (response, hedged, hedge_won).
+        """
+        start_ns = time.perf_counter_ns()
+        primary = start_call()
+        primary.add_done_callback(lambda f: self._record(self.primary, stage, start_ns))
+        try:
+            resp = primary.result(timeout=self.delay_s(stage))
+            self._record(self.hedged, stage, start_ns)
+            return resp, False, False
+        except grpc.FutureTimeoutError:
+            pass
+        hedge = start_call()
+        finished = queue.SimpleQueue()
+        primary.add_done_callback(finished.put)
+        hedge.add_done_callback(finished.put)
+        winner = finished.get()
+        if winner.exception() is not None:
+            # the first answer was an error; take the other one, whatever it is
+            winner = finished.get()
+        elif winner is primary:
+            hedge.cancel()
+        resp = winner.result()
+        self._record(self.hedged, stage, start_ns)
+        return resp, True, winner is hedge
+
+    async def aio_call(self, stage, start_call):
+        """grpc.aio version of call(); start_call() returns the awaitable call object"""
+        start_ns = time.perf_counter_ns()
+        primary = asyncio.ensure_future(start_call())
+        primary.add_done_callback(lambda f: self._record(self.primary, stage, start_ns))
+        done, _ = await asyncio.wait({primary}, timeout=self.delay_s(stage))
+        if done:
+            resp = primary.result()
+            self._record(self.hedged, stage, start_ns)
+            return resp, False, False
+        hedge = asyncio.ensure_future(start_call())
+        done, _ = await asyncio.wait({primary, hedge}, return_when=asyncio.FIRST_COMPLETED)
+        winner = primary if primary in done else hedge
+        if winner.exception() is not None:
+            other = hedge if winner is primary else primary
+            await asyncio.wait({other})
+            winner = other
+        elif winner is primary:
+            hedge.cancel()
+        resp = winner.result()
+        self._record(self.hedged, stage, start_ns)
+        return resp, True, winner is hedge
+
+    def histograms(self):
+        with self._lock:
+            return [copy.deepcopy(h) for h in self.primary], [copy.deepcopy(h) for h in self.hedged]
+
+    def merge(self, histograms):
+        """Add (primary, hedged) histograms from histograms() of another process"""
+        primary, hedged = histograms
+        with self._lock:
+            for mine, theirs in zip(self.primary + self.hedged, primary + hedged):
+                mine.merge(theirs)
+
+
+# Set by main() (and each shard) when --hedge-percentile or --hedge-delay-ms is given
+_hedger = None
+
+
+def stage_call(stage, target, method_name, request, client_us, server_us, timeout, row_targets):
+    """
+    One star-topology stage call, on a replica chosen by the stage's balancer and
+    hedged (to another replica, if any) when a Hedger is configured. Records the
+    replica in row_targets[stage]; returns (response, hedged, hedge_won).
+    """
+    start_ns = time.perf_counter_ns()
+    if _hedger is None:
+        replica = row_targets[stage] = acquire_replica(target)
+        try:
+            resp = getattr(get_stub(replica), method_name)(request, timeout=timeout)
+        finally:
+            release_replica(target, replica)
+        hedged = won = False
+    else:
+        attempts = []
+
+        def start_call():
+            replica = acquire_replica(target, exclude=attempts[0] if attempts else None)
+            if not attempts:
+                row_targets[stage] = replica
+            attempts.append(replica)
+            fut = getattr(get_stub(replica), method_name).future(request, timeout=timeout)
+            fut.add_done_callback(lambda f: release_replica(target, replica))
+            return fut
+
+        resp, hedged, won = _hedger.call(stage, start_call)
+        row_targets[stage] = attempts[-1] if won else attempts[0]
+    client_us.append((time.perf_counter_ns() - start_ns) // 1000)
+    server_us.append(resp.processing_us)
+    return resp, hedged, won
+
+
+class RunStats:
+    """
+    Running aggregates for one set of rows (O(1) memory), so summaries don't
+    need the full row list. merge() combines stats from other workers/runs.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rtt_count = 0
+        self.rtt_sum = 0.0
+        self.rtt_min = None
+        self.rtt_max = None
+        self.first_send = None
+        self.last_send = None
+        self.last_recv = None
+        self.client_rpcs_sum = 0
+        self.server_hops_sum = 0
+        self.call_sum = [0] * 5
+        self.call_n = [0] * 5
+        self.server_sum = [0] * 5
+        self.server_n = [0] * 5
+        self.sched_count = 0
+        self.sched_sum = 0.0
+        self.sched_max = None
+        self.pipeline_server_sum = 0
+        self.pipeline_server_n = 0
+        self.hedges_sum = 0
+        self.hedge_wins_sum = 0
+        self.replicas = {}
+        self.rtt_hist = LatencyHistogram()
+        self.cold_start_ms = []
+
+    @property
+    def ok(self):
+        return self.count - self.errors
+
+    def add(self, row):
+        if row.get('cold_start'):
+            # the first request on fresh channels is reported on its own
+            self.cold_start_ms.append(row['rtt_ms'])
+            return
+        self.count += 1
+        if row['send_ts'] is not None:
+            self.first_send = row['send_ts'] if self.first_send is None else min(self.first_send, row['send_ts'])
+            self.last_send = row['send_ts'] if self.last_send is None else max(self.last_send, row['send_ts'])
+            self.last_recv = row['recv_ts'] if self.last_recv is None else max(self.last_recv, row['recv_ts'])
+        if row.get('sched_delay_ms') is not None:
+            self.sched_count += 1
+            self.sched_sum += row['sched_delay_ms']
+            self.sched_max = row['sched_delay_ms'] if self.sched_max is None else max(self.sched_max, row['sched_delay_ms'])
+        # duplicates add load whether or not the request succeeded
+        self.hedges_sum += row.get('hedges') or 0
+        self.hedge_wins_sum += row.get('hedge_wins') or 0
+        self._add_replicas(row)
+        if row['error']:
+            self.errors += 1
+            return
+        rtt = row['rtt_ms']
+        if rtt is not None:
+            self.rtt_count += 1
+            self.rtt_sum += rtt
+            self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+            self.rtt_max = rtt if self.rtt_max is None else max(self.rtt_max, rtt)
+            self.rtt_hist.record(round(rtt * 1000))
+        self.client_rpcs_sum += row['client_rpcs']
+        self.server_hops_sum += row['server_hops']
+        for i, stage in enumerate(STAGE_COLUMNS):
+            if row.get(f'{stage}_us') is not None:
+                self.call_sum[i] += row[f'{stage}_us']
+                self.call_n[i] += 1
+            if row.get(f'{stage}_server_us') is not None:
+                self.server_sum[i] += row[f'{stage}_server_us']
+                self.server_n[i] += 1
+        if row.get('pipeline_server_us') is not None:
+            self.pipeline_server_sum += row['pipeline_server_us']
+            self.pipeline_server_n += 1
+
+    def _add_replicas(self, row):
+        """[calls, errors, time_us] per (stage, replica address); a failed request counts against the stage it stopped at"""
+        for stage in STAGE_COLUMNS[:1] if row['topology'] == 'fused' else STAGE_COLUMNS:
+            us = row.get(f'{stage}_us')
+            if us is None:
+                us = row.get(f'{stage}_server_us')
+            if us is None and not row['error']:
+                break
+            entry = self.replicas.setdefault((stage, row[f'service_{stage}']), [0, 0, 0])
+            entry[0] += 1
+            if us is None:
+                entry[1] += 1
+                break
+            entry[2] += us
+
+    def merge(self, other):
+        def pick(a, b, fn):
+            return b if a is None else a if b is None else fn(a, b)
+        for name in ('count', 'errors', 'rtt_count', 'rtt_sum', 'client_rpcs_sum', 'server_hops_sum',
+                     'sched_count', 'sched_sum', 'pipeline_server_sum', 'pipeline_server_n', 'hedges_sum', 'hedge_wins_sum'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in ('call_sum', 'call_n', 'server_sum', 'server_n'):
+            setattr(self, name, [a + b for a, b in zip(getattr(self, name), getattr(other, name))])
+        self.rtt_min = pick(self.rtt_min, other.rtt_min, min)
+        self.rtt_max = pick(self.rtt_max, other.rtt_max, max)
+        self.first_send = pick(self.first_send, other.first_send, min)
+        self.last_send = pick(self.last_send, other.last_send, max)
+        self.last_recv = pick(self.last_recv, other.last_recv, max)
+        self.sched_max = pick(self.sched_max, other.sched_max, max)
+        for key, entry in other.replicas.items():
+            self.replicas[key] = [a + b for a, b in zip(self.replicas.get(key, [0, 0, 0]), entry)]
+        self.rtt_hist.merge(other.rtt_hist)
+        self.cold_start_ms += other.cold_start_ms
+        return self
+
+
+class IntervalReporter:
+    """
+    Completed requests, errors and p50/p99 per fixed interval (by recv_ts),
+    printed to the console and appended to a time-series CSV so throughput
+    over time can be lined up with server events. Warm-up traffic is
+    included. Fed from the ResultsWriter thread; tick() closes intervals
+    once the clock has passed them (after a short grace for late rows).
+    """
+
+    GRACE_MS = 250
+
+    def __init__(self, path, interval=1.0, echo=True):
+        self.interval_ms = interval * 1000
+        self.echo = echo
+        self.start_ms = time.time() * 1000
+        self.bucket_start = self.start_ms
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['time_s', 'timestamp_ms', 'completed', 'errors', 'ok_per_s', 'p50_ms', 'p99_ms'])
+        self._reset()
+
+    def _reset(self):
+        self.completed = 0
+        self.errors = 0
+        self.hist = LatencyHistogram()
+
+    def _emit(self):
+        elapsed_s = (self.bucket_start + self.interval_ms - self.start_ms) / 1000
+        ok_per_s = (self.completed - self.errors) / (self.interval_ms / 1000)
+        p50 = self.hist.percentile(50)
+        p99 = self.hist.percentile(99)
+        p50_ms = p50 / 1000 if p50 is not None else None
+        p99_ms = p99 / 1000 if p99 is not None else None
+        self._writer.writerow([round(elapsed_s, 3), int(self.bucket_start + self.interval_ms), self.completed,
+                               self.errors, round(ok_per_s, 2), p50_ms, p99_ms])
+        self._file.flush()
+        if self.echo:
+            latency = f"p50 {p50_ms:.2f}ms, p99 {p99_ms:.2f}ms" if p50 is not None else "no successful requests"
+            print(f"[{elapsed_s:7.1f}s] {self.completed:6d} done, {self.errors:4d} errors, {ok_per_s:8.1f} ok/s, {latency}")
+        self._reset()
+
+    def _roll(self, ts_ms):
+        while ts_ms >= self.bucket_start + self.interval_ms:
+            self._emit()
+            self.bucket_start += self.interval_ms
+
+    def add(self, row):
+        self._roll(row['recv_ts'] or time.time() * 1000)
+        self.completed += 1
+        if row['error']:
+            self.errors += 1
+        elif row['rtt_ms'] is not None:
+            self.hist.record(round(row['rtt_ms'] * 1000))
+
+    def tick(self):
+        self._roll(time.time() * 1000 - self.GRACE_MS)
+
+    def close(self):
+        self.tick()
+        if self.completed:
+            self._emit()
+        self._file.close()
+
+
+class ResultsWriter:
+    """
+    Appends rows to the results CSV from a background thread as they arrive,
+    flushing every flush_interval seconds, and keeps a RunStats per topology
+    (unless aggregate is False, e.g. when shard processes send their own).
+    write() is thread-safe; the bounded queue applies backpressure if the
+    disk falls behind.
+    """
+
+    def __init__(self, path, fieldnames, flush_interval=1.0, max_queue=100000, aggregate=True, reporter=None):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.flush_interval = flush_interval
+        self.aggregate = aggregate
+        self.reporter = reporter
+        self.stats = {}
+        self.warmup_stats = {}
+        self.phase_stats = {}
+        self.rows_written = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, extrasaction='ignore')
+        self._writer.writeheader()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, row):
+        self._queue.put(row)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        timeout = min(self.flush_interval, self.reporter.interval_ms / 1000) if self.reporter else self.flush_interval
+        while True:
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                row = ()
+            if row is None:
+                break
+            if self.reporter:
+                if row:
+                    self.reporter.add(row)
+                self.reporter.tick()
+            if row and row.get('phase') == 'warmup':
+                # warm-up traffic is summarised separately and kept out of the CSV
+                if self.aggregate:
+                    self.warmup_stats.setdefault(row['topology'], RunStats()).add(row)
+            elif row:
+                self._writer.writerow(row)
+                self.rows_written += 1
+                if self.aggregate:
+                    self.stats.setdefault(row['topology'], RunStats()).add(row)
+                    if row.get('phase'):
+                        self.phase_stats.setdefault((row['topology'], row['phase']), RunStats()).add(row)
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self._file.flush()
+                last_flush = time.monotonic()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        if self.reporter:
+            self.reporter.close()
+
+
+class LoadSchedule:
+    """
+    Piecewise-linear load level over time: concurrency in closed-loop runs,
+    req/s with --rate. Parsed from a comma list of `ramp:FROM:TO:SECONDS`
+    and `hold:LEVEL:SECONDS` phases, e.g. 'ramp:10:500:60,hold:500:300,ramp:500:10:60'.
+    """
+
+    def __init__(self, phases):
+        # [(name, start_level, end_level, seconds)]
+        self.phases = phases
+        self.duration = sum(p[3] for p in phases)
+        self.peak = max(max(p[1], p[2]) for p in phases)
+
+    @classmethod
+    def parse(cls, spec):
+        phases = []
+        for part in (p.strip() for p in spec.split(',')):
+            if not part:
+                continue
+            kind, *nums = part.split(':')
+            try:
+                nums = [float(n) for n in nums]
+            except ValueError:
+                nums = []
+            if kind == 'ramp' and len(nums) == 3:
+                start, end, seconds = nums
+                name = f"{len(phases) + 1}:ramp {start:g}-{end:g}"
+            elif kind == 'hold' and len(nums) == 2:
+                start = end = nums[0]
+                seconds = nums[1]
+                name = f"{len(phases) + 1}:hold {start:g}"
+            else:
+                raise ValueError(f"bad phase '{part}', expected ramp:FROM:TO:SECONDS or hold:LEVEL:SECONDS")
+            if seconds <= 0 or start < 0 or end < 0:
+                raise ValueError(f"bad phase '{part}', levels must be >= 0 and seconds > 0")
+            phases.append((name, start, end, seconds))
+        if not phases:
+            raise ValueError("empty schedule")
+        return cls(phases)
+
+    @classmethod
+    def hold(cls, level, seconds):
+        return cls([(f"1:hold {level:g}", level, level, seconds)])
+
+    def scaled(self, factor):
+        """Same phases (and names) with every level multiplied by factor, e.g. one shard's share"""
+        return LoadSchedule([(name, a * factor, b * factor, sec) for name, a, b, sec in self.phases])
+
+    def at(self, elapsed):
+        """(phase name, level) at `elapsed` seconds into the schedule, or (None, 0) once it is over"""
+        for name, start, end, seconds in self.phases:
+            if elapsed < seconds:
+                return name, start + (end - start) * elapsed / seconds
+            elapsed -= seconds
+        return None, 0
+
+    def offsets(self, arrivals='fixed', seed=None):
+        """Open-loop intended start times (seconds) following the levels as req/s"""
+        rng = random.Random(seed)
+        offsets = []
+        t = 0.0
+        while t < self.duration:
+            _, rate = self.at(t)
+            if rate <= 0:
+                t += 0.01
+                continue
+            offsets.append(t)
+            t += rng.expovariate(rate) if arrivals == 'poisson' else 1 / rate
+        return offsets
+
+    def phase_tagger(self, emit):
+        """Wrap emit() to label each row with the phase its send_ts falls in (the clock starts now)"""
+        start_ms = time.time() * 1000
+        last = self.phases[-1][0]
+
+        def emit_phase(row):
+            name, _ = self.at((row['send_ts'] - start_ms) / 1000) if row['send_ts'] is not None else (None, 0)
+            row['phase'] = name or last
+            emit(row)
+        return emit_phase
+
+
+class WorkCounter:
+    """
+    Request slots shared by every worker of one phase, so exactly `total`
+    requests are sent however they divide across workers. With `duration`
+    no slots are handed out once that many seconds have passed since the
+    first call; with a LoadSchedule, worker `slot` only runs while it is
+    below the scheduled concurrency.
+    """
+
+    IDLE_SECONDS = 0.05
+
+    def __init__(self, total=None, duration=None, schedule=None):
+        if schedule is not None:
+            duration = schedule.duration
+        if total is None and duration is None:
+            raise ValueError("WorkCounter needs a total, a duration or a schedule")
+        self.remaining = total
+        self.duration = duration
+        self.schedule = schedule
+        self.started = None
+        self.taken = 0
+        self._lock = threading.Lock()
+
+    def _expired(self, now):
+        if self.started is None:
+            self.started = now
+        if self.duration is not None and now - self.started >= self.duration:
+            return True
+        return self.remaining == 0
+
+    def wait_for(self, slot):
+        """0 if worker `slot` may send now, seconds to idle while it is above the scheduled level, None once the phase is over"""
+        with self._lock:
+            now = time.monotonic()
+            if self._expired(now):
+                return None
+            if self.schedule is None:
+                return 0
+            _, level = self.schedule.at(now - self.started)
+            return 0 if slot < level else self.IDLE_SECONDS
+
+    def take(self, n=1):
+        """Claim up to n requests; returns how many were granted (0 when the phase is over)"""
+        with self._lock:
+            if self._expired(time.monotonic()):
+                return 0
+            if self.remaining is not None:
+                n = min(n, self.remaining)
+                self.remaining -= n
+            self.taken += n
+            return n
+
+
+def tagged(emit, **tags):
+    """Wrap emit() so every row gets the given extra fields"""
+    def emit_tagged(row):
+        row.update(tags)
+        emit(row)
+    return emit_tagged
+
+
+def warmup_phases(args, emit, pool):
+    """
+    (counter, concurrency, emit) for the unmeasured start of a run: one
+    request on its own (the cold start: channel creation and first HTTP/2
+    handshake), then --warmup N requests and/or --warmup-seconds of
+    closed-loop traffic at full concurrency. Empty when no warm-up is asked for.
+    The first request is tagged cold_start only on a pool that has not been
+    warmed yet; later topologies and sweep steps reuse warm channels.
+    """
+    if not args.warmup and not args.warmup_seconds:
+        return []
+    first_tags = dict(phase='warmup', cold_start=True) if pool.cold else dict(phase='warmup')
+    pool.cold = False
+    phases = [(WorkCounter(1), 1, tagged(emit, **first_tags))]
+    rest = args.warmup - 1 if args.warmup else None
+    if rest != 0 and (rest or args.warmup_seconds):
+        phases.append((WorkCounter(rest, args.warmup_seconds), args.concurrency, tagged(emit, phase='warmup')))
+    return phases
 
 
 def pipeline_call(service_a, service_b, service_c, service_d, service_e, input_value, work_ms, timeout=10):
@@ -20,154 +883,1096 @@ def pipeline_call(service_a, service_b, service_c, service_d, service_e, input_v
     4. Call service_d.Refine(aggregated_result) -> refined_result
     5. Call service_e.Finalize(refined_result) -> final_result
     """
+    client_us = []
+    server_us = []
+    hedges = hedge_wins = 0
+    row_targets = [service_a, service_b, service_c, service_d, service_e]
     try:
         send_ts = int(time.time() * 1000)
+        start_ns = time.perf_counter_ns()
         
         # Step 1: Service A - Compute
-        chan_a = grpc.insecure_channel(service_a)
-        stub_a = compute_pb2_grpc.ComputeStub(chan_a)
         req_a = compute_pb2.ComputeRequest(value=input_value, work_ms=work_ms)
-        resp_a = stub_a.Compute(req_a, timeout=timeout)
+        resp_a, hedged, won = stage_call(0, service_a, 'Compute', req_a, client_us, server_us, timeout, row_targets)
+        hedges += hedged
+        hedge_wins += won
         computed_value = resp_a.result
         
         # Step 2: Service B - Transform
-        chan_b = grpc.insecure_channel(service_b)
-        stub_b = compute_pb2_grpc.ComputeStub(chan_b)
         req_b = compute_pb2.TransformRequest(computed_value=computed_value, work_ms=work_ms)
-        resp_b = stub_b.Transform(req_b, timeout=timeout)
+        resp_b, hedged, won = stage_call(1, service_b, 'Transform', req_b, client_us, server_us, timeout, row_targets)
+        hedges += hedged
+        hedge_wins += won
         transformed_value = resp_b.result
         
         # Step 3: Service C - Aggregate
-        chan_c = grpc.insecure_channel(service_c)
-        stub_c = compute_pb2_grpc.ComputeStub(chan_c)
         req_c = compute_pb2.AggregateRequest(transformed_value=transformed_value, work_ms=work_ms)
-        resp_c = stub_c.Aggregate(req_c, timeout=timeout)
+        resp_c, hedged, won = stage_call(2, service_c, 'Aggregate', req_c, client_us, server_us, timeout, row_targets)
+        hedges += hedged
+        hedge_wins += won
         aggregated_value = resp_c.result
         
         # Step 4: Service D - Refine
-        chan_d = grpc.insecure_channel(service_d)
-        stub_d = compute_pb2_grpc.ComputeStub(chan_d)
         req_d = compute_pb2.RefineRequest(aggregated_value=aggregated_value, work_ms=work_ms)
-        resp_d = stub_d.Refine(req_d, timeout=timeout)
+        resp_d, hedged, won = stage_call(3, service_d, 'Refine', req_d, client_us, server_us, timeout, row_targets)
+        hedges += hedged
+        hedge_wins += won
         refined_value = resp_d.result
         
         # Step 5: Service E - Finalize
-        chan_e = grpc.insecure_channel(service_e)
-        stub_e = compute_pb2_grpc.ComputeStub(chan_e)
         req_e = compute_pb2.FinalizeRequest(refined_value=refined_value, work_ms=work_ms)
-        resp_e = stub_e.Finalize(req_e, timeout=timeout)
+        resp_e, hedged, won = stage_call(4, service_e, 'Finalize', req_e, client_us, server_us, timeout, row_targets)
+        hedges += hedged
+        hedge_wins += won
         final_result = resp_e.final_result
         
+        rtt_ns = time.perf_counter_ns() - start_ns
         recv_ts = int(time.time() * 1000)
-        rtt = recv_ts - send_ts
-        
-        return {
-            'input': input_value,
-            'computed': computed_value,
-            'transformed': transformed_value,
-            'aggregated': aggregated_value,
-            'refined': refined_value,
-            'final_result': final_result,
-            'service_a': service_a,
-            'service_b': service_b,
-            'service_c': service_c,
-            'service_d': service_d,
-            'service_e': service_e,
-            'send_ts': send_ts,
-            'recv_ts': recv_ts,
-            'rtt_ms': rtt,
-            'error': ''
-        }
+        values = [computed_value, transformed_value, aggregated_value, refined_value, final_result]
+        return make_row(input_value, values, row_targets, send_ts, recv_ts,
+                        rtt_ns=rtt_ns, client_us=client_us, server_us=server_us, hedges=hedges, hedge_wins=hedge_wins)
     except Exception as e:
         recv_ts = int(time.time() * 1000)
-        return {
-            'input': input_value,
-            'computed': None,
-            'transformed': None,
-            'aggregated': None,
-            'refined': None,
-            'final_result': None,
-            'service_a': service_a,
-            'service_b': service_b,
-            'service_c': service_c,
-            'service_d': service_d,
-            'service_e': service_e,
-            'send_ts': send_ts if 'send_ts' in locals() else None,
-            'recv_ts': recv_ts,
-            'rtt_ms': None,
-            'error': str(e)
-        }
-
-
-def worker(service_a, service_b, service_c, service_d, service_e, n, input_value, work_ms):
-    rows = []
-    for i in range(n):
-        row = pipeline_call(service_a, service_b, service_c, service_d, service_e, input_value, work_ms)
-        rows.append(row)
-    return rows
+        return make_row(input_value, [], row_targets,
+                        send_ts if 'send_ts' in locals() else None, recv_ts, error=str(e),
+                        client_us=client_us, server_us=server_us, hedges=hedges, hedge_wins=hedge_wins)
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--targets', required=True, help='comma-separated list of service_a:port,service_b:port,service_c:port,service_d:port,service_e:port')
-    parser.add_argument('--requests', type=int, default=100, help='total requests per pipeline')
-    parser.add_argument('--concurrency', type=int, default=10)
-    parser.add_argument('--work_ms', type=int, default=0)
-    parser.add_argument('--input', type=int, default=5, help='input value for computation')
-    parser.add_argument('--out', type=str, default='/tmp/results.csv')
-    args = parser.parse_args()
+def pipeline_batch_call(service_a, service_b, service_c, service_d, service_e, input_values, work_ms, timeout=10):
+    """
+    Execute the pipeline for a whole batch of values using the *Batch RPCs.
+    Each stage is called once per batch, so work_ms is paid once per batch.
+    Returns one row per input value (all rows share the batch's send/recv timestamps).
+    """
+    stages = [
+        (service_a, 'ComputeBatch'),
+        (service_b, 'TransformBatch'),
+        (service_c, 'AggregateBatch'),
+        (service_d, 'RefineBatch'),
+        (service_e, 'FinalizeBatch'),
+    ]
+    stage_results = []
+    client_us = []
+    server_us = []
+    error = ''
+    send_ts = int(time.time() * 1000)
+    start_ns = time.perf_counter_ns()
+    targets = [service_a, service_b, service_c, service_d, service_e]
+    try:
+        values = list(input_values)
+        for stage, (target, method) in enumerate(stages):
+            replica = targets[stage] = acquire_replica(target)
+            try:
+                req = compute_pb2.BatchRequest(values=values, work_ms=work_ms)
+                resp = timed_call(getattr(get_stub(replica), method), req, client_us, server_us, timeout=timeout)
+            finally:
+                release_replica(target, replica)
+            values = list(resp.results)
+            stage_results.append(values)
+    except Exception as e:
+        error = str(e)
+    rtt_ns = time.perf_counter_ns() - start_ns
+    recv_ts = int(time.time() * 1000)
 
-    # Parse targets: "servicea:50051,serviceb:50051,servicec:50051,serviced:50051,servicee:50051"
-    targets = [t.strip() for t in args.targets.split(',') if t.strip()]
-    if len(targets) != 5:
-        print("ERROR: Expected 5 targets (service_a, service_b, service_c, service_d, service_e)")
-        return
-    
+    return [make_row(input_value, [r[i] for r in stage_results], targets, send_ts, recv_ts, error=error,
+                     rtt_ns=rtt_ns, client_us=client_us, server_us=server_us)
+            for i, input_value in enumerate(input_values)]
+
+
+def pipeline_chain_call(service_a, service_b, service_c, service_d, service_e, input_value, work_ms, timeout=10, chain_route='metadata'):
+    """
+    Chained topology: a single Chain call to service_a. Each stage forwards its
+    result to the next one server-side, so only A's request/response crosses
+    the client's link. With chain_route='metadata' the route B..E is sent in
+    the x-next-targets metadata; with 'env' each server uses its NEXT_TARGET.
+    """
+    values = []
+    server_us = []
+    error = ''
+    hops = 0
+    send_ts = int(time.time() * 1000)
+    start_ns = time.perf_counter_ns()
+    stages = [service_a, service_b, service_c, service_d, service_e]
+    # the client picks every stage's replica up front when it sends the route; with 'env' only A's
+    targets = [acquire_replica(t) for t in (stages if chain_route == 'metadata' else stages[:1])]
+    try:
+        metadata = ()
+        if chain_route == 'metadata':
+            metadata = ((ROUTE_METADATA_KEY, ','.join(targets[1:])),)
+        req = compute_pb2.ChainRequest(stage=compute_pb2.COMPUTE, value=input_value, work_ms=work_ms)
+        resp = get_stub(targets[0]).Chain(req, timeout=timeout, metadata=metadata)
+        values = list(resp.values)
+        server_us = list(resp.stage_us)
+        hops = resp.hops
+    except Exception as e:
+        error = str(e)
+    finally:
+        for target, replica in zip(stages, targets):
+            release_replica(target, replica)
+    rtt_ns = time.perf_counter_ns() - start_ns
+    recv_ts = int(time.time() * 1000)
+
+    return make_row(input_value, values, targets + stages[len(targets):], send_ts, recv_ts,
+                    topology='chain', client_rpcs=1, server_hops=max(hops - 1, 0), error=error,
+                    rtt_ns=rtt_ns, server_us=server_us)
+
+
+def pipeline_fused_call(service_a, service_b, service_c, service_d, service_e, input_value, work_ms, timeout=10, stage_work_ms=None):
+    """
+    Fused topology: one RunPipeline call to service_a, which runs all five
+    stages in process. Zero-network baseline for the star/chain numbers.
+    """
+    values = []
+    stage_us = []
+    server_us = None
+    error = ''
+    send_ts = int(time.time() * 1000)
+    start_ns = time.perf_counter_ns()
+    replica = acquire_replica(service_a)
+    try:
+        req = compute_pb2.PipelineRequest(value=input_value, work_ms=work_ms, stage_work_ms=stage_work_ms or [])
+        resp = get_stub(replica).RunPipeline(req, timeout=timeout)
+        values = list(resp.values)
+        stage_us = list(resp.stage_us)
+        server_us = resp.total_us
+    except Exception as e:
+        error = str(e)
+    finally:
+        release_replica(service_a, replica)
+    rtt_ns = time.perf_counter_ns() - start_ns
+    recv_ts = int(time.time() * 1000)
+
+    return make_row(input_value, values, [replica] * 5, send_ts, recv_ts,
+                    topology='fused', client_rpcs=1, error=error,
+                    rtt_ns=rtt_ns, server_us=stage_us, pipeline_server_us=server_us)
+
+
+STREAM_STAGES = [compute_pb2.COMPUTE, compute_pb2.TRANSFORM, compute_pb2.AGGREGATE, compute_pb2.REFINE, compute_pb2.FINALIZE]
+
+
+class StageStream:
+    """
+    One long-lived ProcessStream call to a single stage.
+    submit() queues a request on the stream and returns a Future; a reader
+    thread resolves futures with the StreamResponse, matched by request_id.
+    """
+
+    def __init__(self, target, stage):
+        self.target = target
+        self.stage = stage
+        self._channel = grpc.insecure_channel(target)
+        self._stub = compute_pb2_grpc.ComputeStub(self._channel)
+        self._requests = queue.Queue()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._error = None
+        self._responses = self._stub.ProcessStream(iter(self._requests.get, None))
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def submit(self, value, work_ms):
+        fut = Future()
+        request_id = next(self._ids)
+        with self._lock:
+            if self._error is not None:
+                fut.set_exception(self._error)
+                return fut
+            self._pending[request_id] = fut
+        self._requests.put(compute_pb2.StreamRequest(request_id=request_id, stage=self.stage, value=value, work_ms=work_ms))
+        return fut
+
+    def _read(self):
+        try:
+            for resp in self._responses:
+                with self._lock:
+                    fut = self._pending.pop(resp.request_id, None)
+                if fut is not None:
+                    fut.set_result(resp)
+            error = RuntimeError(f"stream to {self.target} closed")
+        except Exception as e:
+            error = e
+        with self._lock:
+            self._error = error
+            pending, self._pending = self._pending, {}
+        for fut in pending.values():
+            fut.set_exception(error)
+
+    def close(self):
+        self._requests.put(None)
+        self._reader.join(timeout=10)
+        self._channel.close()
+
+
+def run_stream_pipeline(streams, targets, counter, concurrency, input_value, work_ms, emit):
+    """
+    Drive the counter's requests through the StageStreams, keeping up to
+    `concurrency` pipelines in flight. streams[i] maps each replica of stage i
+    to its stream; the stage's balancer picks one per request. Each stage
+    response triggers the next stage's submit from the stream reader thread,
+    so no thread is held per in-flight request.
+    """
+    slots = threading.Semaphore(concurrency)
+
+    def finish(p, error):
+        row = make_row(p['input'], p['values'], p['targets'], p['send_ts'], int(time.time() * 1000), error=error,
+                       rtt_ns=time.perf_counter_ns() - p['start_ns'], client_us=p['client_us'], server_us=p['server_us'])
+        emit(row)
+        slots.release()
+
+    def advance(p, value):
+        stage = len(p['values'])
+        stage_start_ns = time.perf_counter_ns()
+        replica = p['targets'][stage] = acquire_replica(targets[stage])
+        fut = streams[stage][replica].submit(value, work_ms)
+
+        def on_done(f):
+            release_replica(targets[stage], replica)
+            try:
+                resp = f.result()
+            except Exception as e:
+                finish(p, str(e))
+                return
+            p['client_us'].append((time.perf_counter_ns() - stage_start_ns) // 1000)
+            p['server_us'].append(resp.processing_us)
+            p['values'].append(resp.result)
+            if stage == len(streams) - 1:
+                finish(p, '')
+            else:
+                advance(p, resp.result)
+
+        fut.add_done_callback(on_done)
+
+    while True:
+        slots.acquire()
+        if not counter.take():
+            slots.release()
+            break
+        pipeline = {'input': input_value, 'send_ts': int(time.time() * 1000), 'start_ns': time.perf_counter_ns(),
+                    'values': [], 'client_us': [], 'server_us': [], 'targets': list(targets)}
+        advance(pipeline, input_value)
+    # wait for the tail of in-flight pipelines
+    for _ in range(concurrency):
+        slots.acquire()
+
+
+def worker(service_a, service_b, service_c, service_d, service_e, counter, input_value, work_ms, emit, batch_size=1, topology='star', chain_route='metadata', stage_work_ms=None, slot=0):
+    """Send requests back to back while the shared counter grants them, handing each row to emit(); returns the number sent"""
+    sent = 0
+    while True:
+        idle = counter.wait_for(slot)
+        if idle is None:
+            return sent
+        if idle:
+            time.sleep(idle)
+            continue
+        size = counter.take(batch_size if topology == 'star' else 1)
+        if not size:
+            return sent
+        sent += size
+        if topology == 'fused':
+            emit(pipeline_fused_call(service_a, service_b, service_c, service_d, service_e, input_value, work_ms, stage_work_ms=stage_work_ms))
+        elif topology == 'chain':
+            emit(pipeline_chain_call(service_a, service_b, service_c, service_d, service_e, input_value, work_ms, chain_route=chain_route))
+        elif batch_size > 1:
+            for row in pipeline_batch_call(service_a, service_b, service_c, service_d, service_e, [input_value] * size, work_ms):
+                emit(row)
+        else:
+            emit(pipeline_call(service_a, service_b, service_c, service_d, service_e, input_value, work_ms))
+
+
+# Unary star calls in pipeline order: (method, request builder, response field)
+STAR_CALLS = [
+    ('Compute', lambda v, w: compute_pb2.ComputeRequest(value=v, work_ms=w), 'result'),
+    ('Transform', lambda v, w: compute_pb2.TransformRequest(computed_value=v, work_ms=w), 'result'),
+    ('Aggregate', lambda v, w: compute_pb2.AggregateRequest(transformed_value=v, work_ms=w), 'result'),
+    ('Refine', lambda v, w: compute_pb2.RefineRequest(aggregated_value=v, work_ms=w), 'result'),
+    ('Finalize', lambda v, w: compute_pb2.FinalizeRequest(refined_value=v, work_ms=w), 'final_result'),
+]
+
+
+async def aio_pipeline_call(pool, targets, input_value, work_ms, topology='star', chain_route='metadata', stage_work_ms=None, timeout=10):
+    """grpc.aio version of pipeline_call / pipeline_chain_call / pipeline_fused_call; returns the same row"""
+    values = []
+    client_us = []
+    server_us = []
+    error = ''
+    extra = {}
+    row_targets = list(targets)
+    picked = []
+    send_ts = int(time.time() * 1000)
+    start_ns = time.perf_counter_ns()
+    try:
+        if topology == 'chain':
+            # every stage's replica is picked here when the route is sent; with 'env' only A's
+            picked = [acquire_replica(t) for t in targets[:5 if chain_route == 'metadata' else 1]]
+            row_targets[:len(picked)] = picked
+            metadata = ((ROUTE_METADATA_KEY, ','.join(row_targets[1:])),) if chain_route == 'metadata' else ()
+            req = compute_pb2.ChainRequest(stage=compute_pb2.COMPUTE, value=input_value, work_ms=work_ms)
+            resp = await pool.stub(row_targets[0]).Chain(req, timeout=timeout, metadata=metadata)
+            values = list(resp.values)
+            server_us = list(resp.stage_us)
+            extra['server_hops'] = max(resp.hops - 1, 0)
+        elif topology == 'fused':
+            picked = [acquire_replica(targets[0])]
+            row_targets = picked * 5
+            req = compute_pb2.PipelineRequest(value=input_value, work_ms=work_ms, stage_work_ms=stage_work_ms or [])
+            resp = await pool.stub(row_targets[0]).RunPipeline(req, timeout=timeout)
+            values = list(resp.values)
+            server_us = list(resp.stage_us)
+            extra['pipeline_server_us'] = resp.total_us
+        else:
+            value = input_value
+            extra.update(hedges=0, hedge_wins=0)
+            for stage, (target, (method, build, field)) in enumerate(zip(targets, STAR_CALLS)):
+                stage_start_ns = time.perf_counter_ns()
+                request = build(value, work_ms)
+                attempts = []
+                won = False
+
+                def start_call():
+                    replica = acquire_replica(target, exclude=attempts[0] if attempts else None)
+                    attempts.append(replica)
+                    call = getattr(pool.stub(replica), method)(request, timeout=timeout)
+                    call.add_done_callback(lambda c, target=target, replica=replica: release_replica(target, replica))
+                    return call
+
+                try:
+                    if _hedger is None:
+                        resp = await start_call()
+                    else:
+                        resp, hedged, won = await _hedger.aio_call(stage, start_call)
+                        extra['hedges'] += hedged
+                        extra['hedge_wins'] += won
+                finally:
+                    if attempts:
+                        row_targets[stage] = attempts[-1] if won else attempts[0]
+                client_us.append((time.perf_counter_ns() - stage_start_ns) // 1000)
+                server_us.append(resp.processing_us)
+                value = getattr(resp, field)
+                values.append(value)
+    except Exception as e:
+        error = str(e)
+    finally:
+        for target, replica in zip(targets, picked):
+            release_replica(target, replica)
+    rtt_ns = time.perf_counter_ns() - start_ns
+    recv_ts = int(time.time() * 1000)
+
+    if topology == 'star':
+        return make_row(input_value, [] if error else values, row_targets, send_ts, recv_ts, error=error,
+                        rtt_ns=rtt_ns, client_us=client_us, server_us=server_us, **extra)
+    return make_row(input_value, values, row_targets, send_ts, recv_ts, topology=topology, client_rpcs=1, error=error,
+                    rtt_ns=rtt_ns, server_us=server_us, **extra)
+
+
+async def run_aio_load(args, targets, topology, emit):
+    """
+    asyncio engine: args.concurrency pipeline coroutines on one event loop
+    share a pool of grpc.aio channels and pull from one request counter.
+    The warm-up phases run first on the same channels.
+    """
+    pool = ChannelPool(args.channels_per_target, grpc.aio.insecure_channel)
+    in_flight = asyncio.Semaphore(args.concurrency)
+
+    async def open_loop_call(intended):
+        async with in_flight:
+            sched_delay_ms = (time.time() - intended) * 1000
+            row = await aio_pipeline_call(pool, targets, args.input, args.work_ms, topology,
+                                          args.chain_route, args.stage_work_ms)
+        emit(open_loop_row(row, int(intended * 1000), sched_delay_ms))
+
+    async def open_loop():
+        tasks = []
+        start = time.time()
+        for offset in open_loop_offsets(args):
+            delay = start + offset - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(open_loop_call(start + offset)))
+        await asyncio.gather(*tasks)
+
+    async def closed_loop(counter, concurrency, emit):
+        async def runner(slot):
+            while True:
+                idle = counter.wait_for(slot)
+                if idle is None:
+                    return
+                if idle:
+                    await asyncio.sleep(idle)
+                elif counter.take():
+                    emit(await aio_pipeline_call(pool, targets, args.input, args.work_ms, topology,
+                                                 args.chain_route, args.stage_work_ms))
+        await asyncio.gather(*(runner(slot) for slot in range(concurrency)))
+
+    try:
+        for counter, concurrency, phase_emit in warmup_phases(args, emit, pool):
+            await closed_loop(counter, concurrency, phase_emit)
+        if args.load_schedule:
+            emit = args.load_schedule.phase_tagger(emit)
+        if args.rate:
+            await open_loop()
+        else:
+            await closed_loop(measured_counter(args), closed_loop_concurrency(args), emit)
+    finally:
+        await asyncio.gather(*pool.close())
+
+
+def arrival_offsets(n, rate, arrivals='fixed', seed=None):
+    """Intended start times (seconds after the run starts) for n open-loop requests at `rate` req/s"""
+    if arrivals == 'poisson':
+        rng = random.Random(seed)
+        offsets = []
+        t = 0.0
+        for _ in range(n):
+            offsets.append(t)
+            t += rng.expovariate(rate)
+        return offsets
+    return [i / rate for i in range(n)]
+
+
+def open_loop_offsets(args):
+    """Intended start times for the measured open-loop phase: --schedule/--duration levels, else --requests at --rate"""
+    if args.load_schedule:
+        return args.load_schedule.offsets(args.arrivals, args.seed)
+    return arrival_offsets(args.requests, args.rate, args.arrivals, args.seed)
+
+
+def measured_counter(args):
+    """WorkCounter for the measured closed-loop phase: --requests, or the --schedule/--duration clock"""
+    if args.load_schedule:
+        return WorkCounter(schedule=args.load_schedule)
+    return WorkCounter(args.requests)
+
+
+def closed_loop_concurrency(args):
+    """Workers to start for the measured closed-loop phase (the schedule's peak level, if any)"""
+    if args.load_schedule:
+        return max(1, math.ceil(args.load_schedule.peak))
+    return args.concurrency
+
+
+def open_loop_row(row, intended_ms, sched_delay_ms):
+    """
+    Re-base a row on its intended start time so time spent waiting for a free
+    worker counts as latency (no coordinated omission). sched_delay_ms is how
+    late the request actually went out.
+    """
+    row['sched_delay_ms'] = round(sched_delay_ms, 3)
+    row['send_ts'] = intended_ms
+    if row['rtt_ms'] is not None:
+        row['rtt_ms'] = round(row['rtt_ms'] + sched_delay_ms, 3)
+    return row
+
+
+def run_open_loop(args, targets, topology, emit):
+    """
+    Open-loop thread engine: requests are submitted on a fixed/Poisson schedule
+    regardless of completions; at most args.concurrency run at once and the
+    rest queue, with the queueing included in their latency.
+    """
     service_a, service_b, service_c, service_d, service_e = targets
 
-    # Split requests across concurrency
-    per_thread = max(1, args.requests // args.concurrency)
+    def call_one(intended):
+        sched_delay_ms = (time.time() - intended) * 1000
+        if topology == 'chain':
+            row = pipeline_chain_call(service_a, service_b, service_c, service_d, service_e, args.input, args.work_ms, chain_route=args.chain_route)
+        elif topology == 'fused':
+            row = pipeline_fused_call(service_a, service_b, service_c, service_d, service_e, args.input, args.work_ms, stage_work_ms=args.stage_work_ms)
+        else:
+            row = pipeline_call(service_a, service_b, service_c, service_d, service_e, args.input, args.work_ms)
+        return open_loop_row(row, int(intended * 1000), sched_delay_ms)
 
-    all_rows = []
+    # Rows are emitted from the worker threads; leaving the with-block waits for the tail
     with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+        start = time.time()
+        for offset in open_loop_offsets(args):
+            delay = start + offset - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            ex.submit(lambda intended: emit(call_one(intended)), start + offset)
+
+
+def run_closed_loop(args, targets, topology, counter, concurrency, emit, streams=None):
+    """Closed-loop thread engine: `concurrency` workers (or in-flight stream pipelines) share the counter"""
+    if streams:
+        run_stream_pipeline(streams, targets, counter, concurrency, args.input, args.work_ms, emit)
+        return
+    service_a, service_b, service_c, service_d, service_e = targets
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
         futures = []
-        for i in range(args.concurrency):
-            futures.append(ex.submit(worker, service_a, service_b, service_c, service_d, service_e, per_thread, args.input, args.work_ms))
+        for i in range(concurrency):
+            futures.append(ex.submit(worker, service_a, service_b, service_c, service_d, service_e, counter, args.input, args.work_ms,
+                                     emit, args.batch_size, topology, args.chain_route, args.stage_work_ms, i))
 
         for fut in as_completed(futures):
             try:
-                rows = fut.result()
-                all_rows.extend(rows)
+                fut.result()
             except Exception as e:
                 print("worker failed:", e)
 
-    # Write CSV
-    fieldnames = ['input', 'computed', 'transformed', 'aggregated', 'refined', 'final_result', 'service_a', 'service_b', 'service_c', 'service_d', 'service_e', 'send_ts', 'recv_ts', 'rtt_ms', 'error']
-    os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    with open(args.out, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for r in all_rows:
-            writer.writerow(r)
-
-    # Calculate total experiment time
-    all_rows_with_ts = [r for r in all_rows if r['send_ts'] and r['recv_ts']]
-    if all_rows_with_ts:
-        first_send = min(r['send_ts'] for r in all_rows_with_ts)
-        last_recv = max(r['recv_ts'] for r in all_rows_with_ts)
-        total_time_ms = last_recv - first_send
-        total_time_sec = total_time_ms / 1000
-        
-        avg_rtt = sum(r['rtt_ms'] for r in all_rows_with_ts if r['rtt_ms']) / len([r for r in all_rows_with_ts if r['rtt_ms']])
-        
-        print(f"\n=== Experiment Summary ===")
-        print(f"Total requests: {len(all_rows)}")
-        print(f"Total time: {total_time_ms}ms ({total_time_sec:.2f}s)")
+
+def run_load(args, targets, topology, emit):
+    """Run one experiment with the given topology (warm-up first, if any), handing every row to emit()"""
+    if args.engine == 'aio':
+        return asyncio.run(run_aio_load(args, targets, topology, emit))
+
+    streams = None
+    if args.stream and topology == 'star':
+        streams = [{r: StageStream(r, stage) for r in t.split('|')} for t, stage in zip(targets, STREAM_STAGES)]
+    try:
+        for counter, concurrency, phase_emit in warmup_phases(args, emit, create_channel_pool(args.channels_per_target)):
+            run_closed_loop(args, targets, topology, counter, concurrency, phase_emit, streams)
+        if args.load_schedule:
+            emit = args.load_schedule.phase_tagger(emit)
+        if args.rate:
+            run_open_loop(args, targets, topology, emit)
+        elif streams:
+            run_closed_loop(args, targets, topology, measured_counter(args), args.concurrency, emit, streams)
+        else:
+            run_closed_loop(args, targets, topology, measured_counter(args), closed_loop_concurrency(args), emit)
+    finally:
+        for stage_streams in streams or ():
+            for s in stage_streams.values():
+                s.close()
+
+
+class ShardSink:
+    """Collects rows in a shard process and ships them to the parent in batches, plus per-topology RunStats"""
+
+    def __init__(self, out_queue, batch_size=200, max_delay=0.25):
+        self.out_queue = out_queue
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._last_put = time.monotonic()
+        self.stats = {}
+        self.warmup_stats = {}
+        self.phase_stats = {}
+        self._rows = []
+        self._lock = threading.Lock()
+
+    def emit(self, row):
+        with self._lock:
+            if row.get('phase') == 'warmup':
+                self.warmup_stats.setdefault(row['topology'], RunStats()).add(row)
+                return
+            self.stats.setdefault(row['topology'], RunStats()).add(row)
+            if row.get('phase'):
+                self.phase_stats.setdefault((row['topology'], row['phase']), RunStats()).add(row)
+            self._rows.append(row)
+            # ship full batches, or whatever is pending every max_delay so the parent's reporter stays current
+            if len(self._rows) >= self.batch_size or time.monotonic() - self._last_put >= self.max_delay:
+                self.out_queue.put(('rows', self._rows))
+                self._rows = []
+                self._last_put = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._rows:
+                self.out_queue.put(('rows', self._rows))
+                self._rows = []
+            self.out_queue.put(('stats', (self.stats, self.warmup_stats, self.phase_stats)))
+
+
+def split_evenly(total, parts):
+    """Split total into parts integers that differ by at most one"""
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def run_shard(index, args, targets, topologies, barrier, out_queue):
+    """Entry point of a --processes worker: runs its share of every topology with its own channel pool"""
+    global _hedger
+    sink = ShardSink(out_queue)
+    create_channel_pool(args.channels_per_target)
+    create_balancers(targets, args.balance)
+    if args.hedge_percentile is not None or args.hedge_delay_ms is not None:
+        _hedger = Hedger(args.hedge_percentile, args.hedge_delay_ms)
+    try:
+        for t in topologies:
+            # keep the shards on the same topology at the same time
+            barrier.wait()
+            run_load(args, targets, t, sink.emit)
+    except Exception as e:
+        out_queue.put(('error', f"shard {index}: {e}"))
+        barrier.abort()
+    finally:
+        close_channel_pool()
+        sink.close()
+        if _hedger is not None:
+            out_queue.put(('hedge', _hedger.histograms()))
+        out_queue.put(('done', index))
+
+
+def run_shards(args, targets, topologies, emit):
+    """
+    Shard the run across args.processes worker processes. Requests,
+    concurrency and rate are split evenly; rows are streamed back to emit()
+    and each shard's RunStats are merged per topology. Returns
+    (stats, warmup_stats, phase_stats); phase_stats is keyed by (topology, phase).
+    """
+    ctx = multiprocessing.get_context('spawn')
+    out_queue = ctx.Queue()
+    # every shard needs at least one worker, and one request unless a schedule clocks the run,
+    # so the rate, schedule and warm-up are divided among the shards that actually run
+    processes = min(args.processes, args.concurrency)
+    if not args.load_schedule:
+        processes = min(processes, args.requests)
+    processes = max(1, processes)
+    if processes < args.processes:
+        print(f"Running {processes} client processes instead of {args.processes} "
+              f"(each needs at least one request and one worker)")
+    requests = split_evenly(args.requests, processes)
+    workers = split_evenly(args.concurrency, processes)
+    warmups = split_evenly(args.warmup, processes) if args.warmup else [args.warmup] * processes
+    shard_args = []
+    for i in range(processes):
+        a = copy.copy(args)
+        a.requests = requests[i]
+        a.warmup = warmups[i]
+        a.concurrency = workers[i]
+        a.rate = args.rate / processes if args.rate else args.rate
+        a.seed = None if args.seed is None else args.seed + i
+        if args.load_schedule:
+            a.load_schedule = args.load_schedule.scaled(1 / processes)
+        shard_args.append(a)
+    barrier = ctx.Barrier(len(shard_args))
+    procs = [ctx.Process(target=run_shard, args=(i, a, targets, topologies, barrier, out_queue), daemon=True)
+             for i, a in enumerate(shard_args)]
+    for proc in procs:
+        proc.start()
+
+    stats = {}
+    warmup_stats = {}
+    phase_stats = {}
+    done = 0
+    while done < len(procs):
+        try:
+            kind, payload = out_queue.get(timeout=1)
+        except queue.Empty:
+            if not any(proc.is_alive() for proc in procs):
+                print("shard processes exited without reporting")
+                break
+            continue
+        if kind == 'rows':
+            for row in payload:
+                emit(row)
+        elif kind == 'stats':
+            for merged, shard in zip((stats, warmup_stats, phase_stats), payload):
+                for t, shard_stats in shard.items():
+                    merged.setdefault(t, RunStats()).merge(shard_stats)
+        elif kind == 'hedge':
+            _hedger.merge(payload)
+        elif kind == 'error':
+            print("worker failed:", payload)
+        elif kind == 'done':
+            done += 1
+    for proc in procs:
+        proc.join()
+    return stats, warmup_stats, phase_stats
+
+
+def parse_sweep(spec):
+    """Sweep levels from '1,2,4,8' or 'FROM:TO' (doubling from FROM, ending at TO)"""
+    if ':' in spec:
+        low, high = (float(x) for x in spec.split(':'))
+        if low <= 0 or high < low:
+            raise ValueError("FROM:TO needs 0 < FROM <= TO")
+        levels = []
+        while low < high:
+            levels.append(low)
+            low *= 2
+        return levels + [high]
+    levels = [float(x) for x in spec.split(',') if x.strip()]
+    if not levels or any(level <= 0 for level in levels):
+        raise ValueError("levels must be > 0")
+    return levels
+
+
+def run_sweep(args, targets, topology, emit):
+    """
+    Run one load step per --sweep level (concurrency, or req/s with --rate),
+    each warmed up first and measured for --duration or --requests. Rows are
+    tagged with their step in the `phase` column.
+    """
+    for level in args.sweep:
+        step = copy.copy(args)
+        if args.rate:
+            step.rate = level
+        else:
+            step.concurrency = max(1, int(level))
+        step.load_schedule = LoadSchedule.hold(level, args.duration) if args.duration else None
+        name = f"sweep {level:g}"
+
+        def emit_step(row, name=name):
+            if row.get('phase') != 'warmup':
+                row['phase'] = name
+            emit(row)
+        print(f"[{topology}] sweep step {level:g} {'req/s' if args.rate else 'concurrency'}")
+        run_load(step, targets, topology, emit_step)
+
+
+def sweep_table(phase_stats, topology, levels):
+    """
+    Per-step throughput and latency for one topology. The knee is the first
+    step whose p50 grew by a larger factor than its throughput did: beyond
+    it, extra load mostly buys queueing.
+    """
+    steps = []
+    for level in levels:
+        stats = phase_stats.get((topology, f"sweep {level:g}"), RunStats())
+        span = (stats.last_recv - stats.first_send) / 1000 if stats.first_send is not None else 0
+        p50 = stats.rtt_hist.percentile(50)
+        p99 = stats.rtt_hist.percentile(99)
+        steps.append({'topology': topology, 'level': level, 'requests': stats.count, 'errors': stats.errors,
+                      'throughput': round(stats.ok / span, 2) if span > 0 else 0,
+                      'p50_ms': p50 / 1000 if p50 is not None else None,
+                      'p99_ms': p99 / 1000 if p99 is not None else None, 'knee': ''})
+    for prev, cur in zip(steps, steps[1:]):
+        if prev['throughput'] and prev['p50_ms'] and cur['p50_ms'] and \
+                cur['p50_ms'] / prev['p50_ms'] > cur['throughput'] / prev['throughput']:
+            cur['knee'] = 'knee'
+            break
+    return steps
+
+
+def print_sweep(steps, unit):
+    print(f"\n=== Sweep ({steps[0]['topology']}) ===")
+    print(f"  {unit:>12}{'requests':>10}{'failed':>8}{'ok/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for step in steps:
+        p50 = f"{step['p50_ms']:.2f}" if step['p50_ms'] is not None else '-'
+        p99 = f"{step['p99_ms']:.2f}" if step['p99_ms'] is not None else '-'
+        marker = '  <- knee: latency grows faster than throughput' if step['knee'] else ''
+        print(f"  {step['level']:>12g}{step['requests']:>10}{step['errors']:>8}{step['throughput']:>10.1f}{p50:>10}{p99:>10}{marker}")
+
+
+def print_stage_breakdown(stats):
+    """
+    Average per-stage times: `call` is what the client waited for the stage
+    (a_us..e_us), `server` is the handler time the stage reported
+    (a_server_us..e_server_us, work included) and `net+queue` is the
+    difference: network, serialization and server-side queueing.
+    """
+    lines = []
+    for i, stage in enumerate(STAGE_COLUMNS):
+        if not stats.call_n[i] and not stats.server_n[i]:
+            continue
+        call_ms = stats.call_sum[i] / stats.call_n[i] / 1000 if stats.call_n[i] else None
+        server_ms = stats.server_sum[i] / stats.server_n[i] / 1000 if stats.server_n[i] else None
+        line = f"  {stage.upper()}: call {call_ms:8.2f}ms" if call_ms is not None else f"  {stage.upper()}: call        -  "
+        line += f"  server {server_ms:8.2f}ms" if server_ms is not None else "  server        -  "
+        if call_ms is not None and server_ms is not None:
+            line += f"  net+queue {call_ms - server_ms:8.2f}ms"
+        lines.append(line)
+    if lines:
+        print("Per-stage time (avg):")
+        for line in lines:
+            print(line)
+
+
+def print_replicas(stats, policy):
+    """Share of calls, errors and average call time per replica, for stages with more than one"""
+    by_stage = {}
+    for (stage, replica), entry in sorted(stats.replicas.items()):
+        by_stage.setdefault(stage, []).append((replica, entry))
+    lines = []
+    for stage, entries in by_stage.items():
+        if len(entries) < 2:
+            continue
+        total = sum(calls for _, (calls, _, _) in entries)
+        for replica, (calls, errors, time_us) in entries:
+            ok = calls - errors
+            avg = f"{time_us / ok / 1000:8.2f}ms" if ok else "       -  "
+            lines.append(f"  {stage.upper()} {replica:<24} calls {calls:>8} ({100 * calls / total:5.1f}%)  avg {avg}  errors {errors}")
+    if lines:
+        print(f"Per-replica calls ({policy}):")
+        for line in lines:
+            print(line)
+
+
+def print_hedging(hedger):
+    """Per-stage call latency with hedging vs the original (primary) calls alone, over the whole run"""
+    rule = f"p{hedger.percentile:g} of the stage's latency" if hedger.delay_ms is None else f"{hedger.delay_ms:g}ms"
+    print(f"\nHedging after {rule}; stage call latency, primary only vs with hedging:")
+    primary, hedged = hedger.histograms()
+    for stage, p_hist, h_hist in zip(STAGE_COLUMNS, primary, hedged):
+        if not p_hist.total or not h_hist.total:
+            continue
+        print(f"  {stage.upper()}: p50 {p_hist.percentile(50) / 1000:7.2f}ms -> {h_hist.percentile(50) / 1000:7.2f}ms"
+              f"  p99 {p_hist.percentile(99) / 1000:7.2f}ms -> {h_hist.percentile(99) / 1000:7.2f}ms"
+              f"  max {p_hist.max / 1000:7.2f}ms -> {h_hist.max / 1000:7.2f}ms")
+
+
+def print_warmup(warmup):
+    """Report the excluded warm-up traffic and the cold-start RTT(s) on their own"""
+    if warmup.cold_start_ms:
+        cold = [ms for ms in warmup.cold_start_ms if ms is not None]
+        if cold and len(cold) > 1:
+            print(f"Cold start RTT (first request, {len(cold)} processes): avg {sum(cold) / len(cold):.2f}ms, max {max(cold):.2f}ms")
+        elif cold:
+            print(f"Cold start RTT (first request): {cold[0]:.2f}ms")
+    if warmup.count:
+        line = f"Warm-up (excluded): {warmup.count} requests, {warmup.errors} failed"
+        if warmup.rtt_hist.total:
+            line += f", {warmup.rtt_hist.summary()}"
+        print(line)
+
+
+def print_phases(phase_stats, topology, schedule, unit):
+    """One line per schedule phase: requests, failures, successful throughput over the phase and tail latency"""
+    print(f"Per-phase (levels are {unit}):")
+    print(f"  {'phase':<22}{'secs':>7}{'requests':>10}{'failed':>8}{'ok/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, _, _, seconds in schedule.phases:
+        stats = phase_stats.get((topology, name), RunStats())
+        p50 = stats.rtt_hist.percentile(50)
+        p99 = stats.rtt_hist.percentile(99)
+        print(f"  {name:<22}{seconds:>7g}{stats.count:>10}{stats.errors:>8}{stats.ok / seconds:>10.1f}"
+              f"{p50 / 1000 if p50 is not None else float('nan'):>10.2f}{p99 / 1000 if p99 is not None else float('nan'):>10.2f}")
+
+
+def print_summary(stats, args, title="Experiment Summary", warmup=None):
+    """Print totals, RTT and hop counts from a RunStats; returns the average RTT (or None)"""
+    if stats.first_send is None:
+        return None
+    total_time_ms = stats.last_recv - stats.first_send
+    total_time_sec = total_time_ms / 1000
+
+    print(f"\n=== {title} ===")
+    if warmup is not None:
+        print_warmup(warmup)
+    print(f"Total requests: {stats.count}")
+    print(f"Failed requests: {stats.errors}")
+    print(f"Total time: {total_time_ms}ms ({total_time_sec:.2f}s)")
+    avg_rtt = None
+    if stats.rtt_count:
+        avg_rtt = stats.rtt_sum / stats.rtt_count
         print(f"Average RTT per request: {avg_rtt:.2f}ms")
-        print(f"Min RTT: {min(r['rtt_ms'] for r in all_rows_with_ts if r['rtt_ms']):.2f}ms")
-        print(f"Max RTT: {max(r['rtt_ms'] for r in all_rows_with_ts if r['rtt_ms']):.2f}ms")
+        print(f"Min RTT: {stats.rtt_min:.2f}ms")
+        print(f"Max RTT: {stats.rtt_max:.2f}ms")
+        print(f"RTT percentiles: {stats.rtt_hist.summary()}")
+    if stats.ok:
+        print(f"Hops per request: {stats.client_rpcs_sum / stats.ok:.1f} client RPCs, "
+              f"{stats.server_hops_sum / stats.ok:.1f} server-to-server RPCs")
+    print_stage_breakdown(stats)
+    print_replicas(stats, args.balance)
+    if stats.hedges_sum:
+        calls = sum(stats.call_n)
+        print(f"Hedged stage calls: {stats.hedges_sum} duplicates for {calls} calls "
+              f"(+{100 * stats.hedges_sum / max(calls, 1):.1f}% stage RPCs), duplicate answered first {stats.hedge_wins_sum} times")
+    if stats.pipeline_server_n and avg_rtt is not None:
+        server_avg = stats.pipeline_server_sum / stats.pipeline_server_n / 1000
+        print(f"In-process pipeline time (avg): {server_avg:.2f}ms; network + RPC overhead (avg): {avg_rtt - server_avg:.2f}ms")
+    if args.batch_size > 1:
+        print(f"Batch size: {args.batch_size} (RTT is per batch)")
+    if total_time_sec > 0:
+        print(f"Throughput: {stats.count / total_time_sec:.2f} values/second")
+    if args.rate:
+        span_sec = (stats.last_send - stats.first_send) / 1000
+        offered = (stats.count - 1) / span_sec if span_sec > 0 else args.rate
+        achieved = stats.ok / total_time_sec if total_time_sec > 0 else 0
+        target = "scheduled" if args.load_schedule else f"target {args.rate:g}"
+        print(f"Open loop ({args.arrivals} arrivals): offered {offered:.2f} req/s ({target}), "
+              f"achieved {achieved:.2f} req/s successful")
+        if stats.sched_count:
+            print(f"Send delay behind schedule: avg {stats.sched_sum / stats.sched_count:.2f}ms, "
+                  f"max {stats.sched_max:.2f}ms (included in RTT)")
+    return avg_rtt
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--targets', help='comma-separated list of service_a:port,service_b:port,service_c:port,service_d:port,service_e:port, '
+                                          "or A=...,B=...; a stage may list replicas separated by '|' (A=h1:50051|h2:50051)")
+    parser.add_argument('--balance', choices=ReplicaBalancer.POLICIES, default='round-robin',
+                        help='how a stage with several replicas picks one per call (p2c = power of two choices)')
+    parser.add_argument('--requests', type=int, default=100, help='total requests per pipeline')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--engine', choices=['thread', 'aio'], default='thread',
+                        help='thread: one ThreadPoolExecutor worker per concurrent pipeline; aio: --concurrency coroutines on one grpc.aio event loop')
+    parser.add_argument('--work_ms', type=int, default=0)
+    parser.add_argument('--input', type=int, default=5, help='input value for computation')
+    parser.add_argument('--out', type=str, default='/tmp/results.csv')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='run each topology for this many seconds at --concurrency (or --rate) instead of --requests')
+    parser.add_argument('--schedule', type=str, default=None,
+                        help="load phases instead of --requests, e.g. 'ramp:10:500:60,hold:500:300,ramp:500:10:60'; "
+                             "levels are concurrency, or req/s with --rate (whose value is then unused)")
+    parser.add_argument('--sweep', type=str, default=None,
+                        help="run one step per level ('1,2,4,8' or FROM:TO doubling) of concurrency, or of req/s with --rate; "
+                             "each step warms up and runs --duration seconds or --requests requests")
+    parser.add_argument('--sweep-out', type=str, default=None, help='sweep table CSV (default: <out>_sweep.csv)')
+    parser.add_argument('--warmup', type=int, default=0, metavar='N',
+                        help='closed-loop warm-up requests before each topology, excluded from the CSV and stats (the first is reported as the cold start)')
+    parser.add_argument('--warmup-seconds', type=float, default=None,
+                        help='warm up for this long instead of (or, with --warmup, at most as long as) N requests')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='shard --requests, --concurrency and --rate across this many worker processes, each with its own channel pool')
+    parser.add_argument('--report-interval', type=float, default=1.0,
+                        help='seconds per console/time-series line of completed, errors, ok/s, p50 and p99 (0 disables)')
+    parser.add_argument('--timeseries', type=str, default=None, help='time-series CSV (default: timeseries.csv beside --out)')
+    parser.add_argument('--hist-out', type=str, default=None, help='write the RTT histogram of each topology to this JSON file')
+    parser.add_argument('--merge-hist', nargs='+', default=None, metavar='FILE',
+                        help='merge histogram files written by --hist-out, print their percentiles (and save to --hist-out) without running load')
+    parser.add_argument('--flush-interval', type=float, default=1.0, help='seconds between flushes of the results CSV (rows are appended as they complete)')
+    parser.add_argument('--batch-size', type=int, default=1, help='values per *Batch RPC (1 = unary per-value calls)')
+    parser.add_argument('--stream', action='store_true', help='pipeline requests over one long-lived ProcessStream per stage; --concurrency is the number of in-flight pipelines')
+    parser.add_argument('--topology', default='star',
+                        help='star: client calls every stage; chain: client calls A and stages forward to each other; '
+                             'fused: A runs all five stages in process (RunPipeline); a comma list (e.g. star,fused) runs each and compares; '
+                             'both = star,chain; all = star,chain,fused')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='open-loop mode: start requests at this many per second regardless of completions; '
+                             'latency is measured from each intended start (--concurrency caps in-flight requests)')
+    parser.add_argument('--arrivals', choices=['fixed', 'poisson'], default='fixed', help='open-loop inter-arrival times')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for --arrivals poisson')
+    parser.add_argument('--channels-per-target', type=int, default=1,
+                        help='pooled channels (separate HTTP/2 connections) per target, shared by all workers')
+    parser.add_argument('--stage-work-ms', type=str, default=None,
+                        help='fused mode: comma-separated per-stage work for A..E (overrides --work_ms)')
+    parser.add_argument('--hedge-percentile', type=float, default=None, metavar='P',
+                        help='star: send a duplicate stage call on the next pooled channel when a stage has not answered within '
+                             'its observed P-th percentile latency (e.g. 95); the first answer wins')
+    parser.add_argument('--hedge-delay-ms', type=float, default=None,
+                        help='star: hedge after this fixed delay instead of a percentile')
+    parser.add_argument('--chain-route', choices=['metadata', 'env'], default='metadata',
+                        help='chain mode: send the B..E route in request metadata, or rely on each server\'s NEXT_TARGET')
+    args = parser.parse_args()
+    global _hedger
+    if args.merge_hist:
+        merged = {}
+        for path in args.merge_hist:
+            for name, hist in load_histograms(path).items():
+                merged.setdefault(name, LatencyHistogram(hist.sub_bucket_bits)).merge(hist)
+        for name, hist in merged.items():
+            print(f"{name}: {hist.total} samples, {hist.summary()}")
+        if args.hist_out:
+            save_histograms(args.hist_out, merged)
+        return
+    if not args.targets:
+        parser.error('--targets is required')
+    if args.processes < 1:
+        parser.error('--processes must be >= 1')
+    if args.requests < 1 or args.warmup < 0 or (args.warmup_seconds is not None and args.warmup_seconds <= 0):
+        parser.error('--requests must be >= 1, --warmup >= 0 and --warmup-seconds > 0')
+    args.load_schedule = None
+    if args.sweep:
+        try:
+            args.sweep = parse_sweep(args.sweep)
+        except ValueError as e:
+            parser.error(f'--sweep: {e}')
+        if args.schedule or args.processes > 1:
+            parser.error('--sweep cannot be combined with --schedule or --processes')
+        if not args.warmup and not args.warmup_seconds:
+            args.warmup_seconds = 2.0
+    if args.schedule and args.duration:
+        parser.error('use either --duration or --schedule')
+    if args.schedule:
+        try:
+            args.load_schedule = LoadSchedule.parse(args.schedule)
+        except ValueError as e:
+            parser.error(f'--schedule: {e}')
+        if args.stream:
+            parser.error('--schedule cannot change the in-flight count of --stream; use --duration')
+    elif args.duration is not None:
+        if args.duration <= 0:
+            parser.error('--duration must be > 0')
+        # a sweep builds one hold per step instead
+        if not args.sweep:
+            args.load_schedule = LoadSchedule.hold(args.rate or args.concurrency, args.duration)
+
+    # Parse targets: "servicea:50051,serviceb:50051,..." or "A=h1:50051|h2:50051,B=...,..."
+    try:
+        targets = parse_targets(args.targets)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return
+    create_channel_pool(args.channels_per_target)
+    create_balancers(targets, args.balance)
+    topologies = {'both': ['star', 'chain'], 'all': ['star', 'chain', 'fused']}.get(
+        args.topology, [t.strip() for t in args.topology.split(',') if t.strip()])
+    if not topologies or any(t not in ('star', 'chain', 'fused') for t in topologies):
+        print("ERROR: --topology must be star, chain, fused, a comma list of those, both or all")
+        return
+    if topologies != ['star'] and (args.stream or args.batch_size > 1):
+        print("ERROR: --stream/--batch-size only apply to the star topology")
+        return
+    if args.rate is not None and (args.rate <= 0 or args.stream or args.batch_size > 1):
+        print("ERROR: --rate must be > 0 and cannot be combined with --stream/--batch-size")
+        return
+    if args.engine == 'aio' and (args.stream or args.batch_size > 1):
+        print("ERROR: --stream/--batch-size are only supported by --engine thread")
+        return
+    if args.hedge_percentile is not None or args.hedge_delay_ms is not None:
+        if args.hedge_percentile is not None and args.hedge_delay_ms is not None:
+            print("ERROR: use either --hedge-percentile or --hedge-delay-ms")
+            return
+        if (args.hedge_percentile is not None and not 0 < args.hedge_percentile < 100) or (args.hedge_delay_ms or 0) < 0:
+            print("ERROR: --hedge-percentile must be between 0 and 100 and --hedge-delay-ms >= 0")
+            return
+        if args.stream or args.batch_size > 1:
+            print("ERROR: hedging applies to unary star calls, not --stream/--batch-size")
+            return
+        _hedger = Hedger(args.hedge_percentile, args.hedge_delay_ms)
+    if args.stage_work_ms is not None:
+        args.stage_work_ms = [int(w) for w in args.stage_work_ms.split(',')]
+        if len(args.stage_work_ms) != 5:
+            print("ERROR: --stage-work-ms needs 5 values (A..E)")
+            return
+
+    # Rows are streamed to the CSV as they complete; summaries come from running stats
+    fieldnames = ['input', 'computed', 'transformed', 'aggregated', 'refined', 'final_result', 'service_a', 'service_b', 'service_c', 'service_d', 'service_e', 'send_ts', 'recv_ts', 'rtt_ms', 'sched_delay_ms', 'topology', 'client_rpcs', 'server_hops',
+                  'a_us', 'b_us', 'c_us', 'd_us', 'e_us', 'a_server_us', 'b_server_us', 'c_server_us', 'd_server_us', 'e_server_us', 'hedges', 'hedge_wins', 'phase', 'error']
+    reporter = None
+    if args.report_interval > 0:
+        timeseries = args.timeseries or os.path.join(os.path.dirname(args.out), 'timeseries.csv')
+        reporter = IntervalReporter(timeseries, args.report_interval)
+        print(f"Reporting every {args.report_interval:g}s to the console and {timeseries}")
+    results = ResultsWriter(args.out, fieldnames, flush_interval=args.flush_interval, aggregate=args.processes == 1,
+                            reporter=reporter)
+    try:
+        if args.processes > 1:
+            shard_stats = run_shards(args, targets, topologies, results.write)
+        else:
+            for t in topologies:
+                (run_sweep if args.sweep else run_load)(args, targets, t, results.write)
+    finally:
+        close_channel_pool()
+        results.close()
+    if args.processes > 1:
+        results.stats, results.warmup_stats, results.phase_stats = shard_stats
+
+    if args.sweep:
+        unit = 'req/s' if args.rate else 'concurrency'
+        sweep_out = args.sweep_out or os.path.splitext(args.out)[0] + '_sweep.csv'
+        with open(sweep_out, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['topology', 'mode', 'level', 'requests', 'errors', 'throughput', 'p50_ms', 'p99_ms', 'knee'])
+            writer.writeheader()
+            for t in topologies:
+                steps = sweep_table(results.phase_stats, t, args.sweep)
+                print_sweep(steps, unit)
+                for step in steps:
+                    writer.writerow(dict(step, mode=unit, level=f"{step['level']:g}"))
+        print(f"\nWrote {results.rows_written} rows to {args.out} and the sweep table to {sweep_out}")
+        return
+
+    avg_rtts = {}
+    for t in topologies:
+        title = "Experiment Summary" if len(topologies) == 1 else f"Experiment Summary ({t})"
+        avg_rtts[t] = print_summary(results.stats.get(t, RunStats()), args, title, results.warmup_stats.get(t))
+        if args.load_schedule:
+            print_phases(results.phase_stats, t, args.load_schedule, 'req/s' if args.rate else 'concurrency')
+    if len(topologies) > 1 and all(avg_rtts.values()):
+        base = topologies[0]
+        print()
+        for t in topologies[1:]:
+            print(f"{t.capitalize()} vs {base} average RTT: {avg_rtts[t]:.2f}ms vs {avg_rtts[base]:.2f}ms "
+                  f"({avg_rtts[t] - avg_rtts[base]:+.2f}ms)")
 
-    print(f"Wrote {len(all_rows)} rows to {args.out}")
+    if _hedger is not None:
+        print_hedging(_hedger)
+    print(f"Wrote {results.rows_written} rows to {args.out}")
+    if args.hist_out:
+        save_histograms(args.hist_out, {t: results.stats[t].rtt_hist for t in topologies if t in results.stats})
+        print(f"Wrote RTT histograms to {args.hist_out}")
 
 
 if __name__ == '__main__':
@@ -13,7 +13,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rcompute.proto\x12\x04\x64\x65mo\"0\n\x0e\x43omputeRequest\x12\r\n\x05value\x18\x01 \x01(\x05\x12\x0f\n\x07work_ms\x18\x02 \x01(\x05\"M\n\x0f\x43omputeResponse\x12\x0e\n\x06result\x18\x01 \x01(\x05\x12\x14\n\x0cservice_name\x18\x02 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x03 \x01(\x03\";\n\x10TransformRequest\x12\x16\n\x0e\x63omputed_value\x18\x01 \x01(\x05\x12\x0f\n\x07work_ms\x18\x02 \x01(\x05\"O\n\x11TransformResponse\x12\x0e\n\x06result\x18\x01 \x01(\x05\x12\x14\n\x0cservice_name\x18\x02 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x03 \x01(\x03\">\n\x10\x41ggregateRequest\x12\x19\n\x11transformed_value\x18\x01 \x01(\x05\x12\x0f\n\x07work_ms\x18\x02 \x01(\x05\"O\n\x11\x41ggregateResponse\x12\x0e\n\x06result\x18\x01 \x01(\x05\x12\x14\n\x0cservice_name\x18\x02 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x03 \x01(\x03\":\n\rRefineRequest\x12\x18\n\x10\x61ggregated_value\x18\x01 \x01(\x05\x12\x0f\n\x07work_ms\x18\x02 \x01(\x05\"L\n\x0eRefineResponse\x12\x0e\n\x06result\x18\x01 \x01(\x05\x12\x14\n\x0cservice_name\x18\x02 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x03 \x01(\x03\"9\n\x0f\x46inalizeRequest\x12\x15\n\rrefined_value\x18\x01 \x01(\x05\x12\x0f\n\x07work_ms\x18\x02 \x01(\x05\"P\n\x10\x46inalizeResponse\x12\x14\n\x0c\x66inal_result\x18\x01 \x01(\x05\x12\x10\n\x08pipeline\x18\x02 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x03 \x01(\x03\x32\xb7\x02\n\x07\x43ompute\x12\x38\n\x07\x43ompute\x12\x14.demo.ComputeRequest\x1a\x15.demo.ComputeResponse\"\x00\x12>\n\tTransform\x12\x16.demo.TransformRequest\x1a\x17.demo.TransformResponse\"\x00\x12>\n\tAggregate\x12\x16.demo.AggregateRequest\x1a\x17.demo.AggregateResponse\"\x00\x12\x35\n\x06Refine\x12\x13.demo.RefineRequest\x1a\x14.demo.RefineResponse\"\x00\x12;\n\x08\x46inalize\x12\x15.demo.FinalizeRequest\x1a\x16.demo.FinalizeResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rcompute.proto\x12\x04\x64\x65mo\"0\n\x0e\x43omputeRequest\x12\r\n\x05value\x18\x01 \x01(\x05\x12\x0f\n\x07work_ms\x18\x02 \x01(\x05\"d\n\x0f\x43omputeResponse\x12\x0e\n\x06result\x18\x01 \x01(\x05\x12\x14\n\x0cservice_name\x18\x02 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x03 \x01(\x03\x12\x15\n\rprocessing_us\x18\x04 \x01(\x03\";\n\x10TransformRequest\x12\x16\n\x0e\x63omputed_value\x18\x01 \x01(\x05\x12\x0f\n\x07work_ms\x18\x02 \x01(\x05\"f\n\x11TransformResponse\x12\x0e\n\x06result\x18\x01 \x01(\x05\x12\x14\n\x0cservice_name\x18\x02 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x03 \x01(\x03\x12\x15\n\rprocessing_us\x18\x04 \x01(\x03\">\n\x10\x41ggregateRequest\x12\x19\n\x11transformed_value\x18\x01 \x01(\x05\x12\x0f\n\x07work_ms\x18\x02 \x01(\x05\"f\n\x11\x41ggregateResponse\x12\x0e\n\x06result\x18\x01 \x01(\x05\x12\x14\n\x0cservice_name\x18\x02 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x03 \x01(\x03\x12\x15\n\rprocessing_us\x18\x04 \x01(\x03\":\n\rRefineRequest\x12\x18\n\x10\x61ggregated_value\x18\x01 \x01(\x05\x12\x0f\n\x07work_ms\x18\x02 \x01(\x05\"c\n\x0eRefineResponse\x12\x0e\n\x06result\x18\x01 \x01(\x05\x12\x14\n\x0cservice_name\x18\x02 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x03 \x01(\x03\x12\x15\n\rprocessing_us\x18\x04 \x01(\x03\"9\n\x0f\x46inalizeRequest\x12\x15\n\rrefined_value\x18\x01 \x01(\x05\x12\x0f\n\x07work_ms\x18\x02 \x01(\x05\"g\n\x10\x46inalizeResponse\x12\x14\n\x0c\x66inal_result\x18\x01 \x01(\x05\x12\x10\n\x08pipeline\x18\x02 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x03 \x01(\x03\x12\x15\n\rprocessing_us\x18\x04 \x01(\x03\"/\n\x0c\x42\x61tchRequest\x12\x0e\n\x06values\x18\x01 \x03(\x05\x12\x0f\n\x07work_ms\x18\x02 \x01(\x05\"c\n\rBatchResponse\x12\x0f\n\x07results\x18\x01 \x03(\x05\x12\x14\n\x0cservice_name\x18\x02 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x03 \x01(\x03\x12\x15\n\rprocessing_us\x18\x04 \x01(\x03\"_\n\rStreamRequest\x12\x12\n\nrequest_id\x18\x01 \x01(\x03\x12\x1a\n\x05stage\x18\x02 \x01(\x0e\x32\x0b.demo.Stage\x12\r\n\x05value\x18\x03 \x01(\x05\x12\x0f\n\x07work_ms\x18\x04 \x01(\x05\"w\n\x0eStreamResponse\x12\x12\n\nrequest_id\x18\x01 \x01(\x03\x12\x0e\n\x06result\x18\x02 \x01(\x05\x12\x14\n\x0cservice_name\x18\x03 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x04 \x01(\x03\x12\x15\n\rprocessing_us\x18\x05 \x01(\x03\"J\n\x0c\x43hainRequest\x12\x1a\n\x05stage\x18\x01 \x01(\x0e\x32\x0b.demo.Stage\x12\r\n\x05value\x18\x02 \x01(\x05\x12\x0f\n\x07work_ms\x18\x03 \x01(\x05\"Q\n\rChainResponse\x12\x0e\n\x06values\x18\x01 \x03(\x05\x12\x10\n\x08services\x18\x02 \x03(\t\x12\x0c\n\x04hops\x18\x03 \x01(\x05\x12\x10\n\x08stage_us\x18\x04 \x03(\x03\"H\n\x0fPipelineRequest\x12\r\n\x05value\x18\x01 \x01(\x05\x12\x0f\n\x07work_ms\x18\x02 \x01(\x05\x12\x15\n\rstage_work_ms\x18\x03 \x03(\x05\"r\n\x10PipelineResponse\x12\x0e\n\x06values\x18\x01 \x03(\x05\x12\x10\n\x08stage_us\x18\x02 \x03(\x03\x12\x10\n\x08total_us\x18\x03 \x01(\x03\x12\x14\n\x0cservice_name\x18\x04 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x05 \x01(\x03*L\n\x05Stage\x12\x0b\n\x07\x43OMPUTE\x10\x00\x12\r\n\tTRANSFORM\x10\x01\x12\r\n\tAGGREGATE\x10\x02\x12\n\n\x06REFINE\x10\x03\x12\x0c\n\x08\x46INALIZE\x10\x04\x32\x98\x06\n\x07\x43ompute\x12\x38\n\x07\x43ompute\x12\x14.demo.ComputeRequest\x1a\x15.demo.ComputeResponse\"\x00\x12>\n\tTransform\x12\x16.demo.TransformRequest\x1a\x17.demo.TransformResponse\"\x00\x12>\n\tAggregate\x12\x16.demo.AggregateRequest\x1a\x17.demo.AggregateResponse\"\x00\x12\x35\n\x06Refine\x12\x13.demo.RefineRequest\x1a\x14.demo.RefineResponse\"\x00\x12;\n\x08\x46inalize\x12\x15.demo.FinalizeRequest\x1a\x16.demo.FinalizeResponse\"\x00\x12\x39\n\x0c\x43omputeBatch\x12\x12.demo.BatchRequest\x1a\x13.demo.BatchResponse\"\x00\x12;\n\x0eTransformBatch\x12\x12.demo.BatchRequest\x1a\x13.demo.BatchResponse\"\x00\x12;\n\x0e\x41ggregateBatch\x12\x12.demo.BatchRequest\x1a\x13.demo.BatchResponse\"\x00\x12\x38\n\x0bRefineBatch\x12\x12.demo.BatchRequest\x1a\x13.demo.BatchResponse\"\x00\x12:\n\rFinalizeBatch\x12\x12.demo.BatchRequest\x1a\x13.demo.BatchResponse\"\x00\x12@\n\rProcessStream\x12\x13.demo.StreamRequest\x1a\x14.demo.StreamResponse\"\x00(\x01\x30\x01\x12\x32\n\x05\x43hain\x12\x12.demo.ChainRequest\x1a\x13.demo.ChainResponse\"\x00\x12>\n\x0bRunPipeline\x12\x15.demo.PipelineRequest\x1a\x16.demo.PipelineResponse\"\x00\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -21,26 +21,44 @@ _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'compute_pb2', _globals)
 if _descriptor._USE_C_DESCRIPTORS == False:
 
   DESCRIPTOR._options = None
+  _globals['_STAGE']._serialized_start=1550
+  _globals['_STAGE']._serialized_end=1626
   _globals['_COMPUTEREQUEST']._serialized_start=23
   _globals['_COMPUTEREQUEST']._serialized_end=71
   _globals['_COMPUTERESPONSE']._serialized_start=73
-  _globals['_COMPUTERESPONSE']._serialized_end=150
-  _globals['_TRANSFORMREQUEST']._serialized_start=152
-  _globals['_TRANSFORMREQUEST']._serialized_end=211
-  _globals['_TRANSFORMRESPONSE']._serialized_start=213
-  _globals['_TRANSFORMRESPONSE']._serialized_end=292
-  _globals['_AGGREGATEREQUEST']._serialized_start=294
-  _globals['_AGGREGATEREQUEST']._serialized_end=356
-  _globals['_AGGREGATERESPONSE']._serialized_start=358
-  _globals['_AGGREGATERESPONSE']._serialized_end=437
-  _globals['_REFINEREQUEST']._serialized_start=439
-  _globals['_REFINEREQUEST']._serialized_end=497
-  _globals['_REFINERESPONSE']._serialized_start=499
-  _globals['_REFINERESPONSE']._serialized_end=575
-  _globals['_FINALIZEREQUEST']._serialized_start=577
-  _globals['_FINALIZEREQUEST']._serialized_end=634
-  _globals['_FINALIZERESPONSE']._serialized_start=636
-  _globals['_FINALIZERESPONSE']._serialized_end=716
-  _globals['_COMPUTE']._serialized_start=719
-  _globals['_COMPUTE']._serialized_end=1030
+  _globals['_COMPUTERESPONSE']._serialized_end=173
+  _globals['_TRANSFORMREQUEST']._serialized_start=175
+  _globals['_TRANSFORMREQUEST']._serialized_end=234
+  _globals['_TRANSFORMRESPONSE']._serialized_start=236
+  _globals['_TRANSFORMRESPONSE']._serialized_end=338
+  _globals['_AGGREGATEREQUEST']._serialized_start=340
+  _globals['_AGGREGATEREQUEST']._serialized_end=402
+  _globals['_AGGREGATERESPONSE']._serialized_start=404
+  _globals['_AGGREGATERESPONSE']._serialized_end=506
+  _globals['_REFINEREQUEST']._serialized_start=508
+  _globals['_REFINEREQUEST']._serialized_end=566
+  _globals['_REFINERESPONSE']._serialized_start=568
+  _globals['_REFINERESPONSE']._serialized_end=667
+  _globals['_FINALIZEREQUEST']._serialized_start=669
+  _globals['_FINALIZEREQUEST']._serialized_end=726
+  _globals['_FINALIZERESPONSE']._serialized_start=728
+  _globals['_FINALIZERESPONSE']._serialized_end=831
+  _globals['_BATCHREQUEST']._serialized_start=833
+  _globals['_BATCHREQUEST']._serialized_end=880
+  _globals['_BATCHRESPONSE']._serialized_start=882
+  _globals['_BATCHRESPONSE']._serialized_end=981
+  _globals['_STREAMREQUEST']._serialized_start=983
+  _globals['_STREAMREQUEST']._serialized_end=1078
+  _globals['_STREAMRESPONSE']._serialized_start=1080
+  _globals['_STREAMRESPONSE']._serialized_end=1199
+  _globals['_CHAINREQUEST']._serialized_start=1201
+  _globals['_CHAINREQUEST']._serialized_end=1275
+  _globals['_CHAINRESPONSE']._serialized_start=1277
+  _globals['_CHAINRESPONSE']._serialized_end=1358
+  _globals['_PIPELINEREQUEST']._serialized_start=1360
+  _globals['_PIPELINEREQUEST']._serialized_end=1432
+  _globals['_PIPELINERESPONSE']._serialized_start=1434
+  _globals['_PIPELINERESPONSE']._serialized_end=1548
+  _globals['_COMPUTE']._serialized_start=1629
+  _globals['_COMPUTE']._serialized_end=2421
 # @@protoc_insertion_point(module_scope)
@@ -1,4 +1,8 @@
 from concurrent import futures
+import argparse
+import asyncio
+import queue
+import threading
 import time
 import grpc
 import os
@@ -11,100 +15,536 @@ import compute_pb2_grpc
 
 SERVICE_NAME = os.environ.get("SERVICE_NAME", "Unknown")
 PORT = int(os.environ.get("PORT", "50051"))
+SERVER_MODE = os.environ.get("SERVER_MODE", "thread")
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "10"))
+# Chained mode: downstream stage used when the request carries no route metadata
+NEXT_TARGET = os.environ.get("NEXT_TARGET", "")
+ROUTE_METADATA_KEY = "x-next-targets"
+# The sync server reports "no deadline" from time_remaining() as ~9.2e18 s (gRPC's infinite future), not None
+NO_DEADLINE_S = 1e9
+
+
+# Stage operations (pure functions of the value, shared by every server mode)
+def inventory(value):
+    """Service A: Inventory Check - add incoming stock to base inventory (100)"""
+    return value + 100
+
+
+def sales_tax(value):
+    """Service B: Apply Tax - calculate total with 15% sales tax"""
+    return int(value * 1.15)
+
+
+def shipping(value):
+    """Service C: Calculate Shipping - $50 base + $1 per 10 units"""
+    return 50 + (value // 10)
+
+
+def processing_fee(value):
+    """Service D: Processing Fee - add 2.5% transaction fee"""
+    return int(value * 1.025)
+
+
+def round_currency(value):
+    """Service E: Round to Currency - round final amount down to nearest $5"""
+    return (value // 5) * 5
+
+
+def elapsed_us(start_ns):
+    """Microseconds since a time.perf_counter_ns() reading (reported to clients as processing_us)"""
+    return (time.perf_counter_ns() - start_ns) // 1000
+
+
+# Stage enum (StreamRequest.stage) -> operation
+STAGE_OPS = {
+    compute_pb2.COMPUTE: inventory,
+    compute_pb2.TRANSFORM: sales_tax,
+    compute_pb2.AGGREGATE: shipping,
+    compute_pb2.REFINE: processing_fee,
+    compute_pb2.FINALIZE: round_currency,
+}
+PIPELINE_OPS = [inventory, sales_tax, shipping, processing_fee, round_currency]
+
+
+def pipeline_work_ms(request):
+    """Per-stage work for RunPipeline: stage_work_ms if all 5 are given, else work_ms for every stage"""
+    if len(request.stage_work_ms) == len(PIPELINE_OPS):
+        return list(request.stage_work_ms)
+    return [request.work_ms or 0] * len(PIPELINE_OPS)
+
+
+def next_hop(context):
+    """
+    Pick the downstream target for a Chain call.
+    The x-next-targets metadata ("b:50051,c:50051,...") wins; its first entry is
+    the next hop and the rest is forwarded. Otherwise fall back to NEXT_TARGET.
+    """
+    for key, value in context.invocation_metadata():
+        if key == ROUTE_METADATA_KEY:
+            route = [t.strip() for t in value.split(',') if t.strip()]
+            if route:
+                return route[0], ((ROUTE_METADATA_KEY, ','.join(route[1:])),)
+    return NEXT_TARGET, ()
+
+
+def chain_timeout(context):
+    """Propagate the caller's remaining deadline to the downstream call (None when the caller set none)"""
+    remaining = context.time_remaining()
+    if remaining is None or remaining >= NO_DEADLINE_S:
+        return None
+    return remaining
+
+
+class ChannelPool:
+    """Downstream channels/stubs keyed by target, created once and reused by every Chain call"""
+
+    def __init__(self, channel_factory=grpc.insecure_channel):
+        self._channel_factory = channel_factory
+        self._stubs = {}
+        self._channels = []
+        self._lock = threading.Lock()
+
+    def stub(self, target):
+        with self._lock:
+            stub = self._stubs.get(target)
+            if stub is None:
+                channel = self._channel_factory(target)
+                self._channels.append(channel)
+                stub = self._stubs[target] = compute_pb2_grpc.ComputeStub(channel)
+            return stub
+
+    def close(self):
+        with self._lock:
+            channels, self._channels, self._stubs = self._channels, [], {}
+        return [channel.close() for channel in channels]
 
 
 class ComputeServicer(compute_pb2_grpc.ComputeServicer):
     """Service that implements the pipeline: Compute -> Transform -> Aggregate"""
+
+    def __init__(self, stream_workers=MAX_WORKERS):
+        # Work for ProcessStream items runs here so one stream can have many requests in flight
+        self._stream_pool = futures.ThreadPoolExecutor(max_workers=stream_workers)
+        self.downstream = ChannelPool()
     
     def Compute(self, request, context):
         """Service A: Inventory Check - add incoming stock to base inventory"""
+        start_ns = time.perf_counter_ns()
         work_ms = request.work_ms if request.work_ms else 0
         time.sleep(work_ms / 1000.0)
         
-        # Inventory: base_inventory (100) + incoming stock
-        result = request.value + 100
+        result = inventory(request.value)
         timestamp_ms = int(time.time() * 1000)
         
         return compute_pb2.ComputeResponse(
             result=result,
             service_name=SERVICE_NAME,
-            timestamp_ms=timestamp_ms
+            timestamp_ms=timestamp_ms,
+            processing_us=elapsed_us(start_ns)
         )
     
     def Transform(self, request, context):
         """Service B: Apply Tax - calculate total with 15% sales tax"""
+        start_ns = time.perf_counter_ns()
         work_ms = request.work_ms if request.work_ms else 0
         time.sleep(work_ms / 1000.0)
         
-        # Tax: apply 15% sales tax
-        result = int(request.computed_value * 1.15)
+        result = sales_tax(request.computed_value)
         timestamp_ms = int(time.time() * 1000)
         
         return compute_pb2.TransformResponse(
             result=result,
             service_name=SERVICE_NAME,
-            timestamp_ms=timestamp_ms
+            timestamp_ms=timestamp_ms,
+            processing_us=elapsed_us(start_ns)
         )
     
     def Aggregate(self, request, context):
         """Service C: Calculate Shipping - base cost plus weight-based rate"""
+        start_ns = time.perf_counter_ns()
         work_ms = request.work_ms if request.work_ms else 0
         time.sleep(work_ms / 1000.0)
         
-        # Shipping: $50 base + $1 per 10 units
-        result = 50 + (request.transformed_value // 10)
+        result = shipping(request.transformed_value)
         timestamp_ms = int(time.time() * 1000)
         
         return compute_pb2.AggregateResponse(
             result=result,
             service_name=SERVICE_NAME,
-            timestamp_ms=timestamp_ms
+            timestamp_ms=timestamp_ms,
+            processing_us=elapsed_us(start_ns)
         )
     
     def Refine(self, request, context):
         """Service D: Processing Fee - add 2.5% transaction fee"""
+        start_ns = time.perf_counter_ns()
         work_ms = request.work_ms if request.work_ms else 0
         time.sleep(work_ms / 1000.0)
         
-        # Processing fee: add 2.5% transaction fee
-        result = int(request.aggregated_value * 1.025)
+        result = processing_fee(request.aggregated_value)
         timestamp_ms = int(time.time() * 1000)
         
         return compute_pb2.RefineResponse(
             result=result,
             service_name=SERVICE_NAME,
-            timestamp_ms=timestamp_ms
+            timestamp_ms=timestamp_ms,
+            processing_us=elapsed_us(start_ns)
         )
     
     def Finalize(self, request, context):
         """Service E: Round to Currency - round final amount to nearest $5"""
+        start_ns = time.perf_counter_ns()
         work_ms = request.work_ms if request.work_ms else 0
         time.sleep(work_ms / 1000.0)
         
-        # Round to nearest $5 for final invoice
-        result = (request.refined_value // 5) * 5
+        result = round_currency(request.refined_value)
         timestamp_ms = int(time.time() * 1000)
         
         return compute_pb2.FinalizeResponse(
             final_result=result,
             pipeline="A->B->C->D->E",
-            timestamp_ms=timestamp_ms
+            timestamp_ms=timestamp_ms,
+            processing_us=elapsed_us(start_ns)
+        )
+
+    def _batch(self, op, request):
+        """Apply one stage operation to every value in a BatchRequest (work paid once)"""
+        start_ns = time.perf_counter_ns()
+        work_ms = request.work_ms if request.work_ms else 0
+        time.sleep(work_ms / 1000.0)
+
+        return compute_pb2.BatchResponse(
+            results=[op(v) for v in request.values],
+            service_name=SERVICE_NAME,
+            timestamp_ms=int(time.time() * 1000),
+            processing_us=elapsed_us(start_ns)
+        )
+
+    def ComputeBatch(self, request, context):
+        return self._batch(inventory, request)
+
+    def TransformBatch(self, request, context):
+        return self._batch(sales_tax, request)
+
+    def AggregateBatch(self, request, context):
+        return self._batch(shipping, request)
+
+    def RefineBatch(self, request, context):
+        return self._batch(processing_fee, request)
+
+    def FinalizeBatch(self, request, context):
+        return self._batch(round_currency, request)
+
+    def _stream_item(self, request):
+        start_ns = time.perf_counter_ns()
+        work_ms = request.work_ms if request.work_ms else 0
+        time.sleep(work_ms / 1000.0)
+
+        return compute_pb2.StreamResponse(
+            request_id=request.request_id,
+            result=STAGE_OPS[request.stage](request.value),
+            service_name=SERVICE_NAME,
+            timestamp_ms=int(time.time() * 1000),
+            processing_us=elapsed_us(start_ns)
+        )
+
+    def ProcessStream(self, request_iterator, context):
+        """Streaming: process requests concurrently and yield each response as soon as it is ready"""
+        responses = queue.Queue()
+        outstanding = set()
+        lock = threading.Lock()
+
+        def on_done(fut):
+            with lock:
+                outstanding.discard(fut)
+            responses.put(fut)
+
+        def read_requests():
+            try:
+                for request in request_iterator:
+                    fut = self._stream_pool.submit(self._stream_item, request)
+                    with lock:
+                        outstanding.add(fut)
+                    fut.add_done_callback(on_done)
+            except Exception:
+                pass  # client went away; drain what was already accepted
+            finally:
+                with lock:
+                    remaining = list(outstanding)
+                futures.wait(remaining)
+                responses.put(None)
+
+        threading.Thread(target=read_requests, daemon=True).start()
+        for fut in iter(responses.get, None):
+            yield fut.result()
+
+    def Chain(self, request, context):
+        """Chained mode: apply this stage, forward downstream, return every later stage's value"""
+        start_ns = time.perf_counter_ns()
+        work_ms = request.work_ms if request.work_ms else 0
+        time.sleep(work_ms / 1000.0)
+
+        result = STAGE_OPS[request.stage](request.value)
+        response = compute_pb2.ChainResponse(values=[result], services=[SERVICE_NAME], hops=1,
+                                              stage_us=[elapsed_us(start_ns)])
+        if request.stage == compute_pb2.FINALIZE:
+            return response
+
+        target, metadata = next_hop(context)
+        if not target:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION,
+                          f"{SERVICE_NAME}: no next target for stage {compute_pb2.Stage.Name(request.stage)}")
+        downstream = self.downstream.stub(target).Chain(
+            compute_pb2.ChainRequest(stage=request.stage + 1, value=result, work_ms=request.work_ms),
+            timeout=chain_timeout(context),
+            metadata=metadata
+        )
+        response.values.extend(downstream.values)
+        response.services.extend(downstream.services)
+        response.hops += downstream.hops
+        response.stage_us.extend(downstream.stage_us)
+        return response
+
+    def RunPipeline(self, request, context):
+        """Fused mode: run all five stages in process and time each one"""
+        if request.stage_work_ms and len(request.stage_work_ms) != len(PIPELINE_OPS):
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "stage_work_ms must have 5 entries (A..E)")
+        response = compute_pb2.PipelineResponse(service_name=SERVICE_NAME)
+        value = request.value
+        start_ns = time.perf_counter_ns()
+        for op, work_ms in zip(PIPELINE_OPS, pipeline_work_ms(request)):
+            stage_start_ns = time.perf_counter_ns()
+            time.sleep(work_ms / 1000.0)
+            value = op(value)
+            response.values.append(value)
+            response.stage_us.append((time.perf_counter_ns() - stage_start_ns) // 1000)
+        response.total_us = (time.perf_counter_ns() - start_ns) // 1000
+        response.timestamp_ms = int(time.time() * 1000)
+        return response
+
+
+class AsyncComputeServicer(compute_pb2_grpc.ComputeServicer):
+    """grpc.aio version of ComputeServicer.
+
+    Handlers are coroutines and simulate work with asyncio.sleep, so a single
+    event loop can keep thousands of RPCs in flight instead of being capped
+    by the thread pool size.
+    """
+
+    def __init__(self):
+        self.downstream = ChannelPool(grpc.aio.insecure_channel)
+
+    async def Compute(self, request, context):
+        """Service A: Inventory Check - add incoming stock to base inventory"""
+        start_ns = time.perf_counter_ns()
+        await asyncio.sleep((request.work_ms or 0) / 1000.0)
+        return compute_pb2.ComputeResponse(
+            result=inventory(request.value),
+            service_name=SERVICE_NAME,
+            timestamp_ms=int(time.time() * 1000),
+            processing_us=elapsed_us(start_ns)
+        )
+
+    async def Transform(self, request, context):
+        """Service B: Apply Tax - calculate total with 15% sales tax"""
+        start_ns = time.perf_counter_ns()
+        await asyncio.sleep((request.work_ms or 0) / 1000.0)
+        return compute_pb2.TransformResponse(
+            result=sales_tax(request.computed_value),
+            service_name=SERVICE_NAME,
+            timestamp_ms=int(time.time() * 1000),
+            processing_us=elapsed_us(start_ns)
+        )
+
+    async def Aggregate(self, request, context):
+        """Service C: Calculate Shipping - base cost plus weight-based rate"""
+        start_ns = time.perf_counter_ns()
+        await asyncio.sleep((request.work_ms or 0) / 1000.0)
+        return compute_pb2.AggregateResponse(
+            result=shipping(request.transformed_value),
+            service_name=SERVICE_NAME,
+            timestamp_ms=int(time.time() * 1000),
+            processing_us=elapsed_us(start_ns)
+        )
+
+    async def Refine(self, request, context):
+        """Service D: Processing Fee - add 2.5% transaction fee"""
+        start_ns = time.perf_counter_ns()
+        await asyncio.sleep((request.work_ms or 0) / 1000.0)
+        return compute_pb2.RefineResponse(
+            result=processing_fee(request.aggregated_value),
+            service_name=SERVICE_NAME,
+            timestamp_ms=int(time.time() * 1000),
+            processing_us=elapsed_us(start_ns)
+        )
+
+    async def Finalize(self, request, context):
+        """Service E: Round to Currency - round final amount to nearest $5"""
+        start_ns = time.perf_counter_ns()
+        await asyncio.sleep((request.work_ms or 0) / 1000.0)
+        return compute_pb2.FinalizeResponse(
+            final_result=round_currency(request.refined_value),
+            pipeline="A->B->C->D->E",
+            timestamp_ms=int(time.time() * 1000),
+            processing_us=elapsed_us(start_ns)
         )
 
+    async def _batch(self, op, request):
+        start_ns = time.perf_counter_ns()
+        await asyncio.sleep((request.work_ms or 0) / 1000.0)
+        return compute_pb2.BatchResponse(
+            results=[op(v) for v in request.values],
+            service_name=SERVICE_NAME,
+            timestamp_ms=int(time.time() * 1000),
+            processing_us=elapsed_us(start_ns)
+        )
+
+    async def ComputeBatch(self, request, context):
+        return await self._batch(inventory, request)
+
+    async def TransformBatch(self, request, context):
+        return await self._batch(sales_tax, request)
+
+    async def AggregateBatch(self, request, context):
+        return await self._batch(shipping, request)
+
+    async def RefineBatch(self, request, context):
+        return await self._batch(processing_fee, request)
+
+    async def FinalizeBatch(self, request, context):
+        return await self._batch(round_currency, request)
+
+    async def ProcessStream(self, request_iterator, context):
+        """Streaming: one task per request, responses yielded in completion order"""
+        responses = asyncio.Queue()
+
+        async def handle(request):
+            start_ns = time.perf_counter_ns()
+            await asyncio.sleep((request.work_ms or 0) / 1000.0)
+            await responses.put(compute_pb2.StreamResponse(
+                request_id=request.request_id,
+                result=STAGE_OPS[request.stage](request.value),
+                service_name=SERVICE_NAME,
+                timestamp_ms=int(time.time() * 1000),
+                processing_us=elapsed_us(start_ns)
+            ))
+
+        async def read_requests():
+            tasks = set()
+            try:
+                async for request in request_iterator:
+                    task = asyncio.create_task(handle(request))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                await asyncio.gather(*tasks)
+            finally:
+                await responses.put(None)
+
+        reader = asyncio.create_task(read_requests())
+        try:
+            while True:
+                response = await responses.get()
+                if response is None:
+                    break
+                yield response
+        finally:
+            reader.cancel()
+
+    async def Chain(self, request, context):
+        """Chained mode: apply this stage, forward downstream, return every later stage's value"""
+        start_ns = time.perf_counter_ns()
+        await asyncio.sleep((request.work_ms or 0) / 1000.0)
 
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    compute_pb2_grpc.add_ComputeServicer_to_server(ComputeServicer(), server)
+        result = STAGE_OPS[request.stage](request.value)
+        response = compute_pb2.ChainResponse(values=[result], services=[SERVICE_NAME], hops=1,
+                                              stage_us=[elapsed_us(start_ns)])
+        if request.stage == compute_pb2.FINALIZE:
+            return response
+
+        target, metadata = next_hop(context)
+        if not target:
+            await context.abort(grpc.StatusCode.FAILED_PRECONDITION,
+                                f"{SERVICE_NAME}: no next target for stage {compute_pb2.Stage.Name(request.stage)}")
+        downstream = await self.downstream.stub(target).Chain(
+            compute_pb2.ChainRequest(stage=request.stage + 1, value=result, work_ms=request.work_ms),
+            timeout=chain_timeout(context),
+            metadata=metadata
+        )
+        response.values.extend(downstream.values)
+        response.services.extend(downstream.services)
+        response.hops += downstream.hops
+        response.stage_us.extend(downstream.stage_us)
+        return response
+
+    async def RunPipeline(self, request, context):
+        """Fused mode: run all five stages in process and time each one"""
+        if request.stage_work_ms and len(request.stage_work_ms) != len(PIPELINE_OPS):
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "stage_work_ms must have 5 entries (A..E)")
+        response = compute_pb2.PipelineResponse(service_name=SERVICE_NAME)
+        value = request.value
+        start_ns = time.perf_counter_ns()
+        for op, work_ms in zip(PIPELINE_OPS, pipeline_work_ms(request)):
+            stage_start_ns = time.perf_counter_ns()
+            await asyncio.sleep(work_ms / 1000.0)
+            value = op(value)
+            response.values.append(value)
+            response.stage_us.append((time.perf_counter_ns() - stage_start_ns) // 1000)
+        response.total_us = (time.perf_counter_ns() - start_ns) // 1000
+        response.timestamp_ms = int(time.time() * 1000)
+        return response
+
+
+def serve(max_workers=MAX_WORKERS):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+    servicer = ComputeServicer()
+    compute_pb2_grpc.add_ComputeServicer_to_server(servicer, server)
     listen_addr = f"0.0.0.0:{PORT}"
     server.add_insecure_port(listen_addr)
-    print(f"{SERVICE_NAME} starting on {listen_addr}")
+    print(f"{SERVICE_NAME} starting on {listen_addr} (mode=thread, max_workers={max_workers})")
+    if NEXT_TARGET:
+        print(f"Chained mode: forwarding to {NEXT_TARGET}")
     server.start()
     try:
         while True:
             time.sleep(86400)
     except KeyboardInterrupt:
         server.stop(0)
+        servicer.downstream.close()
+
+
+async def serve_aio():
+    server = grpc.aio.server()
+    servicer = AsyncComputeServicer()
+    compute_pb2_grpc.add_ComputeServicer_to_server(servicer, server)
+    listen_addr = f"0.0.0.0:{PORT}"
+    server.add_insecure_port(listen_addr)
+    print(f"{SERVICE_NAME} starting on {listen_addr} (mode=aio)")
+    if NEXT_TARGET:
+        print(f"Chained mode: forwarding to {NEXT_TARGET}")
+    await server.start()
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(0)
+        await asyncio.gather(*servicer.downstream.close())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='gRPC pipeline stage server')
+    parser.add_argument('--mode', choices=['thread', 'aio'], default=SERVER_MODE,
+                        help='thread: grpc.server on a ThreadPoolExecutor; aio: grpc.aio server on one event loop (env SERVER_MODE)')
+    parser.add_argument('--max-workers', type=int, default=MAX_WORKERS,
+                        help='thread pool size for --mode thread (env MAX_WORKERS, default 10)')
+    args = parser.parse_args()
+
+    if args.mode == 'aio':
+        try:
+            asyncio.run(serve_aio())
+        except KeyboardInterrupt:
+            pass
+    else:
+        serve(args.max_workers)
 
 
 if __name__ == '__main__':
-    serve()
\ No newline at end of file
+    main()
@@ -7,15 +7,27 @@ Follows the service flow defined in SERVICE_DESCRIPTIONS.md
 import requests
 import threading
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
 import time
 import csv
 import argparse
 import concurrent.futures
+import copy
+import multiprocessing
 import random
 import sys
-from typing import List, Dict
+from typing import Deque, List, Dict, Optional, Tuple
+from collections import deque
 import os
+import queue
+import json
+import math
+import heapq
+import itertools
+import socket
+import struct
+import urllib.parse
 
 STAGE_KEYS = [
     ("computed", "service_a"),
@@ -24,6 +36,14 @@ STAGE_KEYS = [
     ("refined", "service_d"),
     ("final_result", "service_e"),
 ]
+# Prefixes of the per-stage timing columns (a_us, a_server_us, ...)
+STAGE_COLUMNS = ["a", "b", "c", "d", "e"]
+# Binary /process wire format (see stage_server.py): the request is one little-endian
+# int64 value; the response is the int64 result, uint32 processing_us and the stage letter
+BINARY_TYPE = "application/x-stage-int64"
+BINARY_REQUEST = struct.Struct("<q")
+BINARY_RESPONSE = struct.Struct("<qIc")
+BINARY_HEADERS = {"Content-Type": BINARY_TYPE, "Accept": BINARY_TYPE}
 
 # Try to force line-buffering of stdout so prints appear promptly in terminals
 try:
@@ -33,30 +53,79 @@ except Exception:
     # best-effort only; continue if not supported
     pass
 
+class CountingConnection(HTTPConnection):
+    """HTTPConnection that counts the TCP connections it opens and the requests it sends, per host.
+
+    urllib3 reuses the same connection object when it reconnects a socket the
+    server closed, so its own pool counters cannot tell keep-alive from
+    a connection per request.
+    """
+    counts: Dict[str, List[int]] = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def record(cls, host: str, index: int):
+        """Count a connection opened (index 0) or a request sent (index 1) to host:port"""
+        with cls.lock:
+            cls.counts.setdefault(host, [0, 0])[index] += 1
+
+    def connect(self):
+        super().connect()
+        self.record(f"{self.host}:{self.port}", 0)
+
+    def request(self, *args, **kwargs):
+        self.record(f"{self.host}:{self.port}", 1)
+        return super().request(*args, **kwargs)
+
+
+class CountingConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CountingConnection
+
+
+class CountingAdapter(HTTPAdapter):
+    """HTTPAdapter whose plain-HTTP pools use CountingConnection"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {**self.poolmanager.pool_classes_by_scheme,
+                                                   'http': CountingConnectionPool}
+
+
+def connection_counts() -> Dict[str, List[int]]:
+    """Return {host:port: [connections opened, requests sent]} for this process"""
+    with CountingConnection.lock:
+        return {host: list(entry) for host, entry in CountingConnection.counts.items()}
+
+
+def merge_connection_counts(counts: Dict[str, List[int]]):
+    """Add a worker process's connection_counts() to this process's"""
+    with CountingConnection.lock:
+        for host, (opened, sent) in counts.items():
+            entry = CountingConnection.counts.setdefault(host, [0, 0])
+            entry[0] += opened
+            entry[1] += sent
+
+
 # Thread-local session to enable connection pooling per worker thread
 thread_local = threading.local()
 
 # Shared session used when created by run_experiment. Kept global so all threads reuse same pool.
 _shared_session = None
 
-def create_shared_session(pool_maxsize: int = 10, pool_connections: int = 10, retries: int = 3) -> requests.Session:
-    """Create a shared requests.Session with a pooled HTTPAdapter and retries/backoff.
+def create_shared_session(pool_maxsize: int = 10, pool_connections: int = 10) -> requests.Session:
+    """Create a shared requests.Session with a pooled HTTPAdapter.
+
+    The adapter makes a single attempt per call; retries are decided by
+    PipelineRequest against the retry budget and stage deadlines.
 
     Args:
         pool_maxsize: maximum connections per host pool (important for concurrency)
         pool_connections: number of host pools to keep
-        retries: total retry attempts for idempotent/transient errors
     """
     global _shared_session
     if _shared_session is None:
         session = requests.Session()
-        retry = Retry(
-            total=retries,
-            backoff_factor=0.5,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=frozenset(['HEAD', 'GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
-        )
-        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        adapter = CountingAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
         session.mount('http://', adapter)
         session.mount('https://', adapter)
         session.headers.update({'Connection': 'keep-alive'})
@@ -76,132 +145,1651 @@ def get_session() -> requests.Session:
     # Fallback: thread-local session (keeps previous behavior if shared not created)
     if not hasattr(thread_local, 'session'):
         session = requests.Session()
-        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+        adapter = CountingAdapter(pool_connections=10, pool_maxsize=10)
         session.mount('http://', adapter)
         session.mount('https://', adapter)
         session.headers.update({'Connection': 'keep-alive'})
         thread_local.session = session
     return thread_local.session
 
-# Per-call retry/backoff settings
-DEFAULT_CALL_RETRIES = 5
-CALL_BACKOFF_FACTOR = 0.5
-CALL_JITTER = 0.1
+# Retry policy. This is the only retry layer: the pooled adapter makes one attempt per call.
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+MAX_ATTEMPTS = 3               # per stage call, first attempt included
+RETRY_BACKOFF_BASE = 0.05      # seconds; doubled per attempt, full jitter
+RETRY_BACKOFF_MAX = 1.0
+DEFAULT_RETRY_BUDGET = 10.0    # retries as a percentage of stage calls
+DEFAULT_STAGE_DEADLINE_MS = 10000
 
-def call_service(url: str, value: int) -> int:
-    """Invoke a service endpoint and return the computed value."""
-    session = get_session()
 
-    last_exc = None
-    for attempt in range(1, DEFAULT_CALL_RETRIES + 1):
-        try:
-            response = session.post(
-                f"{url}/process",
-                json={"value": value},
-                timeout=30
-            )
-            response.raise_for_status()
-            data = response.json()
-            break
-        except requests.exceptions.RequestException as e:
-            last_exc = e
-            # If this was the last attempt, re-raise and let the caller handle it
-            if attempt == DEFAULT_CALL_RETRIES:
-                raise
-            # Backoff with jitter
-            backoff = CALL_BACKOFF_FACTOR * (2 ** (attempt - 1))
-            time.sleep(backoff + random.uniform(0, CALL_JITTER))
+class RetryBudget:
+    """
+    Client-wide cap on retries: at most `percent` of the stage calls made so
+    far, plus `min_retries` so a short run can still retry. When a stage is
+    failing everywhere the budget runs out and requests fail fast instead of
+    multiplying the load on it.
+    """
+
+    def __init__(self, percent: float = DEFAULT_RETRY_BUDGET, min_retries: int = 10):
+        self.ratio = percent / 100
+        self.min_retries = min_retries
+        self.calls = 0
+        self.retries = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def record_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget; False (and counted as denied) if it is used up"""
+        with self._lock:
+            if self.retries < self.min_retries + self.ratio * self.calls:
+                self.retries += 1
+                return True
+            self.denied += 1
+            return False
+
+
+class RetryTimer:
+    """
+    One daemon thread that runs callbacks after a delay, so a request waiting
+    out its retry backoff does not hold a worker thread.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, object, tuple]] = []
+        self._ids = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def call_later(self, delay: float, fn, *args):
+        with self._cond:
+            self._ids += 1
+            heapq.heappush(self._heap, (time.monotonic() + delay, self._ids, fn, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="retry-timer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, fn, args = heapq.heappop(self._heap)
+            try:
+                fn(*args)
+            except Exception as e:
+                # keep the one timer thread alive for every other parked request
+                print(f"Retry timer callback {getattr(fn, '__name__', fn)} failed: {e}", flush=True)
+
 
+# Set by configure_retries() from run_experiment (and each shard)
+_retry_budget = RetryBudget()
+_stage_deadlines_s = [DEFAULT_STAGE_DEADLINE_MS / 1000] * len(STAGE_COLUMNS)
+_retry_timer = RetryTimer()
+# Values sent together per stage call (/process/batch when > 1)
+_batch_size = 1
+# Chained topology: the client calls A's /process/chain and each stage forwards to the next
+_chained = False
+# Body format of /process calls: "json" or "binary" (BINARY_TYPE)
+_wire = "json"
+
+
+def configure_retries(budget_percent: float, stage_deadlines_ms: List[float]):
+    global _retry_budget, _stage_deadlines_s
+    _retry_budget = RetryBudget(budget_percent, min_retries=10 if budget_percent > 0 else 0)
+    _stage_deadlines_s = [ms / 1000 for ms in stage_deadlines_ms]
+
+
+def configure_batching(batch_size: int):
+    global _batch_size
+    if batch_size < 1:
+        raise ValueError("Batch size must be at least 1")
+    _batch_size = batch_size
+
+
+def configure_topology(chained: bool):
+    global _chained
+    _chained = chained
+
+
+def configure_wire(wire: str):
+    global _wire
+    if wire not in ("json", "binary"):
+        raise ValueError(f"Unknown wire format {wire!r}")
+    _wire = wire
+
+
+def batch_sizes(requests_count: int) -> List[int]:
+    """Split requests_count values into pipeline requests of up to _batch_size values"""
+    return [min(_batch_size, requests_count - start) for start in range(0, requests_count, _batch_size)]
+
+
+def parse_stage_deadlines(spec: str) -> List[float]:
+    """Per-stage deadlines in ms from one value for every stage or five comma-separated values (A..E)"""
+    values = [float(x) for x in spec.split(",") if x.strip()]
+    if len(values) == 1:
+        values *= len(STAGE_COLUMNS)
+    if len(values) != len(STAGE_COLUMNS) or any(v <= 0 for v in values):
+        raise ValueError("Expected one deadline or five (A..E), all > 0")
+    return values
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Connection failures and overload/5xx statuses are retried; timeouts mean the stage deadline is gone"""
+    if isinstance(exc, requests.exceptions.Timeout):
+        return False
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return exc.response is not None and exc.response.status_code in RETRY_STATUSES
+    return isinstance(exc, requests.exceptions.ConnectionError)
+
+
+def call_service(url: str, value: int, timeout: float = DEFAULT_STAGE_DEADLINE_MS / 1000) -> Tuple[int, Optional[int]]:
+    """Make one call to a service endpoint; return the computed value and the service's reported processing time (us)."""
+    if _wire == "binary":
+        response = get_session().post(
+            f"{url}/process",
+            data=BINARY_REQUEST.pack(value),
+            headers=BINARY_HEADERS,
+            timeout=timeout
+        )
+        response.raise_for_status()
+        if len(response.content) != BINARY_RESPONSE.size:
+            raise ValueError(f"Service at {url} returned {len(response.content)} bytes, "
+                             f"not a {BINARY_RESPONSE.size}-byte {BINARY_TYPE} response")
+        result, processing_us, _ = BINARY_RESPONSE.unpack(response.content)
+        return result, processing_us
+    response = get_session().post(
+        f"{url}/process",
+        json={"value": value},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    data = response.json()
     if "value" not in data:
         raise ValueError(f"Service at {url} returned no 'value'")
-    return int(data["value"])
+    return int(data["value"]), data.get("processing_us")
+
+
+def call_service_batch(url: str, values: List[int],
+                       timeout: float = DEFAULT_STAGE_DEADLINE_MS / 1000) -> Tuple[List[int], Optional[int]]:
+    """Make one /process/batch call; return the computed values and the service's reported processing time (us)."""
+    response = get_session().post(
+        f"{url}/process/batch",
+        json={"values": values},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    data = response.json()
+    if len(data.get("values") or []) != len(values):
+        raise ValueError(f"Service at {url} returned {len(data.get('values') or [])} values for {len(values)}")
+    return [int(value) for value in data["values"]], data.get("processing_us")
+
 
-def process_request(service_urls: List[str], input_value: int) -> Dict:
+def call_chain(url: str, value: int, route: List[str], timeout: float) -> Dict:
     """
-    Process a single request through the 5-stage pipeline:
-    Service A (Inventory) -> B (Sales Tax) -> C (Shipping) -> D (Processing Fee) -> E (Currency Rounding)
+    One /process/chain call: the service applies its stage and forwards the result
+    along `route` (the URLs of the later stages); returns its response with the
+    value, processing time (us) and service of every stage and the number of hops.
     """
-    send_ts = int(time.time() * 1000)  # milliseconds
-    stage_values = {key: None for key, _ in STAGE_KEYS}
-    service_mapping = {
-        "service_a": service_urls[0],
-        "service_b": service_urls[1],
-        "service_c": service_urls[2],
-        "service_d": service_urls[3],
-        "service_e": service_urls[4],
-    }
-    
+    response = get_session().post(
+        f"{url}/process/chain",
+        json={"value": value, "route": route, "timeout_ms": timeout * 1000},
+        timeout=timeout
+    )
+    if response.status_code != 200:
+        try:
+            error = response.json().get("error")
+        except ValueError:
+            error = response.reason
+        raise requests.exceptions.HTTPError(f"{response.status_code} from {url}: {error}", response=response)
+    data = response.json()
+    if len(data.get("values") or []) != len(STAGE_KEYS):
+        raise ValueError(f"Chain from {url} returned {len(data.get('values') or [])} stage values")
+    return data
+
+
+class StageStream:
+    """
+    One long-lived POST /process/stream to a single replica: a chunked request
+    body of NDJSON {"id", "value"} lines, answered by a chunked NDJSON response.
+    call() writes a line and waits for its result; a reader thread resolves
+    the waiting futures from the result lines, matched by id.
+    """
+
+    def __init__(self, url: str):
+        parsed = urllib.parse.urlsplit(url)
+        self.url = url
+        self._host = f"{parsed.hostname}:{parsed.port or 80}"
+        self._sock = socket.create_connection((parsed.hostname, parsed.port or 80))
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock.sendall(f"POST {parsed.path.rstrip('/')}/process/stream HTTP/1.1\r\nHost: {parsed.netloc}\r\n"
+                           "Content-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n\r\n".encode())
+        CountingConnection.record(self._host, 0)
+        self._pending: Dict[int, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._error: Optional[Exception] = None
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def failed(self) -> bool:
+        return self._error is not None
+
+    def call(self, value: int, timeout: float) -> Tuple[int, Optional[int]]:
+        """Send one value down the stream; return the computed value and the reported processing time (us)"""
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            line = json.dumps({"id": request_id, "value": value}).encode() + b"\n"
+            try:
+                self._sock.sendall(b"%x\r\n%s\r\n" % (len(line), line))
+            except OSError as e:
+                del self._pending[request_id]
+                raise requests.exceptions.ConnectionError(f"stream to {self.url} failed: {e}")
+        CountingConnection.record(self._host, 1)
+        try:
+            data = future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            raise requests.exceptions.Timeout(f"no result on the stream to {self.url} within {timeout * 1000:.0f}ms")
+        if data.get("status") != "success":
+            raise ValueError(f"Service at {self.url} returned an error: {data.get('error')}")
+        return int(data["value"]), data.get("processing_us")
+
+    def _read(self):
+        try:
+            body = self._sock.makefile('rb')
+            status = body.readline().split()
+            if len(status) < 2 or status[1] != b"200":
+                raise requests.exceptions.ConnectionError(
+                    f"stream to {self.url} refused: {b' '.join(status).decode(errors='replace')}")
+            while body.readline().strip():
+                pass  # headers; the response is chunked
+            buffered = b""
+            while True:
+                size = int(body.readline().split(b";")[0], 16)
+                if size == 0:
+                    break
+                buffered += body.read(size)
+                body.readline()
+                *lines, buffered = buffered.split(b"\n")
+                for line in lines:
+                    data = json.loads(line)
+                    with self._lock:
+                        future = self._pending.pop(data.get("id"), None)
+                    if future is not None:
+                        future.set_result(data)
+            error = requests.exceptions.ConnectionError(f"stream to {self.url} closed")
+        except requests.exceptions.ConnectionError as e:
+            error = e
+        except Exception as e:
+            error = requests.exceptions.ConnectionError(f"stream to {self.url} failed: {e}")
+        with self._lock:
+            self._error = error
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+        self._sock.close()
+
+    def close(self):
+        """End the request body, so the service finishes the response, and wait for the reader"""
+        with self._lock:
+            try:
+                self._sock.sendall(b"0\r\n\r\n")
+            except OSError:
+                pass
+        self._reader.join(timeout=10)
+        self._sock.close()
+
+
+# Streams per replica URL when streaming (--streams), opened as they are needed
+_streams: Dict[str, List[StageStream]] = {}
+_streams_per_replica = 0
+_streams_lock = threading.Lock()
+
+
+def configure_streams(per_replica: int):
+    global _streams_per_replica
+    if per_replica < 0:
+        raise ValueError("Streams per replica cannot be negative")
+    _streams_per_replica = per_replica
+
+
+def call_stream(url: str, value: int, timeout: float) -> Tuple[int, Optional[int]]:
+    """
+    call_service over the replica's stream with the fewest values in flight,
+    opening another (or replacing a failed one) while it has fewer than
+    _streams_per_replica
+    """
+    with _streams_lock:
+        streams = [stream for stream in _streams.get(url, []) if not stream.failed]
+        if len(streams) < _streams_per_replica:
+            try:
+                stream = StageStream(url)
+            except OSError as e:
+                raise requests.exceptions.ConnectionError(f"cannot open a stream to {url}: {e}")
+            streams.append(stream)
+        else:
+            stream = min(streams, key=lambda s: s.pending)
+        _streams[url] = streams
+    return stream.call(value, timeout)
+
+
+def close_streams():
+    with _streams_lock:
+        streams = [stream for url_streams in _streams.values() for stream in url_streams]
+        _streams.clear()
+    for stream in streams:
+        stream.close()
+
+
+class ReplicaBalancer:
+    """
+    Picks one replica of a stage per call: round-robin, least-outstanding
+    (fewest requests this client has in flight to it) or p2c (power of two
+    choices: the less loaded of two random replicas). Every acquire() is
+    paired with a release() once the call has finished.
+    """
+
+    POLICIES = ("round-robin", "least-outstanding", "p2c")
+
+    def __init__(self, replicas: List[str], policy: str = "round-robin"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown balancing policy {policy!r}")
+        self.replicas = list(replicas)
+        self.policy = policy
+        self.outstanding = {replica: 0 for replica in self.replicas}
+        self._next = 0
+        self._rng = random.Random()
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude: Optional[str] = None) -> str:
+        """Choose a replica (other than `exclude` if there is one) and count the call against it"""
+        with self._lock:
+            candidates = [r for r in self.replicas if r != exclude] or self.replicas
+            self._next += 1
+            if self.policy == "round-robin" or len(candidates) == 1:
+                replica = candidates[self._next % len(candidates)]
+            elif self.policy == "least-outstanding":
+                # rotate the starting point so ties don't all go to the first replica
+                start = self._next % len(candidates)
+                replica = min(candidates[start:] + candidates[:start], key=self.outstanding.get)
+            else:
+                a, b = self._rng.sample(candidates, 2)
+                replica = a if self.outstanding[a] <= self.outstanding[b] else b
+            self.outstanding[replica] += 1
+            return replica
+
+    def release(self, replica: str):
+        with self._lock:
+            self.outstanding[replica] -= 1
+
+
+# Balancers keyed by stage target ("http://h1:5000|http://h2:5000"), for stages with replicas
+_balancers: Dict[str, ReplicaBalancer] = {}
+
+
+def create_balancers(target_list: List[str], policy: str):
+    for target in target_list:
+        if "|" in target and target not in _balancers:
+            _balancers[target] = ReplicaBalancer(target.split("|"), policy)
+
+
+def acquire_replica(target: str, exclude: Optional[str] = None) -> str:
+    """The URL to call for one request to this stage; `target` itself if it has a single URL"""
+    balancer = _balancers.get(target)
+    return balancer.acquire(exclude) if balancer else target
+
+
+def release_replica(target: str, replica: str):
+    balancer = _balancers.get(target)
+    if balancer is not None:
+        balancer.release(replica)
+
+
+def parse_targets(targets: str) -> List[str]:
+    """
+    The five stage URLs in A..E order, from "a,b,c,d,e" or "A=a,B=b,...". A stage
+    may list replicas separated by "|" (e.g. "A=http://h1:5000|http://h2:5000");
+    they stay "|"-joined in the returned strings.
+    """
+    entries = [entry.strip() for entry in targets.split(",") if entry.strip()]
+    # "=" only appears in a URL after "?", so a label is a single letter before the first "="
+    labelled = [entry for entry in entries if entry[1:2] == "="]
+    if labelled and len(labelled) != len(entries):
+        raise ValueError("Label every stage (A=...) or none")
+    if labelled:
+        by_stage = {entry[0].lower(): entry[2:] for entry in entries}
+        if sorted(by_stage) != STAGE_COLUMNS or len(entries) != 5:
+            raise ValueError("Expected one entry for each of A, B, C, D, E")
+        entries = [by_stage[column] for column in STAGE_COLUMNS]
+    if len(entries) != 5:
+        raise ValueError("Must provide exactly 5 targets (Services A-E)")
+    stages = []
+    for entry in entries:
+        replicas = [url.strip() for url in entry.split("|") if url.strip()]
+        if not replicas:
+            raise ValueError(f"Empty target in {targets!r}")
+        stages.append("|".join(replicas))
+    return stages
+
+
+def call_replica(target: str, value, attempts: List[str], timeout: float,
+                 avoid: Optional[str] = None) -> Tuple[object, Optional[int]]:
+    """
+    call_service (call_service_batch for a list of values, call_stream when
+    streaming) on a replica picked by the stage's balancer, avoiding
+    attempts[0] when this is a hedge (or `avoid`, the replica a retried call
+    failed on); appends the replica to attempts.
+    """
+    replica = acquire_replica(target, exclude=attempts[0] if attempts else avoid)
+    attempts.append(replica)
     try:
-        current_value = input_value
-        for index, (value_key, service_key) in enumerate(STAGE_KEYS):
-            service_url = service_urls[index]
-            current_value = call_service(service_url, current_value)
-            stage_values[value_key] = current_value
-        
-        recv_ts = int(time.time() * 1000)  # milliseconds
-        rtt_ms = recv_ts - send_ts
-        
-        return {
-            "input": input_value,
-            **stage_values,
-            **service_mapping,
-            "send_ts": send_ts,
-            "recv_ts": recv_ts,
-            "rtt_ms": rtt_ms,
-            "error": ""
+        if isinstance(value, list):
+            return call_service_batch(replica, value, timeout)
+        if _streams_per_replica:
+            return call_stream(replica, value, timeout)
+        return call_service(replica, value, timeout)
+    finally:
+        release_replica(target, replica)
+
+
+def arrival_offsets(n: int, rate: float, arrivals: str = "fixed", seed: int = None) -> List[float]:
+    """Intended start times (seconds after the run starts) for n open-loop requests at `rate` req/s"""
+    if arrivals == "poisson":
+        rng = random.Random(seed)
+        offsets = []
+        t = 0.0
+        for _ in range(n):
+            offsets.append(t)
+            t += rng.expovariate(rate)
+        return offsets
+    return [i / rate for i in range(n)]
+
+class PipelineRequest:
+    """
+    A single request through the 5-stage pipeline:
+    Service A (Inventory) -> B (Sales Tax) -> C (Shipping) -> D (Processing Fee) -> E (Currency Rounding)
+
+    In open-loop mode `intended_ts` is the scheduled start (ms); latency is
+    measured from it, so time spent queued behind busy workers is included.
+    Each stage call is timed with perf_counter_ns (a_us..e_us, retries and
+    backoff included) alongside the processing time the service reports
+    (a_server_us..e_server_us).
+
+    With count > 1 it carries that many copies of input_value through
+    /process/batch calls and finishes with one row per value, each with the
+    batch's timings.
+
+    step() runs stages until the pipeline is done (returns None; the results
+    are in .rows) or a stage call failed and may be retried, in which case it
+    returns the backoff in seconds and the caller runs step() again after it.
+    A retry needs the retry budget's approval and must fit in the stage's
+    deadline, which bounds all of its attempts together.
+    """
+
+    def __init__(self, service_urls: List[str], input_value: int, intended_ts: float = None, count: int = 1):
+        now_ms = time.time() * 1000  # milliseconds
+        self.sched_delay_ms = now_ms - intended_ts if intended_ts is not None else 0.0
+        self.send_ts = int(intended_ts if intended_ts is not None else now_ms)
+        self.start_ns = time.perf_counter_ns()
+        self.service_urls = service_urls
+        self.input_value = input_value
+        self.count = count
+        self.value = [input_value] * count if count > 1 else input_value
+        self.stage = 0
+        self.attempt = 0  # attempts made at the current stage
+        self.avoid: Optional[str] = None
+        self.stage_start_ns = 0
+        self.stage_values = {key: None for key, _ in STAGE_KEYS}
+        self.stage_timings = {}
+        for column in STAGE_COLUMNS:
+            self.stage_timings[f"{column}_us"] = None
+            self.stage_timings[f"{column}_server_us"] = None
+        self.service_mapping = {service_key: url for (_, service_key), url in zip(STAGE_KEYS, service_urls)}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.retries = 0
+        self.retries_denied = 0
+        self.deadline_exceeded = 0
+        self.client_calls = 0
+        self.server_hops = 0
+        self.rows: List[Dict] = []
+
+    def step(self) -> Optional[float]:
+        if _chained:
+            return self._step_chain()
+        while self.stage < len(STAGE_KEYS):
+            index = self.stage
+            value_key, service_key = STAGE_KEYS[index]
+            if self.attempt == 0:
+                self.stage_start_ns = time.perf_counter_ns()
+                _retry_budget.record_call()
+            deadline_ns = self.stage_start_ns + int(_stage_deadlines_s[index] * 1e9)
+            self.attempt += 1
+            self.client_calls += 1
+            attempts: List[str] = []
+            won = False
+            try:
+                timeout = (deadline_ns - time.perf_counter_ns()) / 1e9
+                if timeout <= 0:
+                    raise requests.exceptions.Timeout("no time left before the stage deadline")
+                if _hedger is None:
+                    value, server_us = call_replica(self.service_urls[index], self.value, attempts, timeout, self.avoid)
+                else:
+                    (value, server_us), hedged, won = _hedger.call(
+                        index, call_replica, self.service_urls[index], self.value, attempts, timeout, self.avoid)
+                    self.hedges += hedged
+                    self.hedge_wins += won
+            except Exception as e:
+                if attempts:
+                    self.service_mapping[service_key] = attempts[0]
+                # a retry goes to another replica, if the stage has one
+                self.avoid = attempts[0] if attempts else None
+                backoff = self._retry_backoff(e, deadline_ns)
+                if backoff is None:
+                    if isinstance(e, requests.exceptions.Timeout):
+                        self.deadline_exceeded = 1
+                        e = f"stage {STAGE_COLUMNS[index].upper()} deadline ({_stage_deadlines_s[index] * 1000:g}ms) exceeded: {e}"
+                    self._finish(str(e))
+                return backoff
+            # record the replica that answered
+            self.service_mapping[service_key] = attempts[-1] if won else attempts[0]
+            self.stage_timings[f"{STAGE_COLUMNS[index]}_us"] = (time.perf_counter_ns() - self.stage_start_ns) // 1000
+            self.stage_timings[f"{STAGE_COLUMNS[index]}_server_us"] = server_us
+            self.stage_values[value_key] = value
+            self.value = value
+            self.stage += 1
+            self.attempt = 0
+            self.avoid = None
+        self._finish("")
+        return None
+
+    def _step_chain(self) -> Optional[float]:
+        """
+        Chained topology: one /process/chain call to A, which forwards through
+        B..E (the route picks every stage's replica). A retry repeats the whole
+        chain within the sum of the stage deadlines.
+        """
+        if self.attempt == 0:
+            self.stage_start_ns = time.perf_counter_ns()
+            _retry_budget.record_call()
+        deadline_ns = self.stage_start_ns + int(sum(_stage_deadlines_s) * 1e9)
+        self.attempt += 1
+        self.client_calls += 1
+        replicas = [acquire_replica(target, exclude=self.avoid if index == 0 else None)
+                    for index, target in enumerate(self.service_urls)]
+        try:
+            timeout = (deadline_ns - time.perf_counter_ns()) / 1e9
+            if timeout <= 0:
+                raise requests.exceptions.Timeout("no time left before the chain deadline")
+            data = call_chain(replicas[0], self.value, replicas[1:], timeout)
+        except Exception as e:
+            self.service_mapping.update((service_key, replica) for (_, service_key), replica in zip(STAGE_KEYS, replicas))
+            self.avoid = replicas[0]
+            backoff = self._retry_backoff(e, deadline_ns)
+            if backoff is None:
+                if isinstance(e, requests.exceptions.Timeout):
+                    self.deadline_exceeded = 1
+                    e = f"chain deadline ({sum(_stage_deadlines_s) * 1000:g}ms) exceeded: {e}"
+                self._finish(str(e))
+            return backoff
+        finally:
+            for target, replica in zip(self.service_urls, replicas):
+                release_replica(target, replica)
+        self.service_mapping.update((service_key, replica) for (_, service_key), replica in zip(STAGE_KEYS, replicas))
+        for index, (value_key, _) in enumerate(STAGE_KEYS):
+            self.stage_values[value_key] = int(data["values"][index])
+            self.stage_timings[f"{STAGE_COLUMNS[index]}_server_us"] = data["stage_us"][index]
+        self.server_hops = data["hops"] - 1
+        self.stage = len(STAGE_KEYS)
+        self._finish("")
+        return None
+
+    def _retry_backoff(self, exc: Exception, deadline_ns: int) -> Optional[float]:
+        """Backoff before retrying the failed stage call, or None if it must not be retried"""
+        if not is_retryable(exc) or self.attempt >= MAX_ATTEMPTS:
+            return None
+        backoff = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** (self.attempt - 1)))
+        if time.perf_counter_ns() + backoff * 1e9 >= deadline_ns:
+            return None
+        if not _retry_budget.try_spend():
+            self.retries_denied += 1
+            return None
+        self.retries += 1
+        return backoff
+
+    def _finish(self, error: str):
+        rtt_ms = (time.perf_counter_ns() - self.start_ns) / 1e6 + self.sched_delay_ms
+        row = {
+            "input": self.input_value,
+            **self.service_mapping,
+            "send_ts": self.send_ts,
+            "recv_ts": int(time.time() * 1000),
+            "rtt_ms": round(rtt_ms, 3),
+            "sched_delay_ms": round(self.sched_delay_ms, 3),
+            **self.stage_timings,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "retries": self.retries,
+            "retries_denied": self.retries_denied,
+            "deadline_exceeded": self.deadline_exceeded,
+            "batch_size": self.count,
+            "topology": "chain" if _chained else "star",
+            "client_calls": self.client_calls,
+            "server_hops": self.server_hops,
+            "error": error
         }
-        
+        if self.count == 1:
+            self.rows = [{**row, **self.stage_values}]
+            return
+        self.rows = [
+            {**row, **{key: values[i] if values is not None else None for key, values in self.stage_values.items()}}
+            for i in range(self.count)
+        ]
+
+
+class PipelineRunner:
+    """
+    Runs PipelineRequests on an executor and calls on_done(rows) as each one
+    finishes. A request waiting out a retry backoff is parked on the retry
+    timer rather than sleeping in a worker; when the backoff ends it goes
+    ahead of requests that have not started yet. wait() returns once every
+    started request has finished, so the executor can shut down.
+    """
+
+    def __init__(self, executor: concurrent.futures.Executor, on_done):
+        self.executor = executor
+        self.on_done = on_done
+        self._in_flight = 0
+        self._new: Deque[Tuple[List[str], int, Optional[float], int]] = deque()
+        self._resumed: Deque[PipelineRequest] = deque()
+        self._lock = threading.Condition()
+
+    def start(self, service_urls: List[str], input_value: int, intended_ts: float = None, count: int = 1):
+        with self._lock:
+            self._in_flight += 1
+            self._new.append((service_urls, input_value, intended_ts, count))
+        self.executor.submit(self._work)
+
+    def _resume(self, request: PipelineRequest):
+        with self._lock:
+            self._resumed.append(request)
+        try:
+            self.executor.submit(self._work)
+        except Exception as e:
+            # e.g. the executor has shut down: fail the request rather than leave it parked
+            with self._lock:
+                if request not in self._resumed:
+                    return
+                self._resumed.remove(request)
+            request._finish(f"retry could not be resumed: {e}")
+            self._complete(request)
+
+    def _work(self):
+        # one task per queued unit; a resumed retry is taken before a new request
+        with self._lock:
+            request = self._resumed.popleft() if self._resumed else None
+            new = self._new.popleft() if request is None else None
+        if request is None:
+            # created on the worker, so closed-loop latency starts when the request does, not when it was queued
+            request = PipelineRequest(*new)
+        try:
+            backoff = request.step()
+        except Exception as e:
+            request._finish(str(e))
+            backoff = None
+        if backoff is not None:
+            _retry_timer.call_later(backoff, self._resume, request)
+            return
+        self._complete(request)
+
+    def _complete(self, request: PipelineRequest):
+        try:
+            self.on_done(request.rows)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._lock.notify_all()
+
+    def wait(self):
+        with self._lock:
+            while self._in_flight:
+                self._lock.wait()
+
+
+class LatencyHistogram:
+    """
+    Log-linear (HDR-style) latency histogram in microseconds.
+
+    Values below 2 * 2**sub_bucket_bits are counted exactly; each higher power
+    of two is split into 2**sub_bucket_bits linear sub-buckets, keeping the
+    relative error under 1 / 2**sub_bucket_bits (0.8% by default). Recording
+    is O(1), counts are sparse, and histograms merge by adding counts.
+    """
+
+    PERCENTILES = (50, 90, 99, 99.9)
+
+    def __init__(self, sub_bucket_bits: int = 7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    def _index(self, value: int) -> int:
+        shift = max(0, value.bit_length() - self.sub_bucket_bits - 1)
+        return self.sub_bucket_count * shift + (value >> shift)
+
+    def _highest_equivalent(self, index: int) -> int:
+        shift = max(0, index // self.sub_bucket_count - 1)
+        sub = index - self.sub_bucket_count * shift
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value_us: float, count: int = 1):
+        value_us = max(0, int(value_us))
+        index = self._index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self.min = value_us if self.min is None else min(self.min, value_us)
+        self.max = value_us if self.max is None else max(self.max, value_us)
+
+    def percentile(self, p: float) -> Optional[int]:
+        """Value (us) at the p-th percentile, to bucket precision and capped at the exact max"""
+        if not self.total:
+            return None
+        rank = max(1, -(-self.total * p // 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Cannot merge histograms with different sub_bucket_bits")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        for name, fn in (('min', min), ('max', max)):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            setattr(self, name, theirs if mine is None else mine if theirs is None else fn(mine, theirs))
+        return self
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump({'unit': 'us', 'sub_bucket_bits': self.sub_bucket_bits, 'total': self.total,
+                       'min': self.min, 'max': self.max,
+                       'counts': {str(i): c for i, c in sorted(self.counts.items())}}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "LatencyHistogram":
+        with open(path) as f:
+            data = json.load(f)
+        hist = cls(data['sub_bucket_bits'])
+        hist.counts = {int(i): c for i, c in data['counts'].items()}
+        hist.total = data['total']
+        hist.min = data['min']
+        hist.max = data['max']
+        return hist
+
+    def summary(self) -> str:
+        """p50/p90/p99/p99.9/max in milliseconds"""
+        parts = [f"p{p:g} {self.percentile(p) / 1000:.2f}ms" for p in self.PERCENTILES]
+        return ", ".join(parts + [f"max {self.max / 1000:.2f}ms"])
+
+
+class Hedger:
+    """
+    Hedged stage calls: if a stage has not answered within `delay_ms`, or within
+    the `percentile`-th percentile of that stage's observed latency, the same
+    request is sent again (to another replica of the stage if it has one, else
+    on another pooled connection) and the first answer wins. The stage operations are pure, so the
+    duplicate is harmless. Both attempts run on a small executor and the caller
+    waits for the first to complete; only the losing attempt is left running,
+    and an original that loses still finishes, so its latency keeps feeding the
+    delay estimate and the primary-only percentiles.
+    """
+
+    MIN_SAMPLES = 50      # primary latencies needed before a percentile delay is used
+    REFRESH_EVERY = 100   # recompute the percentile delay after this many new samples
+
+    def __init__(self, percentile: Optional[float] = None, delay_ms: Optional[float] = None, max_workers: int = 10):
+        self.percentile = percentile
+        self.delay_ms = delay_ms
+        self.primary = [LatencyHistogram() for _ in STAGE_COLUMNS]
+        self.hedged = [LatencyHistogram() for _ in STAGE_COLUMNS]
+        self._delay_s: List[Optional[float]] = [None] * len(STAGE_COLUMNS)
+        self._refresh_at = [self.MIN_SAMPLES] * len(STAGE_COLUMNS)
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def delay_s(self, stage: int) -> Optional[float]:
+        """Seconds to wait before hedging this stage, or None while there are too few samples"""
+        if self.delay_ms is not None:
+            return self.delay_ms / 1000
+        with self._lock:
+            hist = self.primary[stage]
+            if hist.total >= self._refresh_at[stage]:
+                self._delay_s[stage] = hist.percentile(self.percentile) / 1e6
+                self._refresh_at[stage] = hist.total + self.REFRESH_EVERY
+            return self._delay_s[stage]
+
+    def _record(self, hists: List[LatencyHistogram], stage: int, start_ns: int):
+        with self._lock:
+            hists[stage].record((time.perf_counter_ns() - start_ns) // 1000)
+
+    def call(self, stage: int, fn, *args) -> Tuple[object, bool, bool]:
+        """Run fn(*args) as a hedged call for this stage; returns (result, hedged, hedge_won)"""
+        start_ns = time.perf_counter_ns()
+        primary = self._executor.submit(fn, *args)
+        primary.add_done_callback(lambda f: self._record(self.primary, stage, start_ns))
+        done, _ = concurrent.futures.wait([primary], timeout=self.delay_s(stage))
+        hedge = None
+        if done:
+            winner = primary
+        else:
+            hedge = self._executor.submit(fn, *args)
+            done, _ = concurrent.futures.wait([primary, hedge], return_when=concurrent.futures.FIRST_COMPLETED)
+            winner = primary if primary in done else hedge
+            if winner.exception() is not None:
+                # the first answer was an error; take the other one, whatever it is
+                winner = hedge if winner is primary else primary
+        result = winner.result()
+        self._record(self.hedged, stage, start_ns)
+        return result, hedge is not None, winner is hedge
+
+    def histograms(self) -> Tuple[List[LatencyHistogram], List[LatencyHistogram]]:
+        with self._lock:
+            return copy.deepcopy(self.primary), copy.deepcopy(self.hedged)
+
+    def merge(self, histograms: Tuple[List[LatencyHistogram], List[LatencyHistogram]]):
+        """Add (primary, hedged) histograms from histograms() of another process"""
+        primary, hedged = histograms
+        with self._lock:
+            for mine, theirs in zip(self.primary + self.hedged, primary + hedged):
+                mine.merge(theirs)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+# Set by run_experiment (and each shard) when hedging is enabled
+_hedger: Optional[Hedger] = None
+
+
+def create_hedger(percentile: Optional[float], delay_ms: Optional[float], concurrency: int) -> Optional[Hedger]:
+    global _hedger
+    if percentile is not None or delay_ms is not None:
+        # room for a primary, a duplicate and a still-running loser per in-flight request
+        _hedger = Hedger(percentile, delay_ms, max_workers=3 * concurrency)
+    return _hedger
+
+
+class RunStats:
+    """Running aggregates over result rows, so the summary does not need the full row list"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rtt_sum = 0.0
+        self.rtt_min: Optional[float] = None
+        self.rtt_max: Optional[float] = None
+        self.first_send: Optional[float] = None
+        self.last_send: Optional[float] = None
+        self.last_recv: Optional[float] = None
+        self.sched_sum = 0.0
+        self.sched_max = 0.0
+        self.call_sum = [0] * len(STAGE_COLUMNS)
+        self.call_n = [0] * len(STAGE_COLUMNS)
+        self.server_sum = [0] * len(STAGE_COLUMNS)
+        self.server_n = [0] * len(STAGE_COLUMNS)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.retries = 0
+        self.retries_denied = 0
+        self.deadline_exceeded = 0
+        # summed over successful requests
+        self.client_calls = 0
+        self.server_hops = 0
+        # [calls, errors, call_us] per (stage column, replica URL)
+        self.replicas: Dict[Tuple[str, str], List[int]] = {}
+        self.rtt_hist = LatencyHistogram()
+
+    @property
+    def successful(self) -> int:
+        return self.count - self.errors
+
+    def add(self, row: Dict):
+        self.count += 1
+        self.first_send = row['send_ts'] if self.first_send is None else min(self.first_send, row['send_ts'])
+        self.last_send = row['send_ts'] if self.last_send is None else max(self.last_send, row['send_ts'])
+        self.last_recv = row['recv_ts'] if self.last_recv is None else max(self.last_recv, row['recv_ts'])
+        self.sched_sum += row['sched_delay_ms']
+        self.sched_max = max(self.sched_max, row['sched_delay_ms'])
+        # duplicates add load whether or not the request succeeded
+        self.hedges += row.get('hedges') or 0
+        self.hedge_wins += row.get('hedge_wins') or 0
+        self.retries += row.get('retries') or 0
+        self.retries_denied += row.get('retries_denied') or 0
+        self.deadline_exceeded += row.get('deadline_exceeded') or 0
+        if row.get('topology') == 'chain':
+            # the client times only the whole chain: use each stage's reported time, and
+            # charge a failed chain to A's replica, the only one the client called
+            stages = [(STAGE_COLUMNS[0], STAGE_KEYS[0])] if row['error'] else zip(STAGE_COLUMNS, STAGE_KEYS)
+            for column, (_, service_key) in stages:
+                entry = self.replicas.setdefault((column, row[service_key]), [0, 0, 0])
+                entry[0] += 1
+                if row['error']:
+                    entry[1] += 1
+                else:
+                    entry[2] += row[f"{column}_server_us"] or 0
+        else:
+            for column, (_, service_key) in zip(STAGE_COLUMNS, STAGE_KEYS):
+                call_us = row[f"{column}_us"]
+                if call_us is None and not row['error']:
+                    break
+                entry = self.replicas.setdefault((column, row[service_key]), [0, 0, 0])
+                entry[0] += 1
+                if call_us is None:
+                    # the request failed at this stage
+                    entry[1] += 1
+                    break
+                entry[2] += call_us
+        if row['error']:
+            self.errors += 1
+            return
+        rtt = row['rtt_ms']
+        self.rtt_sum += rtt
+        self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+        self.rtt_max = rtt if self.rtt_max is None else max(self.rtt_max, rtt)
+        self.rtt_hist.record(round(rtt * 1000))
+        self.client_calls += row.get('client_calls') or 0
+        self.server_hops += row.get('server_hops') or 0
+        for index, column in enumerate(STAGE_COLUMNS):
+            if row[f"{column}_us"] is not None:
+                self.call_sum[index] += row[f"{column}_us"]
+                self.call_n[index] += 1
+            if row[f"{column}_server_us"] is not None:
+                self.server_sum[index] += row[f"{column}_server_us"]
+                self.server_n[index] += 1
+
+    def merge(self, other: "RunStats") -> "RunStats":
+        for name in ('count', 'errors', 'rtt_sum', 'sched_sum', 'hedges', 'hedge_wins', 'retries', 'retries_denied',
+                     'deadline_exceeded', 'client_calls', 'server_hops'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in ('call_sum', 'call_n', 'server_sum', 'server_n'):
+            setattr(self, name, [a + b for a, b in zip(getattr(self, name), getattr(other, name))])
+        for name, fn in (('rtt_min', min), ('rtt_max', max), ('first_send', min), ('last_send', max),
+                         ('last_recv', max)):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            setattr(self, name, theirs if mine is None else mine if theirs is None else fn(mine, theirs))
+        self.sched_max = max(self.sched_max, other.sched_max)
+        for key, entry in other.replicas.items():
+            self.replicas[key] = [a + b for a, b in zip(self.replicas.get(key, [0, 0, 0]), entry)]
+        self.rtt_hist.merge(other.rtt_hist)
+        return self
+
+
+class IntervalReporter:
+    """
+    Completed requests, errors and p50/p99 per fixed interval (bucketed by
+    recv_ts), printed to the console and appended to a time-series CSV so
+    throughput over time can be lined up with server events. Fed from the
+    ResultsWriter thread; tick() closes intervals once the clock has passed
+    them, after a short grace period for late rows.
+    """
+
+    GRACE_MS = 250
+
+    def __init__(self, path: str, interval: float = 1.0):
+        self.interval_ms = interval * 1000
+        self.start_ms = time.time() * 1000
+        self.bucket_start = self.start_ms
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['time_s', 'timestamp_ms', 'completed', 'errors', 'ok_per_s', 'p50_ms', 'p99_ms'])
+        self._reset()
+
+    def _reset(self):
+        self.completed = 0
+        self.errors = 0
+        self.hist = LatencyHistogram()
+
+    def _emit(self):
+        elapsed_s = (self.bucket_start + self.interval_ms - self.start_ms) / 1000
+        ok_per_s = (self.completed - self.errors) / (self.interval_ms / 1000)
+        p50 = self.hist.percentile(50)
+        p99 = self.hist.percentile(99)
+        p50_ms = p50 / 1000 if p50 is not None else None
+        p99_ms = p99 / 1000 if p99 is not None else None
+        self._writer.writerow([round(elapsed_s, 3), int(self.bucket_start + self.interval_ms), self.completed,
+                               self.errors, round(ok_per_s, 2), p50_ms, p99_ms])
+        self._file.flush()
+        latency = f"p50 {p50_ms:.2f}ms, p99 {p99_ms:.2f}ms" if p50 is not None else "no successful requests"
+        print(f"  [{elapsed_s:7.1f}s] {self.completed:6d} done, {self.errors:4d} errors, {ok_per_s:8.1f} ok/s, {latency}",
+              flush=True)
+        self._reset()
+
+    def _roll(self, ts_ms: float):
+        while ts_ms >= self.bucket_start + self.interval_ms:
+            self._emit()
+            self.bucket_start += self.interval_ms
+
+    def add(self, row: Dict):
+        self._roll(row['recv_ts'])
+        self.completed += 1
+        if row['error']:
+            self.errors += 1
+        else:
+            self.hist.record(round(row['rtt_ms'] * 1000))
+
+    def tick(self):
+        self._roll(time.time() * 1000 - self.GRACE_MS)
+
+    def close(self):
+        self.tick()
+        if self.completed:
+            self._emit()
+        self._file.close()
+
+
+class ResultsWriter:
+    """
+    Appends result rows to the CSV from a background thread as requests
+    complete, flushing every flush_interval seconds, and keeps RunStats
+    (unless aggregate is False, e.g. when shard processes send their own).
+    """
+
+    def __init__(self, path: str, fieldnames: List[str], flush_interval: float = 1.0, max_queue: int = 100000,
+                 aggregate: bool = True, reporter: Optional[IntervalReporter] = None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.aggregate = aggregate
+        self.reporter = reporter
+        self.stats = RunStats()
+        self.phase_stats: Dict[str, RunStats] = {}
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=max_queue)
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+        self._writer.writeheader()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, row: Dict):
+        self._queue.put(row)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        timeout = min(self.flush_interval, self.reporter.interval_ms / 1000) if self.reporter else self.flush_interval
+        while True:
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                row = {}
+            if row is None:
+                break
+            if self.reporter:
+                if row:
+                    self.reporter.add(row)
+                self.reporter.tick()
+            if row:
+                self._writer.writerow(row)
+                if self.aggregate:
+                    self.stats.add(row)
+                    if row.get('phase'):
+                        self.phase_stats.setdefault(row['phase'], RunStats()).add(row)
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self._file.flush()
+                last_flush = time.monotonic()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        if self.reporter:
+            self.reporter.close()
+
+
+class LoadSchedule:
+    """
+    Piecewise-linear load level over time: concurrency in closed-loop runs,
+    req/s with --rate. Parsed from a comma list of "ramp:FROM:TO:SECONDS"
+    and "hold:LEVEL:SECONDS" phases, e.g. "ramp:10:500:60,hold:500:300,ramp:500:10:60".
+    """
+
+    def __init__(self, phases: List[Tuple[str, float, float, float]]):
+        self.phases = phases
+        self.duration = sum(p[3] for p in phases)
+        self.peak = max(max(p[1], p[2]) for p in phases)
+
+    @classmethod
+    def parse(cls, spec: str) -> "LoadSchedule":
+        phases = []
+        for part in (p.strip() for p in spec.split(",")):
+            if not part:
+                continue
+            kind, *nums = part.split(":")
+            try:
+                nums = [float(n) for n in nums]
+            except ValueError:
+                nums = []
+            if kind == "ramp" and len(nums) == 3:
+                start, end, seconds = nums
+                name = f"{len(phases) + 1}:ramp {start:g}-{end:g}"
+            elif kind == "hold" and len(nums) == 2:
+                start = end = nums[0]
+                seconds = nums[1]
+                name = f"{len(phases) + 1}:hold {start:g}"
+            else:
+                raise ValueError(f"Bad phase '{part}', expected ramp:FROM:TO:SECONDS or hold:LEVEL:SECONDS")
+            if seconds <= 0 or start < 0 or end < 0:
+                raise ValueError(f"Bad phase '{part}', levels must be >= 0 and seconds > 0")
+            phases.append((name, start, end, seconds))
+        if not phases:
+            raise ValueError("Empty schedule")
+        return cls(phases)
+
+    @classmethod
+    def hold(cls, level: float, seconds: float) -> "LoadSchedule":
+        return cls([(f"1:hold {level:g}", level, level, seconds)])
+
+    def scaled(self, factor: float) -> "LoadSchedule":
+        """Same phases (and names) with every level multiplied by factor, e.g. one process's share"""
+        return LoadSchedule([(name, a * factor, b * factor, sec) for name, a, b, sec in self.phases])
+
+    def at(self, elapsed: float) -> Tuple[Optional[str], float]:
+        """(phase name, level) at elapsed seconds into the schedule, or (None, 0) once it is over"""
+        for name, start, end, seconds in self.phases:
+            if elapsed < seconds:
+                return name, start + (end - start) * elapsed / seconds
+            elapsed -= seconds
+        return None, 0
+
+    def offsets(self, arrivals: str = "fixed", seed: int = None) -> List[float]:
+        """Open-loop intended start times (seconds) following the levels as req/s"""
+        rng = random.Random(seed)
+        offsets = []
+        t = 0.0
+        while t < self.duration:
+            _, level = self.at(t)
+            if level <= 0:
+                t += 0.01
+                continue
+            offsets.append(t)
+            t += rng.expovariate(level) if arrivals == "poisson" else 1 / level
+        return offsets
+
+    def phase_tagger(self, emit):
+        """Wrap emit() to label each row with the phase its send_ts falls in (the clock starts now)"""
+        start_ms = time.time() * 1000
+        last = self.phases[-1][0]
+
+        def emit_phase(row: Dict):
+            row["phase"] = self.at((row["send_ts"] - start_ms) / 1000)[0] or last
+            emit(row)
+        return emit_phase
+
+
+def send_requests(target_list: List[str], requests_count: int, concurrency: int, input_value: int,
+                  max_outstanding: Optional[int], rate: Optional[float], arrivals: str, seed: Optional[int], emit,
+                  schedule: Optional[LoadSchedule] = None):
+    """
+    Run pipelines on a thread pool, passing each result row to emit() as it completes.
+
+    Closed loop: requests_count requests with at most max_outstanding queued.
+    With rate: open loop on fixed/Poisson arrivals (max_outstanding None = unbounded).
+    With a schedule, its levels replace requests_count: in-flight requests
+    follow them (closed loop), or they are the arrival rate (open loop).
+    With batching, requests are grouped into pipeline requests of up to
+    _batch_size values; concurrency and max_outstanding count those, and an
+    open-loop batch starts when its first value is due.
+    """
+    if schedule is not None:
+        emit = schedule.phase_tagger(emit)
+    if schedule is not None and not rate:
+        send_scheduled(target_list, input_value, schedule, emit)
+        return
+    offsets = None
+    if rate:
+        offsets = schedule.offsets(arrivals, seed) if schedule else arrival_offsets(requests_count, rate, arrivals, seed)
+        requests_count = len(offsets)
+    sizes = batch_sizes(requests_count)
+    if offsets is not None:
+        offsets = offsets[::_batch_size]
+    semaphore = threading.Semaphore(max_outstanding) if max_outstanding else None
+
+    def on_done(rows: List[Dict]):
+        if semaphore:
+            semaphore.release()
+        for row in rows:
+            emit(row)
+
+    start_time = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        runner = PipelineRunner(executor, on_done)
+        for i, count in enumerate(sizes):
+            intended_ts = None
+            if offsets is not None:
+                delay = start_time + offsets[i] - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                intended_ts = (start_time + offsets[i]) * 1000
+            if semaphore:
+                semaphore.acquire()
+            runner.start(target_list, input_value, intended_ts, count)
+        # wait for the in-flight tail, including requests parked in a retry backoff
+        runner.wait()
+
+
+def send_scheduled(target_list: List[str], input_value: int, schedule: LoadSchedule, emit):
+    """Closed loop whose in-flight request count follows the schedule's level until it ends"""
+    in_flight = 0
+    changed = threading.Condition()
+
+    def on_done(rows: List[Dict]):
+        nonlocal in_flight
+        with changed:
+            in_flight -= 1
+            changed.notify()
+        for row in rows:
+            emit(row)
+
+    start = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, math.ceil(schedule.peak))) as executor:
+        runner = PipelineRunner(executor, on_done)
+        while True:
+            with changed:
+                while True:
+                    name, level = schedule.at(time.monotonic() - start)
+                    if name is None or in_flight < level:
+                        break
+                    # re-check at least every 50ms, since a ramp can raise the level without a completion
+                    changed.wait(0.05)
+                if name is None:
+                    break
+                in_flight += 1
+            runner.start(target_list, input_value, count=_batch_size)
+        runner.wait()
+
+
+class ShardSink:
+    """Collects rows in a shard process and ships them to the parent in batches, with the shard's RunStats"""
+
+    def __init__(self, out_queue, batch_size: int = 200, max_delay: float = 0.25):
+        self.out_queue = out_queue
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._last_put = time.monotonic()
+        self.stats = RunStats()
+        self.phase_stats: Dict[str, RunStats] = {}
+        self._rows: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def emit(self, row: Dict):
+        with self._lock:
+            self.stats.add(row)
+            if row.get('phase'):
+                self.phase_stats.setdefault(row['phase'], RunStats()).add(row)
+            self._rows.append(row)
+            # ship full batches, or whatever is pending every max_delay so the parent's reporter stays current
+            if len(self._rows) >= self.batch_size or time.monotonic() - self._last_put >= self.max_delay:
+                self.out_queue.put(('rows', self._rows))
+                self._rows = []
+                self._last_put = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._rows:
+                self.out_queue.put(('rows', self._rows))
+                self._rows = []
+            self.out_queue.put(('stats', (self.stats, self.phase_stats)))
+
+
+def run_shard(index: int, target_list: List[str], requests_count: int, concurrency: int, input_value: int,
+              max_outstanding: Optional[int], rate: Optional[float], arrivals: str, seed: Optional[int],
+              schedule: Optional[LoadSchedule], hedge_percentile: Optional[float], hedge_delay_ms: Optional[float],
+              balance: str, retry_budget: float, stage_deadlines_ms: List[float], batch_size: int, streams: int,
+              chained: bool, wire: str, out_queue):
+    """Entry point of a --processes worker: runs its share of the requests with its own session and pool"""
+    sink = ShardSink(out_queue)
+    try:
+        create_balancers(target_list, balance)
+        configure_retries(retry_budget, stage_deadlines_ms)
+        configure_batching(batch_size)
+        configure_streams(streams)
+        configure_topology(chained)
+        configure_wire(wire)
+        hedger = create_hedger(hedge_percentile, hedge_delay_ms, concurrency)
+        create_shared_session(pool_maxsize=2 * concurrency if hedger else concurrency,
+                              pool_connections=max(10, sum(len(t.split("|")) for t in target_list)))
+        send_requests(target_list, requests_count, concurrency, input_value, max_outstanding, rate, arrivals, seed,
+                      sink.emit, schedule)
     except Exception as e:
-        recv_ts = int(time.time() * 1000)
-        return {
-            "input": input_value,
-            **stage_values,
-            **service_mapping,
-            "send_ts": send_ts,
-            "recv_ts": recv_ts,
-            "rtt_ms": recv_ts - send_ts,
-            "error": str(e)
-        }
+        out_queue.put(('error', f"shard {index}: {e}"))
+    finally:
+        close_streams()
+        sink.close()
+        if _hedger is not None:
+            out_queue.put(('hedge', _hedger.histograms()))
+        out_queue.put(('connections', connection_counts()))
+        out_queue.put(('done', index))
+
+
+def split_evenly(total: int, parts: int) -> List[int]:
+    """Split total into parts integers that differ by at most one"""
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def run_shards(processes: int, target_list: List[str], requests_count: int, concurrency: int, input_value: int,
+               max_outstanding: Optional[int], rate: Optional[float], arrivals: str, seed: Optional[int],
+               schedule: Optional[LoadSchedule], emit, hedge_percentile: Optional[float] = None,
+               hedge_delay_ms: Optional[float] = None,
+               balance: str = "round-robin", retry_budget: float = DEFAULT_RETRY_BUDGET,
+               stage_deadlines_ms: Optional[List[float]] = None, batch_size: int = 1,
+               streams: int = 0, chained: bool = False, wire: str = "json") -> Tuple[RunStats, Dict[str, RunStats]]:
+    """
+    Shard the run across worker processes (requests, concurrency, rate and
+    schedule levels are split evenly), passing their rows to emit() and
+    returning the merged RunStats and per-phase RunStats.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    out_queue = ctx.Queue()
+    # every shard needs a worker, an outstanding slot and (unless a schedule clocks the run) a
+    # request, so the rate and schedule levels are divided among the shards that actually run
+    limits = [processes, concurrency] + ([max_outstanding] if max_outstanding else [])
+    if not schedule:
+        limits.append(requests_count)
+    shards = max(1, min(limits))
+    if shards < processes:
+        print(f"Running {shards} client processes instead of {processes} "
+              f"(each needs at least one request and one worker)", flush=True)
+    counts = split_evenly(requests_count, shards)
+    workers = split_evenly(concurrency, shards)
+    outstanding = split_evenly(max_outstanding, shards) if max_outstanding else [None] * shards
+    shard_schedule = schedule.scaled(1 / shards) if schedule else None
+    procs = [
+        ctx.Process(target=run_shard, daemon=True, args=(
+            i, target_list, counts[i], workers[i], input_value, outstanding[i],
+            rate / shards if rate else None, arrivals, None if seed is None else seed + i,
+            shard_schedule, hedge_percentile, hedge_delay_ms, balance, retry_budget, stage_deadlines_ms, batch_size,
+            streams, chained, wire, out_queue))
+        for i in range(shards)
+    ]
+    for proc in procs:
+        proc.start()
+
+    stats = RunStats()
+    phase_stats: Dict[str, RunStats] = {}
+    done = 0
+    while done < len(procs):
+        try:
+            kind, payload = out_queue.get(timeout=1)
+        except queue.Empty:
+            if not any(proc.is_alive() for proc in procs):
+                print("  Warning: shard processes exited without reporting", flush=True)
+                break
+            continue
+        if kind == 'rows':
+            for row in payload:
+                emit(row)
+        elif kind == 'stats':
+            shard_stats, shard_phases = payload
+            stats.merge(shard_stats)
+            for name, phase in shard_phases.items():
+                phase_stats.setdefault(name, RunStats()).merge(phase)
+        elif kind == 'hedge':
+            _hedger.merge(payload)
+        elif kind == 'connections':
+            merge_connection_counts(payload)
+        elif kind == 'error':
+            print(f"  Error in {payload}", flush=True)
+        elif kind == 'done':
+            done += 1
+    for proc in procs:
+        proc.join()
+    return stats, phase_stats
+
+
+def parse_sweep(spec: str) -> List[float]:
+    """Sweep levels from "1,2,4,8" or "FROM:TO" (doubling from FROM, ending at TO)"""
+    if ":" in spec:
+        low, high = (float(x) for x in spec.split(":"))
+        if low <= 0 or high < low:
+            raise ValueError("FROM:TO needs 0 < FROM <= TO")
+        levels = []
+        while low < high:
+            levels.append(low)
+            low *= 2
+        return levels + [high]
+    levels = [float(x) for x in spec.split(",") if x.strip()]
+    if not levels or any(level <= 0 for level in levels):
+        raise ValueError("Sweep levels must be > 0")
+    return levels
+
+
+def run_sweep(target_list: List[str], levels: List[float], requests_count: int, concurrency: int, input_value: int,
+              rate: Optional[float], arrivals: str, seed: Optional[int], duration: Optional[float],
+              warmup_seconds: float, emit):
+    """
+    One step per level (concurrency, or req/s when rate is set): warm up for
+    warmup_seconds (rows discarded), then measure for duration seconds or
+    requests_count requests. Measured rows get phase "sweep <level>".
+    """
+    for level in levels:
+        step_concurrency = concurrency if rate else max(1, int(level))
+        step_rate = level if rate else None
+        print(f"  Sweep step: {level:g} {'req/s' if rate else 'concurrency'}", flush=True)
+        if warmup_seconds:
+            send_requests(target_list, 0, step_concurrency, input_value, None, step_rate, arrivals, seed,
+                          lambda row: None, LoadSchedule.hold(level, warmup_seconds))
+
+        def emit_step(row: Dict, name: str = f"sweep {level:g}"):
+            row["phase"] = name
+            emit(row)
+        send_requests(target_list, requests_count, step_concurrency, input_value,
+                      None if rate else step_concurrency * 20, step_rate, arrivals, seed, emit_step,
+                      LoadSchedule.hold(level, duration) if duration else None)
+
+
+def run_topologies(target_list: List[str], requests_count: int, concurrency: int, input_value: int,
+                   max_outstanding: Optional[int], rate: Optional[float], arrivals: str, seed: Optional[int], emit):
+    """
+    Run the same load in the star topology and then the chained one. Rows get
+    phase "star" or "chain", so the summary can compare the two.
+    """
+    for topology in ("star", "chain"):
+        print(f"  Topology: {topology}", flush=True)
+        configure_topology(topology == "chain")
+
+        def emit_topology(row: Dict, name: str = topology):
+            row["phase"] = name
+            emit(row)
+        send_requests(target_list, requests_count, concurrency, input_value, max_outstanding, rate, arrivals, seed,
+                      emit_topology)
+
+
+def sweep_table(phase_stats: Dict[str, RunStats], levels: List[float]) -> List[Dict]:
+    """
+    Throughput and latency per sweep step. The knee is the first step whose
+    p50 grew by a larger factor than its throughput did: beyond it, extra
+    load mostly buys queueing.
+    """
+    steps = []
+    for level in levels:
+        stats = phase_stats.get(f"sweep {level:g}", RunStats())
+        span = (stats.last_recv - stats.first_send) / 1000 if stats.first_send is not None else 0
+        p50 = stats.rtt_hist.percentile(50)
+        p99 = stats.rtt_hist.percentile(99)
+        steps.append({"level": f"{level:g}", "requests": stats.count, "errors": stats.errors,
+                      "throughput": round(stats.successful / span, 2) if span > 0 else 0,
+                      "p50_ms": p50 / 1000 if p50 is not None else None,
+                      "p99_ms": p99 / 1000 if p99 is not None else None, "knee": ""})
+    for prev, cur in zip(steps, steps[1:]):
+        if prev["throughput"] and prev["p50_ms"] and cur["p50_ms"] and \
+                cur["p50_ms"] / prev["p50_ms"] > cur["throughput"] / prev["throughput"]:
+            cur["knee"] = "knee"
+            break
+    return steps
+
 
 def run_experiment(targets: str, requests_count: int, concurrency: int, 
-                  work_ms: int, input_value: int, output_file: str = "results.csv", max_outstanding: int = None):
+                  work_ms: int, input_value: int, output_file: str = "results.csv", max_outstanding: int = None,
+                  rate: float = None, arrivals: str = "fixed", seed: int = None,
+                  flush_interval: float = 1.0, hist_out: str = None, processes: int = 1,
+                  duration: float = None, schedule: str = None, sweep: str = None,
+                  warmup_seconds: float = 2.0, report_interval: float = 1.0,
+                  timeseries_file: str = None, hedge_percentile: float = None,
+                  hedge_delay_ms: float = None, balance: str = "round-robin",
+                  retry_budget: float = DEFAULT_RETRY_BUDGET, stage_deadline_ms: str = None,
+                  batch_size: int = 1, streams: int = 0, chained: str = None, wire: str = "json") -> RunStats:
     """
     Run the distributed computing experiment
     
     Args:
-        targets: Comma-separated URLs for Service A-E (e.g., "http://192.168.1.10:5000,...,http://192.168.1.14:5000")
+        targets: Comma-separated URLs for Service A-E (e.g., "http://192.168.1.10:5000,...,http://192.168.1.14:5000"),
+            optionally labelled ("A=...,B=...") and with replicas separated by "|"
         requests_count: Total number of requests to send
         concurrency: Number of parallel requests
         work_ms: Work simulation time per service (ms)
         input_value: Input value for each request
         output_file: CSV file to write results
+        rate: Open-loop mode - start requests at this rate (req/s) instead of when a worker frees up
+        arrivals: Open-loop inter-arrival times, "fixed" or "poisson"
+        seed: Random seed for poisson arrivals
+        flush_interval: Seconds between flushes of the results CSV
+        hist_out: Optional path to save the RTT histogram (JSON) for later merging
+        processes: Worker processes to shard the run across (each with its own pool and session)
+        duration: Run for this many seconds at `concurrency` (or `rate`) instead of requests_count
+        schedule: Load phases instead of requests_count, e.g. "ramp:10:500:60,hold:500:300,ramp:500:10:60";
+            levels are concurrency, or req/s when rate is set
+        sweep: Run one step per level ("1,2,4,8" or "FROM:TO" doubling) of concurrency, or req/s when
+            rate is set, each measured for duration seconds or requests_count requests
+        warmup_seconds: Unmeasured warm-up before each sweep step
+        report_interval: Seconds per progress line / time-series row (0 disables)
+        timeseries_file: Time-series CSV path (default: timeseries.csv beside the results)
+        hedge_percentile: Send a duplicate stage call when a stage has not answered within its
+            observed latency at this percentile (e.g. 95); the first answer wins
+        hedge_delay_ms: Hedge after this fixed delay instead of a percentile
+        balance: How a stage with several replicas picks one per call: "round-robin",
+            "least-outstanding" or "p2c" (power of two choices)
+        retry_budget: Retries allowed across the run, as a percentage of stage calls (0 disables retries)
+        stage_deadline_ms: Deadline covering every attempt of one stage call, in ms: one value
+            for all stages or five comma-separated values for A..E
+        batch_size: Values sent together in one /process/batch call per stage (1 uses /process)
+        streams: Long-lived /process/stream connections per stage replica that carry every
+            stage call instead of request/response calls (0 disables streaming)
+        chained: "chain" to call A's /process/chain once per request and let each stage
+            forward to the next, or "both" to run star and then chain and compare them
+        wire: Body format of /process calls, "json" or "binary" (fixed-width little-endian
+            integers, negotiated with Content-Type and Accept)
+
+    Returns:
+        RunStats aggregated over all requests
     """
     # Parse targets
-    target_list = [url.strip() for url in targets.split(",")]
-    if len(target_list) != 5:
-        raise ValueError("Must provide exactly 5 targets (Services A-E)")
+    target_list = parse_targets(targets)
+    create_balancers(target_list, balance)
+    stage_deadlines_ms = parse_stage_deadlines(stage_deadline_ms) if stage_deadline_ms else [DEFAULT_STAGE_DEADLINE_MS] * 5
+    configure_retries(retry_budget, stage_deadlines_ms)
+    configure_batching(batch_size)
+    configure_streams(streams)
+    if streams and batch_size > 1:
+        raise ValueError("Use either batch_size or streams")
+    configure_topology(chained == "chain")
+    if chained and (batch_size > 1 or streams or hedge_percentile is not None or hedge_delay_ms is not None):
+        raise ValueError("The chained topology cannot be combined with batching, streams or hedging")
+    if chained == "both" and (schedule or duration or sweep or processes > 1):
+        raise ValueError("Comparing topologies needs a plain run: no schedule, duration, sweep or multiple processes")
+    configure_wire(wire)
+    if wire != "json" and (batch_size > 1 or streams or chained):
+        raise ValueError("The binary wire format applies to /process calls only: not to batching, streams or chaining")
+    if schedule and duration:
+        raise ValueError("Use either duration or schedule")
+    sweep_levels = parse_sweep(sweep) if sweep else None
+    if sweep_levels and (schedule or processes > 1):
+        raise ValueError("A sweep cannot be combined with a schedule or multiple processes")
+    if hedge_percentile is not None and hedge_delay_ms is not None:
+        raise ValueError("Use either hedge_percentile or hedge_delay_ms")
+    load_schedule = None
+    if schedule:
+        load_schedule = LoadSchedule.parse(schedule)
+    elif duration and not sweep_levels:
+        load_schedule = LoadSchedule.hold(rate or concurrency, duration)
     
     print("=== HTTP/REST Distributed Computing Experiment ===", flush=True)
     for label, url in zip(["Service A", "Service B", "Service C", "Service D", "Service E"], target_list):
-        print(f"{label} URL: {url}", flush=True)
-    print(f"Total requests: {requests_count}", flush=True)
+        print(f"{label} URL: {url.replace('|', ', ')}", flush=True)
+    if _balancers:
+        print(f"Replica balancing: {balance}", flush=True)
+    if load_schedule:
+        print(f"Schedule: {', '.join(p[0] for p in load_schedule.phases)} ({load_schedule.duration:g}s)", flush=True)
+    elif sweep_levels:
+        step = f"{duration:g}s" if duration else f"{requests_count} requests"
+        print(f"Sweep: {', '.join(f'{level:g}' for level in sweep_levels)} {'req/s' if rate else 'concurrency'}, "
+              f"{step} per step after {warmup_seconds:g}s warm-up", flush=True)
+    else:
+        print(f"Total requests: {requests_count}", flush=True)
     print(f"Concurrency: {concurrency}", flush=True)
+    if processes > 1:
+        print(f"Processes: {processes}", flush=True)
     print(f"Work simulation: {work_ms}ms per service", flush=True)
     print(f"Input value: {input_value}", flush=True)
+    if batch_size > 1:
+        print(f"Batching: up to {batch_size} values per /process/batch call; concurrency counts batches", flush=True)
+    if streams:
+        print(f"Streaming: up to {streams} /process/stream connections per stage replica", flush=True)
+    if wire != "json":
+        print(f"Wire format: {BINARY_TYPE} ({BINARY_REQUEST.size}-byte requests, "
+              f"{BINARY_RESPONSE.size}-byte responses)", flush=True)
+    if chained:
+        print(f"Topology: {'star, then chain' if chained == 'both' else 'chain'} "
+              f"(the client calls A's /process/chain and each stage forwards to the next)", flush=True)
+    if rate:
+        print(f"Open loop: {'scheduled' if load_schedule else f'{rate:g}'} req/s, {arrivals} arrivals", flush=True)
+    if hedge_percentile is not None or hedge_delay_ms is not None:
+        rule = f"p{hedge_percentile:g} of the stage's latency" if hedge_delay_ms is None else f"{hedge_delay_ms:g}ms"
+        print(f"Hedging: duplicate a stage call after {rule}", flush=True)
+    print(f"Retries: budget {retry_budget:g}% of stage calls, up to {MAX_ATTEMPTS} attempts within "
+          f"stage deadlines {', '.join(f'{ms:g}' for ms in stage_deadlines_ms)}ms", flush=True)
     print(flush=True)
     
     # Create shared session with pool sized to concurrency, then check service health
-    create_shared_session(pool_maxsize=concurrency, pool_connections=10, retries=3)
+    pool_size = max([concurrency] + [int(level) for level in sweep_levels or []]) if not rate else concurrency
+    # with --processes the shards hedge and this one only collects their histograms
+    hedger = create_hedger(hedge_percentile, hedge_delay_ms, pool_size)
+    if hedger:
+        # a hedge needs a second connection while the first is still busy
+        pool_size *= 2
+    # one host pool per replica URL
+    replica_urls = [url for target in target_list for url in target.split("|")]
+    create_shared_session(pool_maxsize=pool_size, pool_connections=max(10, len(replica_urls)))
     print("Checking service health...", flush=True)
     health_session = get_session()
     for name, url in zip(
-        ["Service A", "Service B", "Service C", "Service D", "Service E"],
-        target_list
+        [f"Service {'ABCDE'[index]}" for index, target in enumerate(target_list) for _ in target.split("|")],
+        replica_urls
     ):
         try:
             response = health_session.get(f"{url}/health", timeout=5)
             response.raise_for_status()
-            print(f"  ✓ {name} is healthy", flush=True)
+            version = {10: "HTTP/1.0", 11: "HTTP/1.1"}.get(response.raw.version, "HTTP")
+            keep_alive = "closes connections" if response.headers.get("Connection", "").lower() == "close" else "keep-alive"
+            print(f"  ✓ {name} ({url}) is healthy ({version}, {keep_alive})", flush=True)
         except Exception as e:
             print(f"  ✗ {name} health check failed: {e}", flush=True)
             print(f"    Warning: Continuing anyway...", flush=True)
@@ -212,77 +1800,201 @@ def run_experiment(targets: str, requests_count: int, concurrency: int,
     os.makedirs(results_dir, exist_ok=True)
     output_path = os.path.join(results_dir, output_file)
     
-    # Prepare submission bounding (limit how many requests are submitted but not yet completed)
-    if max_outstanding is None:
+    # Prepare submission bounding (limit how many requests are submitted but not yet completed).
+    # Open-loop runs must keep to their schedule, so they are not bounded by default.
+    if max_outstanding is None and not rate:
         max_outstanding = concurrency * 20
-    semaphore = threading.Semaphore(max_outstanding)
+
+    # Rows are appended to the CSV by a writer thread as they complete
+    fieldnames = [
+        'input', 'computed', 'transformed', 'aggregated', 'refined', 'final_result',
+        'service_a', 'service_b', 'service_c', 'service_d', 'service_e',
+        'send_ts', 'recv_ts', 'rtt_ms', 'sched_delay_ms',
+        'a_us', 'b_us', 'c_us', 'd_us', 'e_us',
+        'a_server_us', 'b_server_us', 'c_server_us', 'd_server_us', 'e_server_us',
+        'hedges', 'hedge_wins', 'retries', 'retries_denied', 'deadline_exceeded', 'batch_size', 'topology', 'client_calls', 'server_hops', 'phase', 'error'
+    ]
+    print(f"Writing results to {output_path}...", flush=True)
+    reporter = None
+    if report_interval > 0:
+        timeseries_path = timeseries_file or os.path.join(os.path.dirname(output_path), "timeseries.csv")
+        reporter = IntervalReporter(timeseries_path, report_interval)
+        print(f"Reporting every {report_interval:g}s to the console and {timeseries_path}", flush=True)
+    writer = ResultsWriter(output_path, fieldnames, flush_interval=flush_interval, aggregate=processes <= 1,
+                           reporter=reporter)
+    on_row = writer.write
 
     # Run experiment
     print("Starting experiment...", flush=True)
     start_time = time.time()
-    results = []
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
-        # Submit all requests
-        futures = []
-        for i in range(requests_count):
-            semaphore.acquire()
-            future = executor.submit(
-                process_request,
-                target_list,
-                input_value
-            )
-            # release the semaphore when the future finishes
-            future.add_done_callback(lambda f, sem=semaphore: sem.release())
-            futures.append(future)
-        
-        # Collect results as they complete
-        completed = 0
-        for future in concurrent.futures.as_completed(futures):
-            result = future.result()
-            results.append(result)
-            completed += 1
-            if completed % 50 == 0:
-                print(f"  Completed {completed}/{requests_count} requests...", flush=True)
+    try:
+        if processes > 1:
+            shard_stats, phase_stats = run_shards(processes, target_list, requests_count, concurrency, input_value,
+                                                  max_outstanding, rate, arrivals, seed, load_schedule, on_row,
+                                                  hedge_percentile, hedge_delay_ms, balance, retry_budget,
+                                                  stage_deadlines_ms, batch_size, streams, chained == "chain",
+                                                  wire)
+        elif chained == "both":
+            run_topologies(target_list, requests_count, concurrency, input_value, max_outstanding, rate, arrivals,
+                           seed, on_row)
+        elif sweep_levels:
+            run_sweep(target_list, sweep_levels, requests_count, concurrency, input_value, rate, arrivals, seed,
+                      duration, warmup_seconds, on_row)
+        else:
+            send_requests(target_list, requests_count, concurrency, input_value, max_outstanding, rate, arrivals, seed,
+                          on_row, load_schedule)
+    finally:
+        close_streams()
+        writer.close()
+        if hedger:
+            hedger.close()
     
     total_time = time.time() - start_time
-    
-    # Write results to CSV
-    print(f"\nWriting results to {output_path}...", flush=True)
-    with open(output_path, 'w', newline='') as csvfile:
-        fieldnames = [
-            'input', 'computed', 'transformed', 'aggregated', 'refined', 'final_result',
-            'service_a', 'service_b', 'service_c', 'service_d', 'service_e',
-            'send_ts', 'recv_ts', 'rtt_ms', 'error'
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(results)
-    
-    # Calculate statistics
-    successful = [r for r in results if not r['error']]
-    rtts = [r['rtt_ms'] for r in successful]
+    stats = writer.stats
+    phase_stats = phase_stats if processes > 1 else writer.phase_stats
+    if processes > 1:
+        # Time the load itself, not the worker process start-up
+        stats = shard_stats
+        if stats.count:
+            total_time = max(0.001, (stats.last_recv - stats.first_send) / 1000)
     
     print("\n=== Experiment Summary ===", flush=True)
-    print(f"Total requests: {requests_count}", flush=True)
-    print(f"Successful requests: {len(successful)}", flush=True)
-    print(f"Failed requests: {len(results) - len(successful)}", flush=True)
+    print(f"Total requests: {stats.count}", flush=True)
+    print(f"Successful requests: {stats.successful}", flush=True)
+    print(f"Failed requests: {stats.errors}", flush=True)
     print(f"Total time: {total_time:.2f} seconds ({total_time*1000:.2f}ms)", flush=True)
     
-    if rtts:
-        print(f"Average RTT per request: {sum(rtts)/len(rtts):.2f}ms", flush=True)
-        print(f"Min RTT: {min(rtts)}ms", flush=True)
-        print(f"Max RTT: {max(rtts)}ms", flush=True)
-        print(f"Throughput: {len(successful)/total_time:.2f} requests/second", flush=True)
+    if stats.successful:
+        print(f"Average RTT per request: {stats.rtt_sum/stats.successful:.2f}ms", flush=True)
+        print(f"Min RTT: {stats.rtt_min:.2f}ms", flush=True)
+        print(f"Max RTT: {stats.rtt_max:.2f}ms", flush=True)
+        print(f"RTT percentiles: {stats.rtt_hist.summary()}", flush=True)
+        print(f"Throughput: {stats.successful/total_time:.2f} requests/second", flush=True)
+    if rate and stats.count:
+        span = (stats.last_send - stats.first_send) / 1000
+        offered = (stats.count - 1) / span if span > 0 else rate
+        target = "scheduled" if load_schedule else f"target {rate:g}"
+        print(f"Open loop ({arrivals} arrivals): offered {offered:.2f} req/s ({target}), "
+              f"achieved {stats.successful/total_time:.2f} req/s successful", flush=True)
+        print(f"Send delay behind schedule: avg {stats.sched_sum/stats.count:.2f}ms, max {stats.sched_max:.2f}ms (included in RTT)", flush=True)
+    if stats.successful:
+        print("Per-stage time (avg; call = client wait, server = reported processing, net+queue = difference):", flush=True)
+        for index, (column, (_, service_key)) in enumerate(zip(STAGE_COLUMNS, STAGE_KEYS)):
+            call_ms = stats.call_sum[index] / stats.call_n[index] / 1000 if stats.call_n[index] else None
+            server_ms = stats.server_sum[index] / stats.server_n[index] / 1000 if stats.server_n[index] else None
+            line = f"  {service_key}: call {call_ms:8.2f}ms" if call_ms is not None else f"  {service_key}: call        -  "
+            if server_ms is not None:
+                line += f"  server {server_ms:8.2f}ms"
+                if call_ms is not None:
+                    line += f"  net+queue {call_ms - server_ms:8.2f}ms"
+            if call_ms is not None and batch_size > 1:
+                line += f"  per value {call_ms / batch_size:7.3f}ms"
+            print(line, flush=True)
+    if chained and stats.successful:
+        topologies = ({name: phase_stats.get(name, RunStats()) for name in ("star", "chain")}
+                      if chained == "both" else {"chain": stats})
+        print("Topology (per successful request; hops = calls between stages):", flush=True)
+        for name, topo in topologies.items():
+            if not topo.successful:
+                continue
+            span = max(0.001, (topo.last_recv - topo.first_send) / 1000)
+            print(f"  {name:<6} client calls {topo.client_calls / topo.successful:4.2f}  "
+                  f"server hops {topo.server_hops / topo.successful:4.2f}  "
+                  f"avg RTT {topo.rtt_sum / topo.successful:8.2f}ms  "
+                  f"p50 {topo.rtt_hist.percentile(50) / 1000:8.2f}ms  p99 {topo.rtt_hist.percentile(99) / 1000:8.2f}ms  "
+                  f"{topo.successful / span:8.1f} ok/s", flush=True)
+    if stats.retries or stats.retries_denied or stats.deadline_exceeded:
+        calls = sum(calls for calls, _, _ in stats.replicas.values())
+        print(f"Retries: {stats.retries} ({100 * stats.retries / max(calls, 1):.1f}% of stage calls, budget {retry_budget:g}%), "
+              f"{stats.retries_denied} refused by the budget, {stats.deadline_exceeded} requests hit a stage deadline",
+              flush=True)
+    counts = connection_counts()
+    if counts:
+        print("Connections (opened / requests sent, including health checks; per host, so stages "
+              "sharing a server show the same counts):", flush=True)
+        for index, target in enumerate(target_list):
+            for url in target.split("|"):
+                parsed = urllib.parse.urlsplit(url)
+                opened, sent = counts.get(f"{parsed.hostname}:{parsed.port or 80}", [0, 0])
+                if sent:
+                    print(f"  {'ABCDE'[index]} {url:<28} opened {opened:>7} for {sent:>8} requests  "
+                          f"reuse {100 * (1 - opened / sent):5.1f}%", flush=True)
+    replica_lines = []
+    for column in STAGE_COLUMNS:
+        entries = sorted((replica, entry) for (stage, replica), entry in stats.replicas.items() if stage == column)
+        if len(entries) < 2:
+            continue
+        total = sum(calls for _, (calls, _, _) in entries)
+        for replica, (calls, errors, call_us) in entries:
+            ok = calls - errors
+            avg = f"{call_us / ok / 1000:8.2f}ms" if ok else "       -  "
+            replica_lines.append(f"  {column.upper()} {replica:<28} calls {calls:>8} ({100 * calls / total:5.1f}%)  "
+                                 f"avg {avg}  errors {errors}")
+    if replica_lines:
+        note = "; chained: avg is the stage's reported time, failed chains count against A" if chained else ""
+        print(f"Per-replica calls ({balance}{note}):", flush=True)
+        for line in replica_lines:
+            print(line, flush=True)
+    if _hedger is not None:
+        calls = sum(stats.call_n)
+        print(f"Hedged stage calls: {stats.hedges} duplicates for {calls} calls "
+              f"(+{100 * stats.hedges / max(calls, 1):.1f}% stage requests), "
+              f"duplicate answered first {stats.hedge_wins} times", flush=True)
+        print("Stage call latency, primary only -> with hedging:", flush=True)
+        primary, hedged = _hedger.histograms()
+        for service_key, p_hist, h_hist in zip((key for _, key in STAGE_KEYS), primary, hedged):
+            if p_hist.total and h_hist.total:
+                print(f"  {service_key}: p50 {p_hist.percentile(50) / 1000:7.2f}ms -> {h_hist.percentile(50) / 1000:7.2f}ms"
+                      f"  p99 {p_hist.percentile(99) / 1000:7.2f}ms -> {h_hist.percentile(99) / 1000:7.2f}ms"
+                      f"  max {p_hist.max / 1000:7.2f}ms -> {h_hist.max / 1000:7.2f}ms", flush=True)
+    
+    if load_schedule:
+        print(f"Per-phase (levels are {'req/s' if rate else 'concurrency'}):", flush=True)
+        print(f"  {'phase':<22}{'secs':>7}{'requests':>10}{'failed':>8}{'ok/s':>10}{'p50 ms':>10}{'p99 ms':>10}", flush=True)
+        for name, _, _, seconds in load_schedule.phases:
+            phase = phase_stats.get(name, RunStats())
+            p50 = phase.rtt_hist.percentile(50)
+            p99 = phase.rtt_hist.percentile(99)
+            print(f"  {name:<22}{seconds:>7g}{phase.count:>10}{phase.errors:>8}{phase.successful / seconds:>10.1f}"
+                  f"{p50 / 1000 if p50 is not None else float('nan'):>10.2f}"
+                  f"{p99 / 1000 if p99 is not None else float('nan'):>10.2f}", flush=True)
+    
+    if sweep_levels:
+        unit = "req/s" if rate else "concurrency"
+        steps = sweep_table(phase_stats, sweep_levels)
+        print(f"\n=== Sweep ===", flush=True)
+        print(f"  {unit:>12}{'requests':>10}{'failed':>8}{'ok/s':>10}{'p50 ms':>10}{'p99 ms':>10}", flush=True)
+        for step in steps:
+            p50 = f"{step['p50_ms']:.2f}" if step['p50_ms'] is not None else "-"
+            p99 = f"{step['p99_ms']:.2f}" if step['p99_ms'] is not None else "-"
+            marker = "  <- knee: latency grows faster than throughput" if step["knee"] else ""
+            print(f"  {step['level']:>12}{step['requests']:>10}{step['errors']:>8}{step['throughput']:>10.1f}"
+                  f"{p50:>10}{p99:>10}{marker}", flush=True)
+        sweep_path = os.path.splitext(output_path)[0] + "_sweep.csv"
+        with open(sweep_path, 'w', newline='') as csvfile:
+            sweep_writer = csv.DictWriter(csvfile, fieldnames=['mode', 'level', 'requests', 'errors', 'throughput',
+                                                               'p50_ms', 'p99_ms', 'knee'])
+            sweep_writer.writeheader()
+            for step in steps:
+                sweep_writer.writerow(dict(step, mode=unit))
+        print(f"Sweep table saved to: {sweep_path}", flush=True)
     
     print(f"\nResults saved to: {output_path}", flush=True)
+    if hist_out:
+        stats.rtt_hist.save(hist_out)
+        print(f"RTT histogram saved to: {hist_out}", flush=True)
     
-    return results
+    return stats
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='HTTP/REST Distributed Computing Client')
-    parser.add_argument('--targets', type=str, required=True,
-                       help='Comma-separated URLs for Service A-E (e.g., "http://192.168.1.10:5000,...,http://192.168.1.14:5000")')
+    parser.add_argument('--targets', type=str,
+                       help='Comma-separated URLs for Service A-E (e.g., "http://192.168.1.10:5000,...,http://192.168.1.14:5000"), '
+                            'or "A=...,B=..."; a stage may list replicas separated by "|"')
+    parser.add_argument('--balance', choices=ReplicaBalancer.POLICIES, default='round-robin',
+                       help='How a stage with several replicas ("A=http://h1:5000|http://h2:5000") picks one per call; '
+                            'p2c = power of two choices (default: round-robin)')
     parser.add_argument('--requests', type=int, default=300,
                        help='Total number of requests (default: 300)')
     parser.add_argument('--concurrency', type=int, default=10,
@@ -294,9 +2006,102 @@ if __name__ == '__main__':
     parser.add_argument('--output', type=str, default='results.csv',
                        help='Output CSV filename (default: results.csv)')
     parser.add_argument('--max-outstanding', type=int, default=None,
-                       help='Maximum submitted-but-not-completed requests (defaults to concurrency*20)')
+                       help='Maximum submitted-but-not-completed requests (defaults to concurrency*20, unbounded with --rate)')
+    parser.add_argument('--rate', type=float, default=None,
+                       help='Open-loop mode: start requests at this many per second regardless of completions; '
+                            'latency is measured from each intended start')
+    parser.add_argument('--arrivals', choices=['fixed', 'poisson'], default='fixed',
+                       help='Open-loop inter-arrival times (default: fixed)')
+    parser.add_argument('--seed', type=int, default=None,
+                       help='Random seed for --arrivals poisson')
+    parser.add_argument('--duration', type=float, default=None,
+                       help='Run for this many seconds at --concurrency (or --rate) instead of --requests')
+    parser.add_argument('--schedule', type=str, default=None,
+                       help='Load phases instead of --requests, e.g. "ramp:10:500:60,hold:500:300,ramp:500:10:60"; '
+                            'levels are concurrency, or req/s with --rate (whose value is then unused)')
+    parser.add_argument('--sweep', type=str, default=None,
+                       help='One step per level ("1,2,4,8" or FROM:TO doubling) of concurrency, or req/s with --rate; '
+                            'each step warms up, then runs --duration seconds or --requests requests')
+    parser.add_argument('--warmup-seconds', type=float, default=2.0,
+                       help='Unmeasured warm-up before each --sweep step (default: 2)')
+    parser.add_argument('--processes', type=int, default=1,
+                       help='Shard requests, concurrency and rate across this many worker processes (default: 1)')
+    parser.add_argument('--report-interval', type=float, default=1.0,
+                       help='Seconds per progress line and timeseries.csv row of completed, errors, ok/s, p50, p99 '
+                            '(default: 1, 0 disables)')
+    parser.add_argument('--timeseries', type=str, default=None,
+                       help='Time-series CSV path (default: timeseries.csv beside the results)')
+    parser.add_argument('--hedge-percentile', type=float, default=None, metavar='P',
+                       help='Send a duplicate stage call when a stage has not answered within its observed P-th '
+                            'percentile latency (e.g. 95); the first answer wins')
+    parser.add_argument('--hedge-delay-ms', type=float, default=None,
+                       help='Hedge after this fixed delay instead of a percentile')
+    parser.add_argument('--retry-budget', type=float, default=DEFAULT_RETRY_BUDGET, metavar='PERCENT',
+                       help='Retries allowed across the run as a percentage of stage calls; 0 disables retries (default: 10)')
+    parser.add_argument('--stage-deadline-ms', type=str, default=None,
+                       help='Deadline for all attempts of one stage call: one value or five for A..E (default: 10000)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                       help='Send this many values per stage call via /process/batch, paying WORK_MS once (default: 1)')
+    parser.add_argument('--streams', type=int, default=0,
+                       help='Carry stage calls over this many long-lived /process/stream connections per stage '
+                            'replica instead of request/response calls (default: 0, off)')
+    parser.add_argument('--chained', nargs='?', const='chain', choices=['chain', 'both'], default=None,
+                       help='Call only service A (/process/chain) and let each stage forward its result to the next; '
+                            '"--chained both" runs the star topology and then the chain and compares them')
+    parser.add_argument('--wire', choices=['json', 'binary'], default='json',
+                       help='Body format of /process calls: JSON, or fixed-width little-endian integers '
+                            f'({BINARY_TYPE}) (default: json)')
+    parser.add_argument('--hist-out', type=str, default=None,
+                       help='Save the RTT histogram to this JSON file')
+    parser.add_argument('--merge-hist', nargs='+', default=None, metavar='FILE',
+                       help='Merge histogram files from --hist-out, print percentiles (and save to --hist-out), then exit')
+    parser.add_argument('--flush-interval', type=float, default=1.0,
+                       help='Seconds between flushes of the results CSV; rows are appended as they complete (default: 1.0)')
     
     args = parser.parse_args()
+    if args.merge_hist:
+        merged = LatencyHistogram.load(args.merge_hist[0])
+        for path in args.merge_hist[1:]:
+            merged.merge(LatencyHistogram.load(path))
+        print(f"{merged.total} samples: {merged.summary()}")
+        if args.hist_out:
+            merged.save(args.hist_out)
+        sys.exit(0)
+    if not args.targets:
+        parser.error('--targets is required')
+    try:
+        parse_targets(args.targets)
+    except ValueError as e:
+        parser.error(f'--targets: {e}')
+    if args.processes < 1:
+        parser.error('--processes must be >= 1')
+    if args.duration is not None and args.duration <= 0:
+        parser.error('--duration must be > 0')
+    if args.schedule:
+        try:
+            LoadSchedule.parse(args.schedule)
+        except ValueError as e:
+            parser.error(f'--schedule: {e}')
+    if args.sweep:
+        try:
+            parse_sweep(args.sweep)
+        except ValueError as e:
+            parser.error(f'--sweep: {e}')
+        if args.schedule or args.processes > 1:
+            parser.error('--sweep cannot be combined with --schedule or --processes')
+    if args.rate is not None and args.rate <= 0:
+        parser.error('--rate must be > 0')
+    if args.retry_budget < 0:
+        parser.error('--retry-budget must be >= 0')
+    if args.stage_deadline_ms:
+        try:
+            parse_stage_deadlines(args.stage_deadline_ms)
+        except ValueError as e:
+            parser.error(f'--stage-deadline-ms: {e}')
+    if args.hedge_percentile is not None and args.hedge_delay_ms is not None:
+        parser.error('use either --hedge-percentile or --hedge-delay-ms')
+    if (args.hedge_percentile is not None and not 0 < args.hedge_percentile < 100) or (args.hedge_delay_ms or 0) < 0:
+        parser.error('--hedge-percentile must be between 0 and 100 and --hedge-delay-ms >= 0')
     
     run_experiment(
         targets=args.targets,
@@ -305,6 +2110,27 @@ if __name__ == '__main__':
         work_ms=args.work_ms,
         input_value=args.input,
         output_file=args.output,
-        max_outstanding=args.max_outstanding
+        max_outstanding=args.max_outstanding,
+        rate=args.rate,
+        arrivals=args.arrivals,
+        seed=args.seed,
+        flush_interval=args.flush_interval,
+        hist_out=args.hist_out,
+        processes=args.processes,
+        duration=args.duration,
+        schedule=args.schedule,
+        sweep=args.sweep,
+        warmup_seconds=args.warmup_seconds,
+        report_interval=args.report_interval,
+        timeseries_file=args.timeseries,
+        hedge_percentile=args.hedge_percentile,
+        hedge_delay_ms=args.hedge_delay_ms,
+        balance=args.balance,
+        retry_budget=args.retry_budget,
+        stage_deadline_ms=args.stage_deadline_ms,
+        batch_size=args.batch_size,
+        streams=args.streams,
+        chained=args.chained,
+        wire=args.wire
     )
 
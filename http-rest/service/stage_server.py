@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+HTTP/REST Stage Server - serves stages of the 5-stage distributed computing pipeline
+Service A (Inventory) -> B (Sales Tax) -> C (Shipping) -> D (Processing Fee) -> E (Currency Rounding)
+
+Each stage is an operation registered with @register_stage. SERVICE_NAME picks the
+stages this process serves, by letter or operation name ("B", "tax",
+"A,B,C"). A single stage is served at the root (/process, /health, ...);
+every hosted stage is also served under its letter (/a/process, /b/process, ...).
+"""
+
+from flask import Blueprint, Flask, Response, request, jsonify
+from requests.adapters import HTTPAdapter
+import requests
+import json
+import struct
+import time
+import os
+
+SERVICE_NAME = os.getenv('SERVICE_NAME', 'A,B,C,D,E')
+WORK_MS = int(os.getenv('WORK_MS', '10'))
+SERVER_MODE = os.getenv('SERVER_MODE', 'dev')
+WORKERS = int(os.getenv('WORKERS', '1'))
+THREADS = int(os.getenv('THREADS', '16'))
+KEEPALIVE = int(os.getenv('KEEPALIVE', '75'))
+# Chained mode: downstream stage URL used when a /process/chain request carries no route
+NEXT_URL = os.getenv('NEXT_URL', '')
+CHAIN_TIMEOUT_MS = 10000
+# Binary wire format for /process, picked by Content-Type and Accept: the request is
+# one little-endian int64 value; the response is the int64 result, the uint32
+# processing time (us) and the stage letter as one ASCII byte
+BINARY_TYPE = 'application/x-stage-int64'
+BINARY_REQUEST = struct.Struct('<q')
+BINARY_RESPONSE = struct.Struct('<qIc')
+# Stage parameters
+BASE_STOCK = int(os.getenv('BASE_STOCK', '100'))
+TAX_RATE = float(os.getenv('TAX_RATE', '0.15'))
+BASE_SHIPPING = int(os.getenv('BASE_SHIPPING', '50'))
+UNIT_DIVISOR = int(os.getenv('UNIT_DIVISOR', '10'))
+FEE_RATE = float(os.getenv('FEE_RATE', '0.025'))
+ROUND_BASE = int(os.getenv('ROUND_BASE', '5'))
+
+
+class Stage:
+    """A registered pipeline stage: its letter, operation name, descriptions and value function"""
+
+    def __init__(self, letter, operation, title, summary, fn):
+        self.letter = letter
+        self.operation = operation
+        self.title = title
+        self.summary = summary
+        self.fn = fn
+
+
+# Stage letter -> Stage, in pipeline order
+STAGES = {}
+
+
+def register_stage(letter, operation, title, summary):
+    """Register the decorated function (value -> value) as stage `letter`, selectable as `operation`"""
+    def register(fn):
+        STAGES[letter] = Stage(letter, operation, title, summary, fn)
+        return fn
+    return register
+
+
+@register_stage('A', 'add_base', f"Inventory Check (Add {BASE_STOCK})", "add incoming stock to base inventory")
+def add_base(value):
+    """Service A: Add incoming stock to base inventory"""
+    return value + BASE_STOCK
+
+
+@register_stage('B', 'tax', f"Sales Tax ({TAX_RATE:.0%})", f"apply {TAX_RATE:.0%} sales tax")
+def tax(value):
+    """Service B: Apply sales tax"""
+    return int(value * (1 + TAX_RATE))
+
+
+@register_stage('C', 'shipping', "Shipping Cost", "compute shipping cost")
+def shipping(value):
+    """Service C: Calculate shipping cost based on order size"""
+    return BASE_SHIPPING + int(value / UNIT_DIVISOR)
+
+
+@register_stage('D', 'fee', f"Processing Fee ({FEE_RATE:.1%})", "apply processing fee")
+def fee(value):
+    """Service D: Apply processing fee"""
+    return int(value * (1 + FEE_RATE))
+
+
+@register_stage('E', 'round', f"Currency Rounding (nearest {ROUND_BASE})",
+       f"round value to nearest multiple of {ROUND_BASE}")
+def round_currency(value):
+    """Service E: Round down to nearest multiple of ROUND_BASE"""
+    return (value // ROUND_BASE) * ROUND_BASE
+
+
+def simulate_work():
+    """The simulated processing time, paid once per /process call, batch or streamed value"""
+    time.sleep(WORK_MS / 1000.0)
+
+
+def select_stages(spec):
+    """Stages named in a comma-separated list of letters or operation names, in pipeline order"""
+    by_name = {}
+    for letter, registered in STAGES.items():
+        by_name[letter.lower()] = registered
+        by_name[registered.operation.lower()] = registered
+    selected = set()
+    for name in spec.split(','):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in by_name:
+            raise SystemExit(f"Unknown stage {name!r} in SERVICE_NAME (expected A-E or one of "
+                             f"{', '.join(s.operation for s in STAGES.values())})")
+        selected.add(by_name[name].letter)
+    if not selected:
+        raise SystemExit("SERVICE_NAME names no stage")
+    return [STAGES[letter] for letter in STAGES if letter in selected]
+
+
+# Keep-alive connections to downstream stages, shared by every /process/chain request thread
+downstream = requests.Session()
+downstream.mount('http://', HTTPAdapter(pool_connections=10, pool_maxsize=THREADS, max_retries=0))
+
+
+def next_hop(route):
+    """
+    Pick the downstream stage for a chain call, and the route to forward with it.
+    The request's route (URLs of the later stages) wins: its first entry is the
+    next hop and the rest is forwarded. Otherwise fall back to NEXT_URL.
+    """
+    if route:
+        return route[0], route[1:]
+    return NEXT_URL, []
+
+
+def read_lines(stream):
+    """
+    Yield the lines of a request body as each arrives. Reads a byte at a time:
+    WSGI servers' chunked-body readers otherwise wait to fill a whole buffer,
+    which a trickle of short lines may never do.
+    """
+    line = b""
+    while True:
+        byte = stream.readline(1)
+        if not byte:
+            break
+        line += byte
+        if byte == b"\n":
+            yield line
+            line = b""
+    if line:
+        yield line
+
+
+def create_blueprint(stage):
+    """The /process, /process/batch, /process/stream, /health and / routes of one stage"""
+    bp = Blueprint(f"stage_{stage.letter.lower()}", __name__)
+
+    @bp.route('/process', methods=['POST'])
+    def process():
+        """
+        Process a request {"value": n}, or a binary BINARY_TYPE body: apply the stage
+        to the value. The response is binary when Accept prefers BINARY_TYPE.
+        """
+        start_ns = time.perf_counter_ns()
+        try:
+            if request.mimetype == BINARY_TYPE:
+                body = request.get_data()
+                if len(body) != BINARY_REQUEST.size:
+                    return jsonify({
+                        "error": f"Expected a {BINARY_REQUEST.size}-byte {BINARY_TYPE} body, got {len(body)} bytes",
+                        "status": "error"
+                    }), 400
+                input_value, = BINARY_REQUEST.unpack(body)
+            else:
+                data = request.json or {}
+                if 'value' not in data:
+                    return jsonify({
+                        "error": "Missing 'value' in request",
+                        "status": "error"
+                    }), 400
+                input_value = int(data['value'])
+
+            # Process the value
+            simulate_work()
+            result = stage.fn(input_value)
+
+            if request.accept_mimetypes.best_match(['application/json', BINARY_TYPE]) == BINARY_TYPE:
+                return Response(BINARY_RESPONSE.pack(int(result), (time.perf_counter_ns() - start_ns) // 1000,
+                                                     stage.letter.encode()),
+                                mimetype=BINARY_TYPE)
+            return jsonify({
+                "value": int(result),
+                "service": stage.letter,
+                "status": "success",
+                "processing_us": (time.perf_counter_ns() - start_ns) // 1000
+            })
+
+        except Exception as e:
+            return jsonify({
+                "error": str(e),
+                "status": "error"
+            }), 500
+
+    @bp.route('/process/batch', methods=['POST'])
+    def process_batch():
+        """Process a batch {"values": [...]}: apply the stage to each value, paying the simulated work once"""
+        start_ns = time.perf_counter_ns()
+        try:
+            data = request.json or {}
+            values = data.get('values')
+            if not isinstance(values, list):
+                return jsonify({
+                    "error": "Missing 'values' array in request",
+                    "status": "error"
+                }), 400
+
+            # Simulate work once for the whole batch
+            simulate_work()
+            results = [int(stage.fn(int(value))) for value in values]
+
+            return jsonify({
+                "values": results,
+                "service": stage.letter,
+                "status": "success",
+                "processing_us": (time.perf_counter_ns() - start_ns) // 1000
+            })
+
+        except Exception as e:
+            return jsonify({
+                "error": str(e),
+                "status": "error"
+            }), 500
+
+    @bp.route('/process/stream', methods=['POST'])
+    def process_stream():
+        """
+        Process a stream: the (chunked) request body carries one JSON object
+        {"id": ..., "value": n} per line; apply the stage to each and write its
+        result line {"id": ..., "value": ...} as soon as it is computed
+        """
+        # read lazily, while the response is being written
+        lines = read_lines(request.stream)
+
+        def results():
+            for line in lines:
+                if not line.strip():
+                    continue
+                start_ns = time.perf_counter_ns()
+                item_id = None
+                try:
+                    item = json.loads(line)
+                    item_id = item.get('id')
+                    simulate_work()
+                    result = {
+                        "id": item_id,
+                        "value": int(stage.fn(int(item['value']))),
+                        "service": stage.letter,
+                        "status": "success",
+                        "processing_us": (time.perf_counter_ns() - start_ns) // 1000
+                    }
+                except Exception as e:
+                    result = {
+                        "id": item_id,
+                        "error": str(e),
+                        "status": "error"
+                    }
+                yield json.dumps(result) + "\n"
+
+        return Response(results(), mimetype='application/x-ndjson')
+
+    @bp.route('/process/chain', methods=['POST'])
+    def process_chain():
+        """
+        Chained mode: apply the stage, forward the result to the next stage's
+        /process/chain and return the value of this and every later stage
+        """
+        start_ns = time.perf_counter_ns()
+        try:
+            data = request.json or {}
+            if 'value' not in data:
+                return jsonify({
+                    "error": "Missing 'value' in request",
+                    "status": "error"
+                }), 400
+            # the caller's remaining time, propagated downstream
+            deadline = time.monotonic() + float(data.get('timeout_ms') or CHAIN_TIMEOUT_MS) / 1000.0
+
+            simulate_work()
+            result = int(stage.fn(int(data['value'])))
+            response = {
+                "value": result,
+                "values": [result],
+                "services": [stage.letter],
+                "stage_us": [(time.perf_counter_ns() - start_ns) // 1000],
+                "hops": 1,
+                "status": "success"
+            }
+            if stage.letter != list(STAGES)[-1]:
+                target, route = next_hop(data.get('route') or [])
+                if not target:
+                    return jsonify({
+                        "error": f"Service {stage.letter}: no next stage (set NEXT_URL or send a route)",
+                        "status": "error"
+                    }), 500
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return jsonify({
+                        "error": f"Service {stage.letter}: deadline exceeded before forwarding",
+                        "status": "error"
+                    }), 504
+                reply = downstream.post(
+                    f"{target.rstrip('/')}/process/chain",
+                    json={"value": result, "route": route, "timeout_ms": remaining * 1000},
+                    timeout=remaining
+                )
+                try:
+                    body = reply.json()
+                except ValueError:
+                    body = {}
+                if reply.status_code != 200 or body.get('status') != 'success':
+                    return jsonify({
+                        "error": f"Service {stage.letter} -> {target}: {body.get('error', reply.status_code)}",
+                        "status": "error"
+                    }), 502
+                response["value"] = body["value"]
+                response["values"] += body["values"]
+                response["services"] += body["services"]
+                response["stage_us"] += body["stage_us"]
+                response["hops"] += body["hops"]
+            response["processing_us"] = (time.perf_counter_ns() - start_ns) // 1000
+            return jsonify(response)
+
+        except requests.exceptions.Timeout as e:
+            return jsonify({
+                "error": f"Service {stage.letter}: downstream timed out: {e}",
+                "status": "error"
+            }), 504
+        except requests.exceptions.RequestException as e:
+            return jsonify({
+                "error": f"Service {stage.letter}: downstream failed: {e}",
+                "status": "error"
+            }), 502
+        except Exception as e:
+            return jsonify({
+                "error": str(e),
+                "status": "error"
+            }), 500
+
+    @bp.route('/health', methods=['GET'])
+    def health_check():
+        """Health check endpoint"""
+        return jsonify({
+            "status": "healthy",
+            "service": f"service-{stage.letter}",
+            "operation": stage.title.lower(),
+            "timestamp": time.time()
+        })
+
+    @bp.route('/', methods=['GET'])
+    def root():
+        """Root endpoint with service information"""
+        return jsonify({
+            "service": f"Service {stage.letter}",
+            "operation": stage.title,
+            "endpoints": {
+                "POST /process": f"Process a value ({stage.summary}), as JSON or {BINARY_TYPE}",
+                "POST /process/batch": "Process an array of values, simulated work paid once",
+                "POST /process/stream": "Process NDJSON values, one result line each as it is computed",
+                "POST /process/chain": "Process a value and forward it through the later stages",
+                "GET /health": "Health check"
+            }
+        })
+
+    return bp
+
+
+def create_app(stages):
+    """Flask app serving each stage under /<letter>, and a lone stage at the root as well"""
+    app = Flask(__name__)
+    for hosted in stages:
+        bp = create_blueprint(hosted)
+        app.register_blueprint(bp, url_prefix=f"/{hosted.letter.lower()}")
+        if len(stages) == 1:
+            app.register_blueprint(bp, name=f"{bp.name}_root")
+    if len(stages) > 1:
+        @app.route('/', methods=['GET'])
+        def root():
+            """Root endpoint listing the hosted stages"""
+            return jsonify({
+                "stages": {f"/{s.letter.lower()}": f"Service {s.letter}: {s.title}" for s in stages}
+            })
+    return app
+
+
+HOSTED_STAGES = select_stages(SERVICE_NAME)
+app = create_app(HOSTED_STAGES)
+
+
+def serve(port):
+    """
+    Run the app in SERVER_MODE:
+      dev      - Flask's development server (answers with Connection: close,
+                 so every request opens a new TCP connection)
+      gunicorn - gunicorn with WORKERS processes of THREADS gthread threads each,
+                 keeping idle HTTP/1.1 connections open for KEEPALIVE seconds (Linux/macOS)
+      waitress - waitress with THREADS threads in one process, HTTP/1.1 keep-alive (any OS)
+    """
+    if SERVER_MODE == 'gunicorn':
+        # only needed in this mode (see requirements.txt)
+        from gunicorn.app.base import BaseApplication
+
+        class GunicornApp(BaseApplication):
+            def load_config(self):
+                self.cfg.set('bind', f"0.0.0.0:{port}")
+                self.cfg.set('workers', WORKERS)
+                self.cfg.set('threads', THREADS)
+                self.cfg.set('worker_class', 'gthread')
+                self.cfg.set('keepalive', KEEPALIVE)
+
+            def load(self):
+                return app
+
+        GunicornApp().run()
+    elif SERVER_MODE == 'waitress':
+        from waitress import serve as waitress_serve
+        waitress_serve(app, host='0.0.0.0', port=port, threads=THREADS, channel_timeout=KEEPALIVE)
+    elif SERVER_MODE == 'dev':
+        app.run(host='0.0.0.0', port=port, debug=False)
+    else:
+        raise SystemExit(f"Unknown SERVER_MODE {SERVER_MODE!r} (expected dev, gunicorn or waitress)")
+
+
+if __name__ == '__main__':
+    port = int(os.getenv('PORT', '5000'))
+    for hosted in HOSTED_STAGES:
+        path = "/" if len(HOSTED_STAGES) == 1 else f"/{hosted.letter.lower()}"
+        print(f"Starting Service {hosted.letter} ({hosted.title}) on port {port} at {path}...")
+    print(f"Work simulation: {WORK_MS}ms per request")
+    if NEXT_URL:
+        print(f"Chained mode: forwarding to {NEXT_URL} when a request carries no route")
+    print(f"Server mode: {SERVER_MODE} (workers={WORKERS}, threads={THREADS}, keep-alive={KEEPALIVE}s)"
+          if SERVER_MODE != 'dev' else "Server mode: dev")
+    serve(port)
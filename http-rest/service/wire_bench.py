@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Wire format microbenchmark: JSON vs the binary /process format (BINARY_TYPE)
+
+Runs in one process, no services needed. For each format it builds the
+client's request the way client.py does (a prepared requests.Session
+request), runs it through stage B's Flask /process handler with the test
+client (the WSGI stack without sockets), and decodes the response the way
+client.py does. It prints the bytes each side puts on the wire and the CPU
+time per request of each step. WORK_MS is forced to 0 so only the protocol
+work is timed.
+
+    python wire_bench.py --requests 20000
+"""
+
+import argparse
+import os
+import time
+
+os.environ['WORK_MS'] = '0'
+os.environ['SERVICE_NAME'] = 'B'
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from stage_server import BINARY_REQUEST, BINARY_RESPONSE, BINARY_TYPE, app, tax
+
+URL = "http://service-b:5000/process"
+BINARY_HEADERS = {"Content-Type": BINARY_TYPE, "Accept": BINARY_TYPE}
+
+
+def prepare(session, wire, value):
+    """The request call_service sends for one value"""
+    if wire == "binary":
+        request = requests.Request("POST", URL, data=BINARY_REQUEST.pack(value), headers=BINARY_HEADERS)
+    else:
+        request = requests.Request("POST", URL, json={"value": value})
+    return session.prepare_request(request)
+
+
+def decode(wire, status, headers, body):
+    """Read the value and processing time out of a /process response, as call_service does"""
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    response.raise_for_status()
+    if wire == "binary":
+        value, processing_us, _ = BINARY_RESPONSE.unpack(response.content)
+        return value, processing_us
+    data = response.json()
+    return int(data["value"]), data.get("processing_us")
+
+
+def request_bytes(prepared):
+    """Request line, headers and body as http.client sends them (Host included)"""
+    head = "POST /process HTTP/1.1\r\nHost: service-b:5000\r\n"
+    head += "".join(f"{name}: {value}\r\n" for name, value in prepared.headers.items()) + "\r\n"
+    return len(head.encode("latin-1")), len(prepared.body or b"")
+
+
+def response_bytes(response):
+    """Status line, the app's headers and body; the server adds the same Date/Server headers to both"""
+    head = f"HTTP/1.1 {response.status}\r\n"
+    head += "".join(f"{name}: {value}\r\n" for name, value in response.headers.items()) + "\r\n"
+    return len(head.encode("latin-1")), len(response.data)
+
+
+def bench(wire, count, value):
+    """Bytes and CPU microseconds per request for one format"""
+    session = requests.Session()
+    client = app.test_client()
+    prepared = prepare(session, wire, value)
+    response = client.post("/process", data=prepared.body, headers=dict(prepared.headers))
+    assert decode(wire, response.status_code, response.headers, response.data)[0] == tax(value), response.data
+    sizes = request_bytes(prepared) + response_bytes(response)
+
+    encode_ns = server_ns = decode_ns = 0
+    for _ in range(count):
+        start = time.process_time_ns()
+        prepared = prepare(session, wire, value)
+        encoded = time.process_time_ns()
+        response = client.post("/process", data=prepared.body, headers=dict(prepared.headers))
+        served = time.process_time_ns()
+        decode(wire, response.status_code, response.headers, response.data)
+        done = time.process_time_ns()
+        encode_ns += encoded - start
+        server_ns += served - encoded
+        decode_ns += done - served
+    return sizes, (encode_ns / count / 1000, server_ns / count / 1000, decode_ns / count / 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON vs binary /process wire format microbenchmark')
+    parser.add_argument('--requests', type=int, default=20000, help='Requests per format (default: 20000)')
+    parser.add_argument('--input', type=int, default=105, help='Value sent to stage B (default: 105)')
+    args = parser.parse_args()
+
+    # Warm up both paths (imports, Flask's first request)
+    for wire in ("json", "binary"):
+        bench(wire, 200, args.input)
+
+    print(f"{args.requests} requests per format through stage B's /process, WORK_MS=0")
+    print(f"  {'format':<8}{'req head':>10}{'req body':>10}{'resp head':>11}{'resp body':>11}{'total':>8}"
+          f"{'encode us':>11}{'server us':>11}{'decode us':>11}{'CPU us':>9}")
+    for wire in ("json", "binary"):
+        sizes, cpu = bench(wire, args.requests, args.input)
+        print(f"  {wire:<8}{sizes[0]:>10}{sizes[1]:>10}{sizes[2]:>11}{sizes[3]:>11}{sum(sizes):>8}"
+              f"{cpu[0]:>11.1f}{cpu[1]:>11.1f}{cpu[2]:>11.1f}{sum(cpu):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()